@@ -0,0 +1,215 @@
+"""
+Synthetic data for the benchmarks.
+
+Every generator makes data that looks like the output of one of the devices in the worklab: a steady push every second
+for the wheels and ergometer, a wheelchair driving with slowly rotating wheels for the IMUs and a few markers moving
+around for the motion capture systems. The values are not realistic, but the layout (headers, delimiters, columns) is,
+so the loaders and processing functions follow the same code paths as they would with measured data.
+"""
+
+from os import makedirs, path
+from struct import pack
+
+import numpy as np
+import pandas as pd
+
+PUSH_FREQUENCY = 1.0  # pushes per second
+
+
+def push_signal(time, amplitude=10.0):
+    """Torque or force like signal with one push per second and a small negative part in the recovery phase"""
+    return np.clip(np.sin(2 * np.pi * PUSH_FREQUENCY * (time - 0.5)) * amplitude, -0.1 * amplitude, None)
+
+
+def make_mw(duration, sfreq=200, seed=0):
+    """
+    Raw measurement wheel data as returned by com.load_opti or com.load_sw.
+
+    Parameters
+    ----------
+    duration : float
+        length of the measurement [s]
+    sfreq : int
+        sample frequency [Hz]
+    seed : int
+        seed for the noise
+
+    Returns
+    -------
+    data : pd.DataFrame
+        time, fx, fy, fz, mx, my, torque and angle
+
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(0, duration, 1 / sfreq)
+    data = pd.DataFrame(rng.normal(0, 2, size=(len(time), 5)), columns=["fx", "fy", "fz", "mx", "my"])
+    data["torque"] = push_signal(time) + rng.normal(0, 0.2, len(time))
+    data["angle"] = time * 2.0 + 0.1 * np.sin(2 * np.pi * PUSH_FREQUENCY * time)
+    data.insert(0, "time", time)
+    return data
+
+
+def make_ergo(duration, sfreq=100, seed=0):
+    """
+    Raw ergometer data as returned by com.load_esseda or com.load_hsb.
+
+    Parameters
+    ----------
+    duration : float
+        length of the measurement [s]
+    sfreq : int
+        sample frequency [Hz]
+    seed : int
+        seed for the noise
+
+    Returns
+    -------
+    data : dict
+        DataFrame with time, force and speed for the left and right module
+
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(0, duration, 1 / sfreq)
+    data = dict()
+    for side in ["left", "right"]:
+        force = push_signal(time, amplitude=40.0) + rng.normal(0, 0.5, len(time))
+        speed = 1.5 + 0.2 * np.sin(2 * np.pi * PUSH_FREQUENCY * time) + rng.normal(0, 0.01, len(time))
+        data[side] = pd.DataFrame({"time": time, "force": force, "speed": speed})
+    return data
+
+
+def make_markers(frames, names, seed=0):
+    """
+    Marker trajectories that move a few cm around a fixed position, with a different position per marker.
+
+    Parameters
+    ----------
+    frames : int
+        number of frames
+    names : list
+        marker names
+    seed : int
+        seed for the positions and noise
+
+    Returns
+    -------
+    markers : dict
+        frames x 3 array per marker [m]
+
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(frames) / 100
+    markers = dict()
+    for name in names:
+        position = rng.uniform(-0.5, 0.5, 3)
+        movement = 0.05 * np.sin(2 * np.pi * time[:, None] * rng.uniform(0.2, 1.0, 3))
+        markers[name] = position + movement + rng.normal(0, 0.001, (frames, 3))
+    return markers
+
+
+def write_sw(filename, duration, sfreq=200, seed=0):
+    """Writes a SMARTwheel .txt file, comma separated without a header and with the channels load_sw reads"""
+    data = make_mw(duration, sfreq, seed)
+    table = np.zeros((len(data), 24))
+    table[:, 1] = np.arange(len(data))  # sample number
+    table[:, 3] = np.rad2deg(data["angle"]) % 360  # angle in degrees, wraps around every rotation
+    table[:, 18:24] = data[["fx", "fy", "fz", "mx", "my", "torque"]].values
+    np.savetxt(filename, table, delimiter=",", fmt="%.6f")
+    return filename
+
+
+def write_opti(filename, duration, sfreq=200, seed=0):
+    """Writes an Optipush .data file, tab separated with a 12 line header"""
+    data = make_mw(duration, sfreq, seed)
+    table = np.zeros((len(data), 10))
+    table[:, 0] = data["time"]
+    table[:, 3:10] = data[["fx", "fy", "fz", "mx", "my", "torque", "angle"]].values
+    header = "\n".join(["#Optipush benchmark data"] + [f"#header line {line}" for line in range(2, 13)])
+    np.savetxt(filename, table, delimiter="\t", fmt="%.6f", header=header, comments="")
+    return filename
+
+
+def write_esseda(filename, duration, sfreq=100, seed=0, block=65536):
+    """
+    Writes a LEM like workbook with an HSB sheet.
+
+    LEM starts in new columns every block samples, so the sheet has five columns (time, force and speed for the left
+    and right module) per block.
+    """
+    data = make_ergo(duration, sfreq, seed)
+    table = np.column_stack(
+        [data["left"]["time"], data["left"]["force"], data["right"]["force"], data["left"]["speed"]]
+        + [data["right"]["speed"]]
+    )
+    table = np.concatenate([table, np.full((-len(table) % block, 5), np.nan)]) if len(table) > block else table
+    blocks = np.split(table, max(len(table) // block, 1))
+    columns = ["time", "force left", "force right", "speed left", "speed right"]
+    sheet = pd.concat(
+        [pd.DataFrame(part, columns=[f"{col} {i}" for col in columns]) for i, part in enumerate(blocks)], axis=1
+    )
+    sheet.to_excel(filename, sheet_name="HSB", index=False)
+    return filename
+
+
+def write_ngimu(root_dir, duration, sfreq=400, seed=0, devices=("Frame", "Right", "Left")):
+    """Writes an NGIMU session folder, with a sensors.csv in a folder per device"""
+    rng = np.random.default_rng(seed)
+    time = np.arange(0, duration, 1 / sfreq)
+    columns = ["Time (s)"]
+    columns += [f"Gyroscope {axis} (deg/s)" for axis in "XYZ"] + [f"Accelerometer {axis} (g)" for axis in "XYZ"]
+    columns += [f"Magnetometer {axis} (uT)" for axis in "XYZ"] + ["Barometer (hPa)"]
+    for number, device in enumerate(devices, start=1):
+        data = rng.normal(size=(len(time), len(columns)))
+        data[:, 0] = time
+        data[:, 3] = 200 * np.sin(2 * np.pi * PUSH_FREQUENCY * time)  # wheel rotations
+        folder = path.join(root_dir, f"NGIMU - {number} {device}")
+        makedirs(folder, exist_ok=True)
+        pd.DataFrame(data, columns=columns).to_csv(path.join(folder, "sensors.csv"), index=False, float_format="%.6f")
+    return root_dir
+
+
+def write_ximu3(root_dir, duration, sfreq=400, seed=0, devices=("Frame", "Right", "Left")):
+    """Writes an x-IMU3 session folder, with an Inertial.csv in a folder per device"""
+    rng = np.random.default_rng(seed)
+    timestamp = np.arange(0, duration, 1 / sfreq) * 1e6
+    columns = ["Timestamp (us)"]
+    columns += [f"Gyroscope {axis} (deg/s)" for axis in "XYZ"] + [f"Accelerometer {axis} (g)" for axis in "XYZ"]
+    for device in devices:
+        data = rng.normal(size=(len(timestamp), len(columns)))
+        data[:, 0] = timestamp
+        data[:, 3] = 200 * np.sin(2 * np.pi * PUSH_FREQUENCY * timestamp / 1e6)
+        folder = path.join(root_dir, f"x-IMU3 {device}")
+        makedirs(folder, exist_ok=True)
+        pd.DataFrame(data, columns=columns).to_csv(path.join(folder, "Inertial.csv"), index=False, float_format="%.6f")
+    return root_dir
+
+
+def write_n3d(filename, frames, n_markers=20, seed=0):
+    """Writes an Optotrak .n3d file, with a 256 byte header and little endian float32 data in mm"""
+    markers = make_markers(frames, range(n_markers), seed)
+    data = np.stack(list(markers.values()), axis=1) * 1000
+    header = pack("<chhif", b"2", n_markers, 3, frames, 100.0).ljust(256, b"\x00")
+    with open(filename, "wb") as f:
+        f.write(header)
+        f.write(data.astype("<f4").tobytes())
+    return filename
+
+
+def write_optitrack(filename, frames, n_markers=20, sfreq=120.0, seed=0):
+    """Writes an Optitrack .csv export with the seven header lines and a frame and time column"""
+    markers = make_markers(frames, [f"marker{i}" for i in range(n_markers)], seed)
+    labels = [label for label in markers for _ in range(3)]
+    lines = [
+        f"Format Version,1.23,Capture Frame Rate,{sfreq},Total Frames in Take,{frames}",
+        "",
+        ",," + ",".join(["Marker"] * len(labels)),
+        ",," + ",".join(labels),
+        ",," + ",".join(["ID"] * len(labels)),
+        ",," + ",".join(["Position"] * len(labels)),
+        "Frame,Time (Seconds)," + ",".join(["X", "Y", "Z"] * n_markers),
+    ]
+    data = np.column_stack([np.arange(frames), np.arange(frames) / sfreq] + list(markers.values()))
+    with open(filename, "w") as f:
+        f.write("\n".join(lines) + "\n")
+        np.savetxt(f, data, delimiter=",", fmt="%.6f")
+    return filename
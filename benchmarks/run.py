@@ -0,0 +1,382 @@
+"""
+Times the loaders and processing functions of worklab on synthetic data of several sizes.
+
+Run from the root of the repository, e.g.:
+
+    python -m benchmarks.run --durations 60 600 --output results.json
+    python -m benchmarks.run --filter load_ --compare results.json
+
+Every benchmark gets its data from benchmarks.generators, the files are written to a temporary directory before timing
+so only the worklab function itself is timed. The results are written as JSON with the commit, package versions and
+platform, so runs on different commits can be compared with --compare.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from os import path
+
+import numpy as np
+
+from . import generators as gen
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Registers a benchmark.
+
+    The decorated function receives the duration of the measurement [s] and a temporary directory for files, and
+    returns the function to time and a function that makes its arguments. The arguments are made before every run and
+    are not timed, so functions that change their input get fresh data every time.
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def copy_args(*args):
+    """Argument maker that copies the DataFrames (also in dicts) before every run"""
+
+    def copy(arg):
+        if isinstance(arg, dict):
+            return {key: copy(value) for key, value in arg.items()}
+        return arg.copy() if hasattr(arg, "copy") else arg
+
+    return lambda: tuple(copy(arg) for arg in args)
+
+
+# ---------------------------------------------------------------------------------------------------------- loaders
+
+
+@benchmark("com.load_sw")
+def bench_load_sw(duration, tmpdir):
+    from worklab.com import load_sw
+
+    filename = gen.write_sw(path.join(tmpdir, "sw.txt"), duration)
+    return load_sw, lambda: (filename,)
+
+
+@benchmark("com.load_opti")
+def bench_load_opti(duration, tmpdir):
+    from worklab.com import load_opti
+
+    filename = gen.write_opti(path.join(tmpdir, "opti.data"), duration)
+    return load_opti, lambda: (filename,)
+
+
+@benchmark("com.load_esseda")
+def bench_load_esseda(duration, tmpdir):
+    from worklab.com import load_esseda
+
+    filename = gen.write_esseda(path.join(tmpdir, "esseda.xlsx"), duration)
+    return load_esseda, lambda: (filename,)
+
+
+@benchmark("com.load_imu")
+def bench_load_imu(duration, tmpdir):
+    from worklab.com import load_imu
+
+    root_dir = gen.write_ngimu(path.join(tmpdir, "ngimu"), duration)
+    return load_imu, lambda: (root_dir,)
+
+
+@benchmark("com.load_ximu3")
+def bench_load_ximu3(duration, tmpdir):
+    from worklab.com import load_ximu3
+
+    root_dir = gen.write_ximu3(path.join(tmpdir, "ximu3"), duration)
+    return load_ximu3, lambda: (root_dir,)
+
+
+@benchmark("com.load_n3d")
+def bench_load_n3d(duration, tmpdir):
+    from worklab.com import load_n3d
+
+    filename = gen.write_n3d(path.join(tmpdir, "markers.n3d"), int(duration * 100))
+    return load_n3d, lambda: (filename, False)
+
+
+@benchmark("com.load_optitrack")
+def bench_load_optitrack(duration, tmpdir):
+    from worklab.com import load_optitrack
+
+    filename = gen.write_optitrack(path.join(tmpdir, "optitrack.csv"), int(duration * 120))
+    return load_optitrack, lambda: (filename,)
+
+
+# ----------------------------------------------------------------------------------------------------------- kinetics
+
+
+@benchmark("kin.auto_process[mw]")
+def bench_auto_process_mw(duration, tmpdir):
+    from worklab.kin import auto_process
+
+    return auto_process, copy_args(gen.make_mw(duration))
+
+
+@benchmark("kin.auto_process[ergo]")
+def bench_auto_process_ergo(duration, tmpdir):
+    from worklab.kin import auto_process
+
+    return auto_process, copy_args(gen.make_ergo(duration))
+
+
+@benchmark("kin.push_by_push_mw")
+def bench_push_by_push_mw(duration, tmpdir):
+    from worklab.kin import filter_mw, process_mw, push_by_push_mw
+
+    data = process_mw(filter_mw(gen.make_mw(duration)))
+    return push_by_push_mw, lambda: (data, "torque", 0.0, 5.0, 5, False)
+
+
+@benchmark("kin.push_by_push_ergo")
+def bench_push_by_push_ergo(duration, tmpdir):
+    from worklab.kin import filter_ergo, process_ergo, push_by_push_ergo
+
+    data = process_ergo(filter_ergo(gen.make_ergo(duration)))
+    return push_by_push_ergo, lambda: (data, "power", 0.0, 50.0, 5, False)
+
+
+@benchmark("utils.find_peaks")
+def bench_find_peaks(duration, tmpdir):
+    from worklab.utils import find_peaks
+
+    torque = gen.make_mw(duration)["torque"].values
+    return find_peaks, lambda: (torque, 0.0, 5.0)
+
+
+# ---------------------------------------------------------------------------------------------------------------- imu
+
+
+@benchmark("imu.resample_imu")
+def bench_resample_imu(duration, tmpdir):
+    from worklab.com import load_imu
+    from worklab.imu import resample_imu
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sessiondata = load_imu(gen.write_ngimu(path.join(tmpdir, "ngimu"), duration))
+    return resample_imu, lambda: (sessiondata,)
+
+
+@benchmark("imu.process_imu")
+def bench_process_imu(duration, tmpdir):
+    from worklab.com import load_imu
+    from worklab.imu import process_imu, resample_imu
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        sessiondata = resample_imu(load_imu(gen.write_ngimu(path.join(tmpdir, "ngimu"), duration)))
+    return process_imu, lambda: (sessiondata,)
+
+
+# --------------------------------------------------------------------------------------------------------- kinematics
+
+ACS_MARKERS = {
+    "make_acs_sc": ["AA", "TS", "AI"],
+    "make_acs_th": ["IJ", "PX", "C7", "T8"],
+    "make_acs_cl": ["SC", "AC", "IJ", "PX", "C7", "T8"],
+    "make_acs_hu": ["GH", "EL", "EM"],
+    "make_acs_fa": ["US", "RS", "EL", "EM"],
+    "make_acs_hand": ["M2", "M5", "US", "RS"],
+}
+
+
+def bench_make_acs(function):
+    def setup(duration, tmpdir):
+        from worklab import move
+
+        markers = gen.make_markers(int(duration * 100), ACS_MARKERS[function])
+        return getattr(move, function), lambda: tuple(markers.values())
+
+    return setup
+
+
+for _function in ACS_MARKERS:
+    benchmark(f"move.{_function}")(bench_make_acs(_function))
+
+
+# ------------------------------------------------------------------------------------------------------------ running
+
+
+def time_function(function, make_args, repeat):
+    """Runs function repeat times and returns the wall times [s], garbage collection is off while timing"""
+    times = []
+    for _ in range(repeat):
+        args = make_args()
+        gc.collect()
+        gc.disable()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):  # progress messages are not part of the benchmark
+                start = time.perf_counter()
+                function(*args)
+                times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return times
+
+
+def run_benchmarks(names, durations, repeat=5, verbose=True):
+    """
+    Runs the benchmarks for every duration.
+
+    Parameters
+    ----------
+    names : list
+        names of the benchmarks to run
+    durations : list
+        lengths of the synthetic measurements [s]
+    repeat : int
+        number of timed runs per benchmark and duration, default is 5
+    verbose : bool
+        print the results as they come in, default is True
+
+    Returns
+    -------
+    results : list
+        dictionary with the name, duration and timings per benchmark and duration
+
+    """
+    results = []
+    for duration in durations:
+        for name in names:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                function, make_args = BENCHMARKS[name](duration, tmpdir)
+                times = time_function(function, make_args, repeat)
+            result = {
+                "name": name,
+                "duration": duration,
+                "repeat": repeat,
+                "min": min(times),
+                "median": statistics.median(times),
+                "mean": statistics.mean(times),
+                "times": times,
+            }
+            results.append(result)
+            if verbose:
+                print(f"{name:<28}{duration:>8g} s{result['min'] * 1e3:>12.2f} ms{result['median'] * 1e3:>12.2f} ms")
+    return results
+
+
+def environment():
+    """Commit, versions and platform the benchmarks ran on"""
+    import pandas
+    import scipy
+
+    try:
+        root = path.dirname(path.dirname(path.abspath(__file__)))
+        git = ["git", "-C", root]
+        commit = subprocess.run(git + ["rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                git + ["status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    from importlib.metadata import version
+
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "worklab": version("worklab"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def compare(baseline, results, threshold=1.1):
+    """
+    Prints the ratio of the median times to those of an earlier run.
+
+    Parameters
+    ----------
+    baseline : dict
+        output of an earlier run (loaded from the JSON file)
+    results : list
+        results of the current run
+    threshold : float
+        ratios above this value are marked as regressions, default is 1.1
+
+    Returns
+    -------
+    regressions : list
+        (name, duration, ratio) of the benchmarks that got slower than the threshold
+
+    """
+    earlier = {(result["name"], result["duration"]): result["median"] for result in baseline["results"]}
+    regressions = []
+    print("\n" + "=" * 80 + f"\nCompared with {baseline['environment']['commit']}\n" + "=" * 80)
+    for result in results:
+        key = (result["name"], result["duration"])
+        if key not in earlier:
+            continue
+        ratio = result["median"] / earlier[key]
+        flag = "  slower" if ratio > threshold else "  faster" if ratio < 1 / threshold else ""
+        print(f"{result['name']:<28}{result['duration']:>8g} s{ratio:>10.2f}x{flag}")
+        if ratio > threshold:
+            regressions.append((*key, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--durations",
+        nargs="+",
+        type=float,
+        default=[60.0, 600.0],
+        help="lengths of the synthetic measurements in seconds (default: 60 600)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark (default: 5)")
+    parser.add_argument("--filter", default="", help="only run benchmarks with this text in their name")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare the results with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.1,
+        help="slowdown ratio that counts as a regression with --compare (default: 1.1)",
+    )
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    if args.list:
+        print("\n".join(names))
+        return 0
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print("\n" + "=" * 80 + f"\n{'benchmark':<28}{'duration':>10}{'min':>15}{'median':>15}\n" + "=" * 80)
+    results = run_benchmarks(names, args.durations, max(args.repeat, 1))
+    output = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    if baseline is not None:
+        return 1 if compare(baseline, results, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
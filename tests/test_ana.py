@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+from worklab.ana import cut_data
+
+
+def test_cut_data():
+    time = np.arange(0, 60, 0.01)
+    session = pd.DataFrame({"time": time, "force": np.sin(time), "dist": time * 1.5, "power": np.cos(time)})
+    data = cut_data({"left": session, "right": session}, 10, 20)
+
+    expected = session[(session["time"] > 10) & (session["time"] < 20)].reset_index(drop=True)
+    expected["time"] -= 10
+    expected["dist"] -= expected["dist"].iloc[0]
+    for side in data:
+        pd.testing.assert_frame_equal(data[side], expected)
+        assert np.shares_memory(data[side]["force"].to_numpy(), session["force"].to_numpy())  # views, not copies
+    assert session["time"].iloc[1001] == time[1001] and session["dist"].iloc[1001] == time[1001] * 1.5  # unchanged
@@ -0,0 +1,106 @@
+import os
+from os import path
+
+import numpy as np
+import pandas as pd
+
+from worklab import profiling
+from worklab.batch import batch_process
+from worklab.com import load_hsb
+from worklab.kin import auto_process
+
+
+def write_hsb(filename, pushes=5):
+    """Writes an HSB logger file with a push every second on both modules"""
+    time = np.arange(0, pushes, 0.01)
+    force = np.clip(np.sin(2 * np.pi * time) * 60, -10, None)
+    lines = ["Side (Left=0);Timestamp (ms);Force@Roll (N);Linear Velocity@Roll (m/s)"]
+    for side in "01":
+        lines += [f"{side};{t:.2f};{f:.4f};1,5".replace(".", ",") for t, f in zip(time, force)]
+    filename.write_text("\n".join(lines) + "\n")
+
+
+def load_or_crash(filename):
+    """Loads an HSB file, or kills the worker process for files with crash in the name"""
+    if "crash" in str(filename):
+        os._exit(1)
+    return load_hsb(filename)
+
+
+def sprint_outcomes(data, pushes):
+    """Outcome step in the format of the ana functions"""
+    return None, pd.DataFrame({"pushes": [len(pushes["left"])], "maxpower": [data["left"]["power"].max()]})
+
+
+def test_batch_process(tmp_path):
+    for participant, pushes in [("pp01", 5), ("pp02", 8)]:
+        write_hsb(tmp_path / f"{participant}_HSB.csv", pushes)
+    (tmp_path / "pp03_HSB.csv").write_text("not a logger file")
+
+    results, errors = batch_process(
+        str(tmp_path / "*_HSB.csv"), [load_hsb, (auto_process, {"minpeak": 2.0})], max_workers=2, verbose=False
+    )
+    assert list(errors) == [str(tmp_path / "pp03_HSB.csv")]
+    assert set(results) == {"left", "right"}
+    counts = results["left"]["session"].value_counts()
+    assert counts["pp01_HSB"] == 4  # first push starts at the first sample, so it is not detected
+    assert counts["pp02_HSB"] == 7
+
+    serial, _ = batch_process(
+        [tmp_path / "pp01_HSB.csv"],
+        [load_hsb, auto_process],
+        key=lambda filename: {"participant": filename.name[:4]},
+        max_workers=1,
+        verbose=False,
+    )
+    assert (serial["right"]["participant"] == "pp01").all()
+
+
+def test_batch_process_failures(tmp_path):
+    for participant in ["pp01", "pp02"]:
+        write_hsb(tmp_path / f"{participant}_HSB.csv")
+    write_hsb(tmp_path / "crash_HSB.csv")
+
+    def key(filename):
+        if "pp02" in str(filename):
+            raise ValueError("unknown participant")
+        return path.basename(filename)[:4]
+
+    files = [str(tmp_path / name) for name in ["crash_HSB.csv", "pp01_HSB.csv", "pp02_HSB.csv"]]
+    results, errors = batch_process(
+        files, [load_or_crash, auto_process], key, max_workers=2, max_in_flight=1, verbose=False
+    )
+    assert sorted(errors) == [files[0], files[2]]
+    assert "BrokenProcessPool" in errors[files[0]] and "unknown participant" in errors[files[2]]
+    assert set(results["left"]["session"]) == {"pp01"}  # the pool was restarted after the crash
+
+    results, errors = batch_process(files[1:], [load_hsb, auto_process], key, max_workers=1, verbose=False)
+    assert list(errors) == [files[2]] and set(results["left"]["session"]) == {"pp01"}
+
+
+def test_batch_process_profiling(tmp_path):
+    for participant in ["pp01", "pp02"]:
+        write_hsb(tmp_path / f"{participant}_HSB.csv")
+
+    profiling.reset_profiling()
+    profiling.enable_profiling()
+    try:
+        batch_process(str(tmp_path / "*_HSB.csv"), [load_hsb, auto_process], max_workers=2, verbose=False)
+    finally:
+        profiling.disable_profiling()
+    report = profiling.profiling_report().set_index("stage")
+    assert report.loc["com.load_hsb", "calls"] == 2  # recorded in the worker processes
+    assert report.loc["kin.push_by_push_ergo", "calls"] == 2
+    profiling.reset_profiling()
+
+
+def test_batch_process_all_tables(tmp_path):
+    for participant, pushes in [("pp01", 5), ("pp02", 8)]:
+        write_hsb(tmp_path / f"{participant}_HSB.csv", pushes)
+
+    pipeline = [load_hsb, (auto_process, {"minpeak": 2.0}), sprint_outcomes]
+    results, errors = batch_process(str(tmp_path / "*_HSB.csv"), pipeline, max_workers=0, verbose=False)
+    assert not errors
+    assert {"result", "auto_process.left", "auto_process.right"} <= set(results)
+    assert results["result"]["pushes"].tolist() == [4, 7]
+    assert results["auto_process.left"]["session"].value_counts().to_dict() == {"pp01_HSB": 4, "pp02_HSB": 7}
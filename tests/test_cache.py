@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from worklab import cache
+from worklab.com import load_n3d
+
+from test_com import write_n3d
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    cache.enable_cache(tmp_path / "cache")
+    yield tmp_path / "cache"
+    cache.disable_cache()
+
+
+def test_cached_loader(tmp_path, cache_dir):
+    calls = []
+
+    @cache.cached
+    def load_csv(filename, scale=1.0):
+        calls.append(filename)
+        return pd.read_csv(filename) * scale
+
+    filename = tmp_path / "data.csv"
+    filename.write_text("a,b\n1,2\n3,4\n")
+
+    first = load_csv(filename)
+    second = load_csv(filename)
+    pd.testing.assert_frame_equal(first, second)
+    assert len(calls) == 1
+
+    load_csv(filename, scale=2.0)  # different arguments
+    assert len(calls) == 2
+
+    filename.write_text("a,b\n5,6\n")  # content changed
+    assert load_csv(filename)["a"].tolist() == [5]
+    assert len(calls) == 3
+    assert len(os.listdir(cache_dir)) == 2  # stale entry was replaced
+
+    cache.invalidate_cache(filename)
+    assert not os.listdir(cache_dir)
+
+
+def test_cache_array_and_eviction(tmp_path, cache_dir, capsys):
+    filename = tmp_path / "test.n3d"
+    write_n3d(filename, np.ones((100, 2, 3)))
+
+    data = load_n3d(filename, verbose=False)
+    np.testing.assert_array_equal(load_n3d(filename, verbose=False), data)
+    assert cache.cache_size() > 0
+    entries = len(os.listdir(cache_dir))
+    np.testing.assert_array_equal(load_n3d(filename), data)  # verbose shares the entry and still prints
+    assert len(os.listdir(cache_dir)) == entries and "Reading data from" in capsys.readouterr().out
+
+    cache.enable_cache(cache_dir, max_size=0)
+    load_n3d(filename, verbose=False, frames=slice(0, 10))
+    assert cache.cache_size() == 0
+
+
+def test_clear_cache_keeps_other_files(tmp_path):
+    cache.enable_cache(tmp_path)  # a folder with data, not only cache entries
+    try:
+        filename = tmp_path / "test.n3d"
+        write_n3d(filename, np.ones((10, 2, 3)))
+        (tmp_path / "session-01-left.xlsx").write_bytes(b"data")
+        (tmp_path / "0123456789abcdef-notes.pkl").write_bytes(b"data")
+
+        load_n3d(filename, verbose=False)
+        assert cache.cache_size() > 0
+        cache.enable_cache(tmp_path, max_size=0)  # evicts all entries
+        load_n3d(filename, verbose=False, frames=slice(0, 5))
+        cache.clear_cache()
+        assert sorted(os.listdir(tmp_path)) == ["0123456789abcdef-notes.pkl", "session-01-left.xlsx", "test.n3d"]
+    finally:
+        cache.disable_cache()
@@ -0,0 +1,161 @@
+from struct import pack
+
+import numpy as np
+import pandas as pd
+
+import pytest
+
+from worklab.com import load_n3d, open_n3d, load_optitrack, load_hsb, load_esseda, load_lem_session, load_spline
+from worklab.com import detect_format, load, register_loader, unregister_loader
+
+
+def write_n3d(filename, markers):
+    """Writes a minimal .n3d file from frames x markers x xyz data in mm"""
+    numframes, items, subitems = markers.shape
+    header = pack("<chhif", b"2", items, subitems, numframes, 100.0).ljust(256, b"\x00")
+    with open(filename, "wb") as f:
+        f.write(header)
+        f.write(markers.astype("<f4").tobytes())
+
+
+def test_load_n3d(tmp_path):
+    filename = tmp_path / "test.n3d"
+    markers = np.arange(10 * 4 * 3, dtype=float).reshape((10, 4, 3))
+    markers[2, 1, :] = -3.697314e28  # Optotrak missing data value
+    write_n3d(filename, markers)
+
+    header, raw = open_n3d(filename)
+    assert (header["numframes"], header["items"], header["subitems"]) == (10, 4, 3)
+    assert raw.shape == (10, 4, 3)
+
+    data = load_n3d(filename, verbose=False)
+    assert data.shape == (10, 3, 4)
+    assert np.isnan(data[2, :, 1]).all()
+    np.testing.assert_allclose(data[0, :, 0], markers[0, 0, :] / 1000)
+
+    subset = load_n3d(filename, verbose=False, markers=[1, 3], frames=slice(4, 8))
+    np.testing.assert_allclose(subset, data[4:8][:, :, [1, 3]])
+
+    subset = load_n3d(filename, verbose=False, markers=slice(1, 3), frames=slice(4, 8))
+    np.testing.assert_allclose(subset, data[4:8][:, :, 1:3])
+    np.testing.assert_allclose(load_n3d(filename, verbose=False, markers=2), data[:, :, [2]])
+
+
+def test_load_optitrack(tmp_path):
+    filename = tmp_path / "optitrack.csv"
+    labels = ["a", "b", "Unlabeled 1000"]
+    lines = [
+        "Format Version,1.23,Capture Frame Rate,120.0,Total Frames in Take,4",
+        "",
+        ",," + ",".join(["Marker"] * 9),
+        ",," + ",".join([label for label in labels for _ in range(3)]),
+        ",," + ",".join(["ID"] * 9),
+        ",," + ",".join(["Position"] * 9),
+        "Frame,Time (Seconds)," + ",".join(["X", "Y", "Z"] * 3),
+    ]
+    values = np.arange(5 * 9, dtype=float).reshape((5, 9))
+    lines += [f"{i},{i / 120}," + ",".join(str(value) for value in row) for i, row in enumerate(values)]
+    filename.write_text("\n".join(lines) + "\n")
+
+    markers, header = load_optitrack(filename, include_header=True)
+    assert list(markers) == ["a", "b", "marker_2"]
+    assert header["metadata"]["Total Frames in Take"] == 4
+    np.testing.assert_array_equal(markers["b"].values, values[:-1, 3:6])
+
+    markers = load_optitrack(filename, markers=["marker_2"], dtype=np.float32)
+    assert list(markers) == ["marker_2"]
+    assert (markers["marker_2"].dtypes == np.float32).all()
+    np.testing.assert_array_equal(markers["marker_2"].values, values[:-1, 6:9])
+
+
+def test_load_hsb(tmp_path):
+    filename = tmp_path / "test_HSB.csv"
+    lines = ["Side (Left=0);Timestamp (ms);Force@Roll (N);Linear Velocity@Roll (m/s)"]
+    for i in range(1, 11):
+        lines.append(f"0;{i};{i},5;-1,25")
+        lines.append(f"1;{i};-{i},5;0,75")
+    filename.write_text("\n".join(lines) + "\n")
+
+    data = load_hsb(filename)
+    np.testing.assert_allclose(data["left"]["time"], np.arange(10) * 0.01)
+    np.testing.assert_allclose(data["left"]["force"], np.arange(1, 11) + 0.5)
+    np.testing.assert_allclose(data["left"]["speed"], 1.25)  # flipped
+    np.testing.assert_allclose(data["right"]["force"], np.arange(1, 11) + 0.5)  # flipped
+    np.testing.assert_allclose(data["right"]["speed"], 0.75)
+
+    chunked = load_hsb(filename, chunksize=3)
+    for side in data:
+        pd.testing.assert_frame_equal(chunked[side], data[side])
+
+    compact = load_hsb(filename, dtype=np.float32)
+    assert compact["left"]["time"].dtype == np.float64  # time is never cast
+    assert (compact["left"][["force", "speed"]].dtypes == np.float32).all()
+    pd.testing.assert_frame_equal(compact["right"], data["right"], check_dtype=False)
+
+
+def write_lem(filename, samples=12):
+    """Writes a minimal LEM workbook with decimal commas and the HSB data in two column blocks"""
+    time = [f"{i / 100:.2f}".replace(".", ",") for i in range(1, samples + 1)]
+    hsb = pd.DataFrame({"Time": time, "Force Left": 1.5, "Force Right": 2.5, "Speed Left": 1.0, "Speed Right": 0.5})
+    half = samples // 2
+    hsb = pd.concat([hsb[:half].reset_index(drop=True), hsb[half:].reset_index(drop=True).add_suffix(" 2")], axis=1)
+    devices = pd.DataFrame({"a": [""] * 90, "left": "", "right": ""})
+    devices.iloc[13:93:8, 1:] = [[f"{i},25", f"{i},5"] for i in range(10)]
+    settings = pd.DataFrame({"value": ["", "Chair", "", "", "", "", "", "610", "680", "900", "10,5"]})
+    settings.insert(0, "setting", "")
+    with pd.ExcelWriter(filename) as writer:
+        pd.DataFrame({"name": ["test"]}).to_excel(writer, sheet_name="Participant", index=False)
+        devices.to_excel(writer, sheet_name="Devices", index=False)
+        settings.to_excel(writer, sheet_name="Wheelchair Settings", index=False)
+        hsb.to_excel(writer, sheet_name="HSB", index=False)
+
+
+def test_load_lem_session(tmp_path):
+    filename = tmp_path / "lem.xlsx"
+    write_lem(filename)
+    data, wheelchair, spline = load_lem_session(filename)
+    np.testing.assert_allclose(data["left"]["time"], np.arange(12) * 0.01, atol=1e-12)
+    np.testing.assert_allclose(data["right"]["force"], 2.5)
+    assert wheelchair == {"name": "Chair", "rimsize": 0.305, "wheelsize": 0.34, "wheelbase": 0.9, "weight": 10.5}
+    np.testing.assert_allclose(spline["left"], (np.arange(10) + 0.25) * 4)
+
+    for side, frame in load_esseda(filename).items():  # same as the separate loaders
+        pd.testing.assert_frame_equal(data[side], frame)
+        np.testing.assert_array_equal(spline[side], load_spline(filename)[side])
+
+
+def test_detect_format(tmp_path, capsys):
+    markers = tmp_path / "session.txt"  # misnamed, detected from the header instead
+    write_n3d(markers, np.zeros((10, 4, 3)))
+    hsb = tmp_path / "ergometer.csv"
+    hsb.write_text("Side (Left=0);Timestamp (ms);Force@Roll (N);Linear Velocity@Roll (m/s)\n0;1;1,5;1,0\n1;1;1,5;1,0\n")
+    sw = tmp_path / "wheel.dat"
+    sw.write_text("\n".join(",".join(["1"] * 24) + "," for _ in range(3)) + "\n")
+    unknown = tmp_path / "spiro.xlsx"
+    unknown.write_text("not a spreadsheet")
+
+    assert detect_format(markers) == "n3d"
+    assert detect_format(hsb) == "hsb"
+    assert detect_format(sw) == "sw"
+    assert detect_format(unknown) is None
+    with pytest.raises(ValueError):
+        load(unknown, verbose=False)
+
+    capsys.readouterr()
+    assert load(markers, verbose=False, dtype=np.float32).dtype == np.float32  # kwargs go to load_n3d
+    assert capsys.readouterr().out == ""
+    np.testing.assert_array_equal(load(str(hsb), verbose=False)["left"]["force"], [1.5])
+
+
+def test_register_loader(tmp_path):
+    filename = tmp_path / "log.csv"
+    filename.write_text("Format Version,custom\n1,2\n")
+    assert detect_format(filename) == "optitrack"
+
+    register_loader("custom", lambda name: pd.read_csv(name, skiprows=1), lambda file: "custom" in file.lines[0])
+    try:
+        assert detect_format(filename) == "custom"  # registered loaders are checked first
+        assert list(load(filename, verbose=False).columns) == ["1", "2"]
+    finally:
+        unregister_loader("custom")
+    assert detect_format(filename) == "optitrack"
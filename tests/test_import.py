@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+IMPORT_BUDGET = 0.5  # seconds for a bare `import worklab`, submodules are only loaded when used
+
+
+def run_python(code):
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+
+
+def import_time(stderr, module):
+    """Cumulative import time in seconds from the -X importtime output"""
+    for line in stderr.splitlines():
+        _, _, cumulative, name = (part.strip() for part in line.replace(":", "|", 1).split("|"))
+        if name == module:
+            return int(cumulative) / 1e6
+    raise ValueError(f"{module} was not imported")
+
+
+def test_import_time():
+    result = run_python("import worklab")
+    assert import_time(result.stderr, "worklab") < IMPORT_BUDGET
+
+
+def test_lazy_submodules():
+    modules = "import sys; print(' '.join(m for m in ['matplotlib', 'tkinter', 'scipy'] if m in sys.modules))"
+
+    result = run_python(f"import worklab; {modules}")
+    assert result.stdout.split() == []
+    result = run_python(f"import worklab; worklab.com; {modules}")
+    assert result.stdout.split() == []  # utils imports scipy on use, so loading files doesn't need it
+    result = run_python(f"import worklab; worklab.com; worklab.kin; {modules}")
+    assert result.stdout.split() == ["scipy"]  # no plotting or GUI toolkits for loading and processing
+    result = run_python("import worklab as wl; print(wl.kin.__name__, 'plots' in dir(wl), hasattr(wl, 'importlib'))")
+    assert result.stdout.split() == ["worklab.kin", "True", "False"]
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from worklab.imu import process_imu, resample_imu
+
+
+def make_session(n=2000, sfreq=400.0):
+    """Three sensor session with the columns process_imu uses"""
+    rng = np.random.default_rng(0)
+    time = np.arange(n) / sfreq
+    session = dict()
+    for device in ["frame", "right", "left"]:
+        session[device] = pd.DataFrame(
+            rng.normal(size=(n, 4)), columns=["gyroscope_x", "gyroscope_y", "gyroscope_z", "accelerometer_x"]
+        )
+        session[device].insert(0, "time", time)
+    return session
+
+
+def test_process_imu_copy_on_write():
+    session = make_session()
+    original = {device: data.copy() for device, data in session.items()}
+
+    processed = process_imu(session)
+    for device in session:  # caller's data is never changed
+        pd.testing.assert_frame_equal(session[device], original[device])
+    assert "vel" in processed["frame"] and "vel" not in session["frame"]
+    assert np.shares_memory(processed["frame"]["gyroscope_x"].values, session["frame"]["gyroscope_x"].values)
+    assert not np.shares_memory(processed["right"]["gyroscope_y"].values, session["right"]["gyroscope_y"].values)
+
+    inplace = process_imu(session, inplace=True)
+    assert inplace is session and "vel" in session["frame"]
+
+
+def test_resample_imu():
+    time = np.arange(0, 10, 1 / 1000)
+    quaternion = np.column_stack([np.cos(time), np.sin(time), np.zeros_like(time), np.zeros_like(time)])
+    session = {
+        "frame": pd.DataFrame({"time": time, "gyroscope_z": np.sin(2 * np.pi * time) + np.sin(2 * np.pi * 300 * time)}),
+        "quaternion": pd.DataFrame(quaternion, columns=["w", "x", "y", "z"]).assign(time=time),
+    }
+
+    resampled = resample_imu(session, sfreq=100.0)
+    assert list(session) == ["frame", "quaternion"] and len(session["frame"]) == len(time)
+    assert np.allclose(resampled["frame"]["time"], np.arange(0, time[-1], 1 / 100))
+    assert np.allclose(np.linalg.norm(resampled["quaternion"][["w", "x", "y", "z"]], axis=1), 1.0)
+
+    filtered = resample_imu(session, sfreq=100.0, antialias=True)
+    slow = np.sin(2 * np.pi * filtered["frame"]["time"])
+    assert np.abs(filtered["frame"]["gyroscope_z"] - slow)[100:-100].max() < 0.05  # 300 Hz component is removed
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+from worklab.kin import PushDetector, auto_process, process_ergo, process_mw_chunked, push_by_push_ergo
+from worklab.kin import push_by_push_mw
+from worklab.utils import cast_channels
+
+
+def make_mw(pushes=6, sfreq=100):
+    """Measurement wheel like DataFrame with a push every second and a few NaNs"""
+    time = np.arange(0, pushes + 0.5, 1 / sfreq)
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame({"time": time, "angle": time * 2.0})
+    data["torque"] = np.clip(np.sin(2 * np.pi * (time - 0.5)) * 10, -1, None)
+    for col in ["power", "uforce", "force", "feff", "ftot", "fz", "work"]:
+        data[col] = data["torque"] * rng.uniform(0.5, 2, len(data))
+    data.loc[[60, 61, 170], ["power", "fz"]] = np.NaN
+    return data
+
+
+def test_push_by_push_mw():
+    data = make_mw()
+    pbp = push_by_push_mw(data, minpeak=5.0, verbose=False, extra={"fz": ["mean", "min", np.nanstd]})
+    assert len(pbp) == 6
+
+    for push in pbp.itertuples():
+        samples = data.loc[push.start : push.stop]
+        assert np.isclose(push.meanpower, samples["power"].mean())  # NaNs are skipped
+        assert np.isclose(push.maxtorque, samples["torque"].max())
+        assert np.isclose(push.work, samples["work"].sum())
+        assert np.isclose(push.minfz, samples["fz"].min())
+        assert np.isclose(push.nanstdfz, np.nanstd(samples["fz"]))
+
+    cycle = data.loc[pbp["start"][0] : pbp["start"][1] - 1, "work"]
+    assert np.isclose(pbp["cwork"][0], cycle.sum())
+    assert np.isclose(pbp["negwork"][0], cycle[cycle < 0].sum())
+    assert pbp[["cwork", "negwork"]].iloc[-1].isna().all()  # last cycle is incomplete
+
+
+def test_push_detector():
+    time = np.arange(0, 20, 0.01)
+    force = np.clip(np.sin(2 * np.pi * (time - 0.3) / 1.1) * 40, -3, None)
+    session = pd.DataFrame({"time": time, "force": force, "speed": 1.5 + 0.2 * np.sin(2 * np.pi * time / 1.1)})
+    pbp = push_by_push_ergo(process_ergo({"left": session.copy()}), cutoff=1.0, verbose=False)["left"]
+
+    detector = PushDetector(kind="ergo", cutoff=1.0, filtered=False)
+    pushes = []
+    for start in range(0, len(session), 37):  # blocks don't line up with the pushes
+        completed = detector.update(session.iloc[start : start + 37])
+        assert all(np.isnan(push["ctime"]) for push in completed)  # filled in when the next push is completed
+        assert not pushes or not completed or not np.isnan(pushes[-1]["ctime"])
+        pushes += completed
+    pushes = pd.DataFrame(pushes)
+    assert list(pushes.columns) == list(pbp.columns)
+    pd.testing.assert_frame_equal(pushes, pbp, check_dtype=False)
+
+    detector = PushDetector(kind="ergo", cutoff=1.0)  # causal filters add a small delay
+    blocks = (session.iloc[start : start + 50] for start in range(0, len(session), 50))
+    pushes = pd.DataFrame([push for block in blocks for push in detector.update(block)])
+    assert len(pushes) == len(pbp)
+    assert (pushes["start"] - pbp["start"]).abs().max() <= 2
+
+
+def test_process_mw_chunked(tmp_path):
+    time = np.arange(0, 40, 1 / 200)
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(rng.normal(size=(len(time), 5)), columns=["fx", "fy", "fz", "mx", "my"])
+    data["torque"] = np.clip(np.sin(2 * np.pi * (time - 0.5)) * 10, -1, None) + rng.normal(0, 0.2, len(time))
+    data["angle"] = time * 2.0 + 0.1 * np.sin(2 * np.pi * time)
+    data.insert(0, "time", time)
+    processed, pbp = auto_process(data.copy(), rimsize=0.275)
+
+    chunks = (data.iloc[start : start + 1500] for start in range(0, len(data), 1500))
+    outfile = tmp_path / "processed.csv"
+    chunked = process_mw_chunked(chunks, outfile=str(outfile), verbose=False)
+    pd.testing.assert_frame_equal(chunked, pbp, check_dtype=False)
+    pd.testing.assert_frame_equal(pd.read_csv(outfile), processed, check_exact=False, atol=1e-8)
+
+
+def check_float32(full, compact):
+    """The float32 path keeps time and the integrated channels as float64 and stays within the documented bound"""
+    assert (compact.dtypes[["time", "angle", "dist"]] == np.float64).all()
+    assert (compact.drop(columns=["time", "angle", "dist"]).dtypes == np.float32).all()
+    assert compact.memory_usage().sum() < 0.65 * full.memory_usage().sum()
+    error = (compact - full).abs().max() / full.abs().max()
+    assert error.max() < 1e-5  # relative to the range of the channel
+
+
+def test_auto_process_float32():
+    data = make_mw(pushes=30, sfreq=200)[["time", "angle", "torque"]]
+    data[["fx", "fy", "fz", "mx", "my"]] = np.random.default_rng(0).normal(size=(len(data), 5))
+    processed, pbp = auto_process(data.copy(), minpeak=5.0)
+    compact, compact_pbp = auto_process(cast_channels(data.copy(), np.float32), minpeak=5.0, dtype=np.float32)
+    check_float32(processed, compact)
+    pd.testing.assert_frame_equal(compact_pbp, pbp, check_dtype=False, rtol=1e-5)
+
+    force = data["torque"].to_numpy()[::2] * 4  # 100 Hz
+    session = pd.DataFrame({"time": np.arange(len(force)) / 100, "force": force, "speed": 1.5 + force / 100})
+    ergo = {"left": session, "right": session}
+    processed, pbp = auto_process({side: session.copy() for side, session in ergo.items()})
+    compact, compact_pbp = auto_process({side: session.copy() for side, session in ergo.items()}, dtype=np.float32)
+    for side in ergo:
+        check_float32(processed[side], compact[side])
+        pd.testing.assert_frame_equal(compact_pbp[side], pbp[side], check_dtype=False, rtol=1e-5)
+
+
+def test_process_ergo_modules():
+    time = np.arange(0, 10, 0.01)
+    session = pd.DataFrame({"time": time, "force": np.sin(time) * 40, "speed": 1.5 + 0.2 * np.cos(time)})
+    data = process_ergo({"left": session.copy(), "right": session.copy(), "mean": session.iloc[:500].copy()})
+    for side, frame in data.items():  # stacked and single modules give the same channels
+        assert list(frame.columns[3:]) == ["aspeed", "angle", "torque", "acc", "power", "dist", "work", "uforce"]
+        np.testing.assert_allclose(frame["power"], frame["force"] * frame["speed"])
+        np.testing.assert_allclose(frame["dist"].diff()[1:], (frame["speed"][1:] + frame["speed"][:-1].values) / 200)
+    pd.testing.assert_frame_equal(data["mean"].iloc[:-1], data["left"].iloc[:499])  # last acc is a one-sided difference
@@ -0,0 +1,49 @@
+import numpy as np
+from numpy.linalg import solve
+
+from worklab.move import SEGMENTS, flexext_prosup, joint_angles, make_acs_fa, make_acs_th, make_segment_model
+from worklab.move import acs_to_car_ang
+
+
+def make_markers(frames=200, seed=0):
+    """Upper-limb like markers that move a few cm around a fixed position"""
+    rng = np.random.default_rng(seed)
+    time = np.arange(frames) / 100
+    names = sorted({name for segment in SEGMENTS.values() for name in segment} | {"GH"})
+    markers = {}
+    for name in names:
+        position = rng.uniform(-0.5, 0.5, 3)
+        markers[name] = position + 0.05 * np.sin(2 * np.pi * time[:, None] * rng.uniform(0.2, 1.0, 3))
+    return markers
+
+
+def test_local_coordinates():
+    markers = make_markers()
+    local, acs, origin = make_acs_th(markers["IJ"], markers["PX"], markers["C7"], markers["T8"])
+    for name in ["IJ", "PX", "C7", "T8"]:  # transposed acs matches solving the system
+        assert np.allclose(local[name], solve(acs, markers[name] - origin))
+
+    local, acs, origin = make_acs_fa(markers["US"], markers["RS"], markers["EL"], markers["EM"], DSEM=True)
+    assert not np.allclose(acs.transpose(0, 2, 1) @ acs, np.eye(3))  # falls back to solve
+    for name in ["US", "RS", "EL", "EM"]:
+        assert np.allclose(local[name], solve(acs, markers[name] - origin))
+
+
+def test_joint_angles():
+    markers = make_markers()
+    markers["EL"][5] = np.nan  # a missing frame only affects that frame
+    for DSEM in [False, True]:
+        if DSEM:
+            del markers["IJ"]  # segments without markers are skipped
+        model = make_segment_model(markers, DSEM=DSEM)
+        angles = joint_angles(model, DSEM=DSEM)
+        assert ("thorax" in model) is not DSEM and "clavicle" in model
+        assert ("humerothoracic" in angles) is not DSEM
+
+        acs = {name: segment[1] for name, segment in model.items()}
+        expected = acs_to_car_ang(solve(acs["forearm"], acs["hand"]), order=[0, 2, 1] if DSEM else [2, 0, 1])
+        assert np.allclose(angles["wrist"], np.rad2deg(expected), equal_nan=True)
+        assert np.isnan(angles["elbow"][5]).all() and not np.isnan(np.delete(angles["elbow"], 5, axis=0)).any()
+
+    elbow = flexext_prosup(markers["GH"], markers["EL"], markers["EM"], markers["US"], markers["RS"])
+    assert np.allclose(angles["elbow"][:, :2], elbow, equal_nan=True)
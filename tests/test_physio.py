@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+from worklab.com import convert_spiro
+from worklab.physio import SpiroStream, calc_weighted_average, cut_spiro, detect_vt1, detect_vt2
+
+
+def make_breaths(n=60, seed=0):
+    """Breath records like the COSMED export, with a missing first breath and a few missing heart rates"""
+    rng = np.random.default_rng(seed)
+    time = np.concatenate([[0], np.cumsum(rng.integers(2, 5, n - 1))])
+    breaths = pd.DataFrame({"t": [f"{t // 3600:02d}:{t // 60 % 60:02d}:{t % 60:02d}" for t in time]})
+    breaths["VO2"] = np.linspace(500, 2500, n) + rng.normal(0, 50, n)
+    breaths["VCO2"] = breaths["VO2"] * np.linspace(0.8, 1.1, n)
+    breaths["VE"] = breaths["VO2"] / 30 + rng.normal(0, 1, n)
+    breaths["EEm"] = breaths["VO2"] / 200
+    breaths["HR"] = np.linspace(70, 180, n).round()
+    breaths.loc[[20, 21], "HR"] = np.NaN
+    breaths["PetO2"], breaths["PetCO2"], breaths["VT"] = 105.0, 38.0, rng.uniform(1, 2, n)
+    return breaths
+
+
+def test_spiro_stream():
+    breaths = make_breaths()
+    data = convert_spiro(breaths)
+    data = data[data["time"] > 0]
+    stream = SpiroStream()
+    columns = stream.columns
+
+    blocks = [breaths.iloc[0], breaths.iloc[1:5], breaths.iloc[5:6]] + [breath for _, breath in breaths[6:].iterrows()]
+    for block in blocks:
+        stream.update(block)
+        if not stream.n_breaths:  # first breath is missing data
+            assert stream.rolling_mean().isna().all()
+            continue
+        rolling = data[columns].iloc[: stream.n_breaths].rolling(window=15).mean().iloc[-1]
+        pd.testing.assert_series_equal(stream.rolling_mean(), rolling, check_names=False)
+    assert stream.n_breaths == len(data)
+
+    averages = calc_weighted_average(data[columns], data["weights"])
+    pd.testing.assert_series_equal(stream.weighted_average(), averages, check_names=False)
+
+    snapshot = stream.snapshot(average=True)
+    assert list(snapshot.columns) == list(data.columns)
+    assert snapshot["time"][0] == data["time"].iloc[-1] and snapshot["weights"][0] == data["weights"].sum()
+
+    breaths = breaths.drop(columns=["PetO2", "PetCO2", "HR"])  # not recorded by every setup
+    stream.reset()
+    stream.update(breaths.iloc[:20])
+    stream.update(breaths.iloc[20].to_dict())
+    assert stream.n_breaths == 20 and stream.rolling_mean()[["PetO2", "PetCO2", "HR", "O2pulse"]].isna().all()
+    assert not stream.rolling_mean().drop(["PetO2", "PetCO2", "HR", "O2pulse"]).isna().any()
+
+
+def make_gxt(vt1=300, vt2=480, start=120, end=660, seed=0):
+    """Graded exercise test in the format of load_spiro with clear thresholds at vt1 and vt2 [s]"""
+    rng = np.random.default_rng(seed)
+    time = np.arange(0, end, 3)
+    work = np.clip(time - start, 0, None) / 1000
+    data = pd.DataFrame({"time": time, "HR": 70 + work * 200, "VO2": 0.4 + 4 * work})
+    data["VCO2"] = 0.9 * data["VO2"] + 3 * np.clip(work - (vt1 - start) / 1000, 0, None)
+    data["VE"] = 25 * data["VCO2"] + 150 * np.clip(work - (vt2 - start) / 1000, 0, None)
+    data[["VO2", "VCO2", "VE"]] *= rng.normal(1, 0.01, (len(time), 3))
+    data["PetO2"] = 95 + 20 * np.abs(work - (vt1 - start) / 1000)
+    data["PetCO2"] = 40 - 20 * np.abs(work - (vt2 - start) / 1000)
+    data["VE/VO2"], data["VE/VCO2"] = data["VE"] / data["VO2"], data["VE"] / data["VCO2"]
+    return data
+
+
+def test_detect_thresholds():
+    data, power = make_gxt(), pd.DataFrame({"power": np.repeat(np.arange(11) * 10.0, 60)})
+    fig, vt1 = detect_vt1(data, power, start_spiro=120, muser=70)
+    assert fig is None
+    assert abs(vt1["VT1-time"][0] - 180) <= 15
+    assert vt1["VT1-power"][0] == power["power"][vt1["VT1-time"][0] + 120]
+    assert np.isclose(vt1["VT1-VO2/kg"][0], vt1["VT1-VO2"][0] * 1000 / 70)
+
+    _, vt2 = detect_vt2(data, power, start_spiro=120, muser=70, vt1=vt1)
+    assert abs(vt2["VT2-time"][0] - 360) <= 15
+    for method in ["VE", "equivalent", "PetCO2"]:
+        assert abs(vt2[f"VT2-time-{method}"][0] - 360) <= 30
+
+
+def test_detect_thresholds_not_found(capsys):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    data, power = make_gxt(), pd.DataFrame({"power": np.repeat(np.arange(11) * 10.0, 60)})
+    _, vt1 = detect_vt1(data.iloc[:10], power, start_spiro=120, muser=70)  # too short for any method
+    assert vt1.isna().all(axis=None)
+
+    _, vt1 = detect_vt1(data.drop(columns=["PetO2", "PetCO2"]), power, start_spiro=120, muser=70)
+    assert np.isnan(vt1["VT1-time-PetO2"][0]) and abs(vt1["VT1-time"][0] - 180) <= 30
+
+    data["VCO2"], data["VE/VO2"] = np.sqrt(data["VO2"]), np.sqrt(data["time"])  # slopes only decrease
+    data["RER"] = data["VCO2"] / data["VO2"]
+    fig, vt1 = detect_vt1(data, power, start_spiro=120, muser=70, plot=True)  # only PetO2 finds a threshold
+    assert abs(vt1["VT1-time-PetO2"][0] - 180) <= 15
+    assert np.isnan(vt1["VT1-time"][0]) and vt1.drop(columns="VT1-time-PetO2").isna().all(axis=None)
+    assert "VT1 not found" in capsys.readouterr().out
+    assert not any(line.get_color() == "k" for axis in fig.axes for line in axis.get_lines())  # no threshold line
+    matplotlib.pyplot.close(fig)
+
+
+def test_cut_spiro():
+    data = make_gxt()
+    cut = cut_spiro(data, 100, 200)
+    assert cut["time"].iloc[0] == 102 - 100 and cut["time"].iloc[-1] == 198 - 100  # after the nearest breath to start
+    assert np.shares_memory(cut["VO2"].to_numpy(), data["VO2"].to_numpy()) and data["time"].iloc[34] == 102
@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from worklab import profiling
+from worklab.kin import auto_process
+from worklab.profiling import disable_profiling, enable_profiling, profile_stage, profiling_records, profiling_report
+from worklab.profiling import reset_profiling
+from worklab.utils import Timer
+
+
+def make_mw(pushes=6, sfreq=200):
+    time = np.arange(0, pushes, 1 / sfreq)
+    data = pd.DataFrame({"time": time, "angle": time * 2.0, "fx": 0.0, "fy": 0.0, "fz": 0.0, "mx": 0.0, "my": 0.0})
+    data["torque"] = np.clip(np.sin(2 * np.pi * (time - 0.5)) * 10, -1, None)
+    return data
+
+
+def test_profiling_disabled():
+    reset_profiling()
+    auto_process(make_mw())
+    with profile_stage("nothing"):
+        pass
+    assert profiling_records().empty
+    assert not profiling.profiling_enabled()
+
+
+def test_profiling_report(tmp_path):
+    reset_profiling()
+    enable_profiling()
+    try:
+        with profile_stage("session", rows=1200):
+            auto_process(make_mw())
+            auto_process(make_mw())
+            Timer("export", verbose=False).stop()
+    finally:
+        disable_profiling()
+
+    records = profiling_records()
+    calls = records.set_index("stage")
+    assert (calls.loc["kin.auto_process", "parent"] == "session").all()
+    assert (calls.loc["kin.filter_mw", "parent"] == "kin.auto_process").all()
+    assert (calls.loc["kin.filter_mw", "rows"] == 1200).all()
+    assert calls.loc["export", "parent"] == "session"
+    children = records.loc[records["parent"] == "session", "wall_time"].sum()
+    assert np.isclose(calls.loc["session", "self_time"], calls.loc["session", "wall_time"] - children)
+
+    report = profiling_report(tmp_path / "report.json").set_index("stage")
+    assert report.loc["kin.auto_process", "calls"] == 2
+    assert report.loc["kin.process_mw", "rows"] == 2400
+    assert (report["wall_time"] >= report["self_time"]).all()
+    assert len(json.loads((tmp_path / "report.json").read_text())) == len(report)
+    reset_profiling()
+
+
+def test_profiling_memory():
+    reset_profiling()
+    enable_profiling(memory=True)
+    try:
+        with profile_stage("outer"):
+            with profile_stage("allocate"):
+                array = np.ones(2**20)  # 8 MiB
+            del array
+            np.ones(2**18)  # 2 MiB, smaller than the inner stage
+    finally:
+        disable_profiling()
+    memory = profiling_records().set_index("stage")["peak_memory"]
+    assert 2**23 <= memory["allocate"] < 2**23 + 2**16
+    assert memory["outer"] >= memory["allocate"]
+    reset_profiling()
@@ -1,6 +1,10 @@
-from worklab.utils import find_nearest
+import datetime
+
+from worklab.utils import find_nearest, find_peaks, pd_dt_to_s, metamax_to_s
+from worklab.utils import butter_sos, lowpass_butter, lowpass_butter_columns, signal_lag, time_slice, power_per_min
 
 import numpy as np
+import pandas as pd
 
 
 def test_find_nearest():
@@ -11,3 +15,82 @@ def test_find_nearest():
 
     assert nearest_value == 25
     assert nearest_index == 25
+
+    array = np.array([0.0, 1.0, 3.0, 3.0, 3.0, 7.0, 7.0])
+    for value in [-1.0, 0.5, 2.0, 2.5, 3.0, 5.0, 6.9, 10.0]:  # ties go to the first of the nearest values
+        assert find_nearest(array, value, index=True, assume_sorted=True) == find_nearest(array, value, index=True)
+
+
+def test_time_slice():
+    data = pd.DataFrame({"time": np.arange(0, 300, 0.01), "power": np.arange(30000) % 6000 / 100})
+    for start, end in [(10, 70), (10.005, 70.0), (-5, 1000), (70, 10), (None, 0.5), (299.99, None)]:
+        cut = data.iloc[time_slice(data["time"], start, end)]
+        start, end = -np.inf if start is None else start, np.inf if end is None else end
+        pd.testing.assert_frame_equal(cut, data[(data["time"] > start) & (data["time"] < end)])
+    assert np.shares_memory(data["time"].iloc[time_slice(data["time"], 10, 70)].values, data["time"].values)
+
+    samples = np.arange(len(data))
+    data["power"] = samples // 6000 * 10 + (samples % 6000 >= 3900) * 5  # steps of 10 W, 5 W more in the last 20s
+    power = power_per_min({"mean": data}, 270, start_spiro=30)["power"]
+    assert len(power) == 30 + 5 * 60 and (power[:30] == 0).all()
+    np.testing.assert_array_equal(power[30::60], [5, 15, 25, 35, 45])
+
+
+def test_find_peaks():
+    data = np.array([0, 2, 6, 4, 7, 3, 0, -1, 0, 8, 9, 2, 0, 0, 6, 6])
+    peaks = find_peaks(data, cutoff=1.0, minpeak=5.0, min_dist=1)
+
+    np.testing.assert_array_equal(peaks["start"], [1, 9])
+    np.testing.assert_array_equal(peaks["stop"], [5, 11])
+    assert peaks["peak"] == [4, 10]  # last peak never drops below the cutoff
+
+    empty = find_peaks(np.zeros(10))
+    assert len(empty["start"]) == len(empty["stop"]) == len(empty["peak"]) == 0
+
+
+def test_pd_dt_to_s():
+    assert pd_dt_to_s(datetime.time(1, 2, 3)) == 3723
+    assert pd_dt_to_s("01:02:03") == 3723
+
+    times = pd.Series([datetime.time(0, 0, 7), datetime.time(1, 2, 3, 500000)], index=[3, 4])
+    pd.testing.assert_series_equal(pd_dt_to_s(times), pd.Series([7, 3723], index=[3, 4]))
+    strings = pd.Series(["00:00:07", "1:02:03"])
+    pd.testing.assert_series_equal(pd_dt_to_s(strings), pd.Series([7, 3723]))
+
+
+def test_metamax_to_s():
+    assert metamax_to_s("1:02:03.000") == 3723
+    strings = pd.Series(["0:00:07.000", "1:02:03.750"])
+    pd.testing.assert_series_equal(metamax_to_s(strings), pd.Series([7, 3723]))
+
+
+def test_lowpass_butter_columns():
+    rng = np.random.default_rng(0)
+    array = rng.normal(size=(1000, 3))
+
+    filtered = lowpass_butter_columns(array, sfreq=200.0, cutoff=15.0, order=2)
+    assert filtered.shape == array.shape
+    for col in range(3):
+        np.testing.assert_allclose(filtered[:, col], lowpass_butter(array[:, col], sfreq=200.0, cutoff=15.0, order=2))
+
+    sos = butter_sos(2, 15.0, 200.0)
+    sos[:] = 0  # callers get a copy, the cached design is unaffected
+    np.testing.assert_allclose(lowpass_butter_columns(array, sfreq=200.0, cutoff=15.0, order=2), filtered)
+
+
+def test_signal_lag():
+    rng = np.random.default_rng(0)
+    signal = rng.normal(size=3000)
+
+    delay, maxcorr = signal_lag(signal[100:2100], signal[80:2080], verbose=False)
+    assert delay == 20
+    assert 0.9 < maxcorr <= 1.0
+    delay, _ = signal_lag(signal[100:2100], signal[130:2130], max_lag=50, verbose=False)
+    assert delay == -30
+
+    def wave(t):
+        return np.sin(2 * np.pi * t) + 0.5 * np.sin(2 * np.pi * 2.3 * t)
+
+    time = np.arange(0, 50, 0.01)
+    delay, _ = signal_lag(wave(time), wave(time - 0.123), max_lag=100, subsample=True, verbose=False)
+    assert abs(delay - 12.3) < 0.1
@@ -1,15 +1,19 @@
 import importlib.metadata
 
-from . import com
-from . import kin
-from . import move
-from . import physio
-from . import utils
-from . import plots
-from . import imu
-from . import ana
-
 __version__ = importlib.metadata.version(__package__)
 del importlib  # clean up the namespace
 
-__all__ = ["com", "kin", "move", "physio", "utils", "plots", "imu", "ana"]
+__all__ = ["batch", "cache", "com", "kin", "move", "physio", "utils", "plots", "imu", "ana", "profiling"]
+
+
+def __getattr__(name):
+    """Import the submodules on first use, so `import worklab` doesn't load matplotlib, scipy, etc. up front."""
+    if name in __all__:
+        from importlib import import_module
+
+        return import_module(f".{name}", __name__)  # also sets the attribute, so this only runs once
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -3,12 +3,13 @@ import itertools as it
 import copy
 import math
 import pandas as pd
-import matplotlib.pyplot as plt
 
-from .plots import plot_power_speed_dist
 from .physio import calc_weighted_average
+from .profiling import profiled
+from .utils import time_slice
 
 
+@profiled
 def mean_data(data):
     """
     Combined data of left and right module
@@ -33,9 +34,13 @@ def mean_data(data):
     return data
 
 
+@profiled
 def cut_data(data, start, end, distance=True):
     """
-    Cuts data to time of interest
+    Cuts data to time of interest, the time of every module should be in ascending order.
+
+    The cut is found with a binary search (see utils.time_slice) and the columns other than time and dist are views of
+    the input data, so cutting does not copy them. Changing these columns in place also changes the input data.
 
     Parameters
     ----------
@@ -55,15 +60,17 @@ def cut_data(data, start, end, distance=True):
 
     """
     for side in data:
-        data[side] = data[side][(data[side]["time"] > start) & (data[side]["time"] < end)]
-        data[side]["time"] = data[side]["time"] - start
+        cut = data[side].iloc[time_slice(data[side]["time"], start, end)].copy(deep=False)
+        cut.index = pd.RangeIndex(len(cut))
+        cut["time"] = cut["time"] - start  # new columns, the other columns stay views
         if distance:
-            data[side]["dist"] = data[side]["dist"] - data[side]["dist"].iloc[0]
-        data[side].reset_index(drop=True, inplace=True)
+            cut["dist"] = cut["dist"] - cut["dist"].iloc[0]
+        data[side] = cut
 
     return data
 
 
+@profiled
 def isometricforce(data, title=None, height=40, distance=500, ylim=None):
     """
     Calculates the three seconds maximal user force and plots it against time (darkblue).
@@ -89,6 +96,8 @@ def isometricforce(data, title=None, height=40, distance=500, ylim=None):
     peaks : series
         peaks of maximal user force (averaged over left and right)
     """
+    import matplotlib.pyplot as plt
+
     # calculate 3s rolling average
     for side in data:
         data[side]["timed"] = pd.to_datetime(data[side]["time"], unit="s")
@@ -156,6 +165,7 @@ def isometricforce(data, title=None, height=40, distance=500, ylim=None):
     return fig, peaks
 
 
+@profiled
 def protocol_wingate(fiso, muser, mwc, v=2):
     """
     Calculates the protocol for the Wingate test on a wheelchair ergometer,
@@ -212,6 +222,7 @@ def protocol_wingate(fiso, muser, mwc, v=2):
     print(protocol)
 
 
+@profiled
 def wingate(data, title=None, box=False, ylim=5):
     """
     Wingate test analyse. Gives a plot with the power (green) and velocity (red),
@@ -234,6 +245,8 @@ def wingate(data, title=None, box=False, ylim=5):
     outcomes : dataframe
 
     """
+    import matplotlib.pyplot as plt
+
     # rolling average over 5 seconds
     for side in data:
         data[side]["p5"] = data[side]["power"].rolling(window=500).mean()
@@ -318,6 +331,7 @@ def wingate(data, title=None, box=False, ylim=5):
     return fig, outcomes
 
 
+@profiled
 def protocol_max(p30, muser, mwc, v=1.39):
     """
     Calculates the protocol for the Maximal exercise test on a wheelchair ergometer,
@@ -386,6 +400,7 @@ def protocol_max(p30, muser, mwc, v=1.39):
     print(protocol)
 
 
+@profiled
 def maximal1min(data, dur, title=None):
     """
     Maximal exercise test analyse. Gives a plot with the power (green) and velocity (red)
@@ -410,6 +425,8 @@ def maximal1min(data, dur, title=None):
     outcomes : dataframe
 
     """
+    import matplotlib.pyplot as plt
+
     # plot figure with 4 columns and x rows (depending on duration test)
     n = [*range(math.ceil(dur / 60))]
     ncolumns = 4  # columns in the figure
@@ -483,6 +500,7 @@ def maximal1min(data, dur, title=None):
     return fig, outcomes
 
 
+@profiled
 def ana_sprint(data, data_pbp, half=5, title=None):
     """
     Sprint test analyse. Plot a figure with the power, speed and distance for
@@ -505,6 +523,7 @@ def ana_sprint(data, data_pbp, half=5, title=None):
     outcomes : dataframe
 
     """
+    from .plots import plot_power_speed_dist
     if title:
         fig = plot_power_speed_dist(data, title)
     else:
@@ -547,6 +566,7 @@ def ana_sprint(data, data_pbp, half=5, title=None):
     return fig, outcomes
 
 
+@profiled
 def ana_submax(data_ergo, data_pbp, data_spiro):
     """
     Sub maximal test analyse. Saves important outcomes
@@ -0,0 +1,186 @@
+import sys
+import traceback
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from glob import glob
+from os import cpu_count, path
+
+import pandas as pd
+
+from . import cache, profiling
+
+
+def batch_process(files, pipeline, key=None, max_workers=None, max_in_flight=None, verbose=True):
+    """
+    Run a pipeline of worklab functions on many files in parallel.
+
+    Every file is processed in a separate process with the functions in pipeline. The first function receives the
+    filename, every next function receives the output of the previous one (tuples are unpacked), e.g.
+    [com.load, kin.auto_process] or [com.load, kin.auto_process, ana.ana_sprint]. The output of the last function is
+    collected into tables:
+
+    - a DataFrame is stored as "result"
+    - the DataFrames in a dictionary (e.g. push_by_push_ergo output) are stored per key
+    - for a tuple only the last element is used, as worklab functions return the table last, e.g. (data, pushes) or
+      (fig, outcomes)
+
+    The tables in the tuples returned by the other functions are collected as well, prefixed with the name of the
+    function, e.g. the pushes of kin.auto_process as "auto_process.left", "auto_process.right" and "auto_process.mean"
+    next to the outcomes of ana.ana_sprint as "result".
+
+    The tables of all files are concatenated with a key column. Failures are reported per file and do not stop the run,
+    this includes a failing key function and a worker process that crashes, after which the pool is restarted for the
+    remaining files.
+    When profiling is enabled (see .profiling.enable_profiling) the calls in the worker processes are recorded as well.
+
+    Parameters
+    ----------
+    files : str, list
+        glob pattern (e.g. "data/**/*.xls") or list of filenames
+    pipeline : list
+        functions to apply in order, use a (function, kwargs) tuple to pass keyword arguments to a function
+    key : callable, optional
+        function that takes the filename and returns a label (str) or labels (dict, e.g. participant and session) for
+        that file, default is the filename without extension in a "session" column
+    max_workers : int, optional
+        number of worker processes, default is the number of CPUs, use 1 to run in the current process
+    max_in_flight : int, optional
+        maximum number of files that are processed or waiting to be collected at the same time, bounds the memory usage,
+        default is two times max_workers
+    verbose : bool
+        print progress and failures, default is True
+
+    Returns
+    -------
+    results : dict
+        dictionary with a concatenated DataFrame per output table
+    errors : dict
+        dictionary with the traceback for every file that failed
+
+    """
+    files = sorted(glob(files, recursive=True)) if isinstance(files, str) else list(files)
+    steps = [partial(step[0], **step[1]) if isinstance(step, tuple) else step for step in pipeline]
+    key = _default_key if key is None else key
+    max_workers = max(max_workers or cpu_count() or 1, 1)  # cpu_count can be None
+    max_in_flight = 2 * max_workers if max_in_flight is None else max(max_in_flight, 1)
+    cache_config = dict(cache._config) if cache.cache_enabled() else None
+    profiling_config = dict(profiling._config) if profiling.profiling_enabled() else None
+
+    tables = defaultdict(list)
+    errors = {}
+
+    def collect(filename, outcome):
+        result, error, records = outcome
+        profiling._add_records(records)
+        if error is None:
+            try:
+                labels = key(filename)
+                labels = labels if isinstance(labels, dict) else {"session": labels}
+                result = {name: table.assign(**labels) for name, table in result.items()}
+            except Exception:
+                error = traceback.format_exc()
+        if error is not None:
+            errors[filename] = error
+            if verbose:
+                print(f"Processing {filename} failed:\n{error}")
+            return
+        for name, table in result.items():
+            tables[name].append(table)
+        if verbose:
+            print(f"Processed {filename}")
+
+    if max_workers == 1:
+        for filename in files:
+            collect(filename, _run_pipeline(filename, steps, None, None))
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            pending = {}
+            for filename in files:
+                if len(pending) >= max_in_flight:  # wait for a slot, so results don't pile up in memory
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(pending.pop(future), _outcome(future))
+                arguments = (_run_pipeline, filename, steps, cache_config, profiling_config)
+                try:
+                    future = executor.submit(*arguments)
+                except BrokenProcessPool:  # a worker crashed, the files in that pool are reported as failed
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=max_workers)
+                    future = executor.submit(*arguments)
+                pending[future] = filename
+            for future in wait(pending).done:
+                collect(pending[future], _outcome(future))
+        finally:
+            executor.shutdown()
+
+    results = {name: pd.concat(table, ignore_index=True) for name, table in tables.items()}
+    if verbose:
+        print("\n" + "=" * 80 + f"\nProcessed {len(files) - len(errors)} of {len(files)} files!\n" + "=" * 80 + "\n")
+    return results, errors
+
+
+def _default_key(filename):
+    return path.splitext(path.basename(filename))[0]
+
+
+def _outcome(future):
+    """Outcome of a worker, a crashed worker or an output that can't be sent back is reported as a failure."""
+    try:
+        return future.result()
+    except Exception:
+        return None, traceback.format_exc(), []
+
+
+def _run_pipeline(filename, steps, cache_config, profiling_config):
+    """
+    Runs all steps on a single file, returns the output tables, the traceback if anything went wrong and the profiling
+    records of the worker (empty when running in the main process).
+    """
+    if cache_config is not None and not cache.cache_enabled():  # spawned workers don't inherit the cache settings
+        cache.enable_cache(**cache_config)
+    if profiling_config is not None and not profiling.profiling_enabled():
+        profiling.enable_profiling(memory=profiling_config["memory"])
+    start = len(profiling._records)  # forked workers inherit the records of the main process
+    try:
+        tables, output = {}, filename
+        for number, step in enumerate(steps):
+            output = step(*output) if isinstance(output, tuple) else step(output)
+            if number < len(steps) - 1 and isinstance(output, tuple):  # e.g. the pushes of kin.auto_process
+                tables.update(_to_tables(output, name=_step_name(step)))
+        tables.update(_to_tables(output))
+        return tables, None, _worker_records(profiling_config, start)
+    except Exception:
+        return None, traceback.format_exc(), _worker_records(profiling_config, start)
+    finally:
+        _close_figures()
+
+
+def _worker_records(profiling_config, start):
+    return profiling._take_records(start) if profiling_config is not None else []
+
+
+def _step_name(step):
+    step = step.func if isinstance(step, partial) else step
+    return getattr(step, "__name__", type(step).__name__)
+
+
+def _to_tables(output, name=None):
+    """Tables in the output of a step, name is the prefix for the tables of the other steps than the last one."""
+    if isinstance(output, tuple):
+        output = output[-1]
+    if isinstance(output, pd.DataFrame):
+        return {name or "result": output}
+    if isinstance(output, dict) and any(isinstance(table, pd.DataFrame) for table in output.values()):
+        return {f"{name}.{key}" if name else key: t for key, t in output.items() if isinstance(t, pd.DataFrame)}
+    if name is not None:  # other steps don't need to return tables
+        return {}
+    raise TypeError(f"Last step should return a DataFrame or a dict of DataFrames, got {type(output).__name__}")
+
+
+def _close_figures():
+    """Close figures made by plotting steps, so long runs don't accumulate them."""
+    if "matplotlib.pyplot" in sys.modules:
+        sys.modules["matplotlib.pyplot"].close("all")
@@ -0,0 +1,210 @@
+import hashlib
+import os
+import pickle
+import re
+from functools import lru_cache, wraps
+from glob import glob
+from importlib.util import find_spec
+from inspect import signature
+from os import path
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1  # bump to invalidate all existing cache entries
+PARQUET = find_spec("pyarrow") is not None  # parquet is optional, falls back to pickle
+
+_config = {"directory": None, "max_size": 2**30}
+_ENTRY = re.compile(r"[0-9a-f]{16}-[0-9a-f]{16}-[0-9a-f]{32}\.(npy|parquet|pkl)")  # only files written by the cache
+
+
+def enable_cache(directory=None, max_size=2**30):
+    """
+    Enable the on-disk cache for the loaders in the com module.
+
+    Once enabled, the result of every file-based loader is stored in a binary format (Parquet for DataFrames if pyarrow
+    is installed, .npy for arrays, pickle otherwise). Later calls with the same file and arguments return the cached
+    result instead of parsing the raw file again. The cache is disabled by default.
+
+    Parameters
+    ----------
+    directory : str, optional
+        directory where the cache is stored, default is ~/.cache/worklab
+    max_size : int
+        maximum size of the cache in bytes, the least recently used entries are removed first, default is 1 GiB
+
+    See Also
+    --------
+    disable_cache, clear_cache, invalidate_cache
+
+    """
+    directory = path.join(path.expanduser("~"), ".cache", "worklab") if directory is None else directory
+    os.makedirs(directory, exist_ok=True)
+    _config["directory"] = directory
+    _config["max_size"] = max_size
+
+
+def disable_cache():
+    """Disable the on-disk cache, existing entries are kept on disk."""
+    _config["directory"] = None
+
+
+def cache_enabled():
+    """Returns True if the on-disk cache is enabled."""
+    return _config["directory"] is not None
+
+
+def clear_cache():
+    """Remove all entries from the on-disk cache."""
+    for entry in _cache_entries():
+        _remove(entry)
+
+
+def invalidate_cache(filename):
+    """
+    Remove all cache entries that belong to a source file.
+
+    Parameters
+    ----------
+    filename : str
+        path to the source file
+
+    """
+    if not cache_enabled():
+        return
+    for entry in _cache_entries(_path_hash(filename) + "-*"):
+        _remove(entry)
+
+
+def cache_size():
+    """Returns the total size of the on-disk cache in bytes."""
+    return sum(path.getsize(entry) for entry in _cache_entries())
+
+
+def cached(func):
+    """
+    Decorator that adds the on-disk cache to a loader that takes a filename as first argument.
+
+    The cache key consists of the path, modification time, size and content hash of the file and the (bound) arguments
+    of the loader. The decorated function behaves exactly like the original one when the cache is disabled. A cache
+    hit does not call the loader, so anything it prints is not printed again: loaders with a verbose summary print it
+    outside the cached function, see com.load_n3d.
+
+    """
+    func_signature = signature(func)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = func_signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        filename, *arguments = bound.arguments.values()
+        if not cache_enabled() or not isinstance(filename, (str, os.PathLike)) or not path.isfile(filename):
+            return func(*args, **kwargs)
+
+        path_key = _path_hash(filename)
+        args_key = _hash(f"{CACHE_VERSION}{func.__module__}.{func.__qualname__}{arguments!r}".encode())
+        prefix = path.join(_config["directory"], f"{path_key}-{args_key}")
+        entry = f"{prefix}-{_content_hash(filename)}"
+
+        for candidate in glob(entry + ".*"):
+            try:
+                data = _read(candidate)
+            except Exception:  # corrupt or unreadable entry, just parse the file again
+                _remove(candidate)
+                continue
+            os.utime(candidate)  # mark as recently used
+            return data
+
+        data = func(*args, **kwargs)
+        for stale in _cache_entries(f"{path_key}-{args_key}-*"):  # older versions of the same file
+            _remove(stale)
+        _write(entry, data)
+        _evict()
+        return data
+
+    return wrapper
+
+
+def _hash(content):
+    return hashlib.blake2b(content, digest_size=8).hexdigest()
+
+
+def _path_hash(filename):
+    return _hash(path.abspath(filename).encode())
+
+
+def _content_hash(filename):
+    stat = os.stat(filename)
+    return _file_hash(path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=1024)
+def _file_hash(filename, mtime, size):
+    """Content hash of a file, unchanged files (same mtime and size) are only hashed once per process."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write(entry, data):
+    if isinstance(data, np.ndarray) and data.dtype != object:
+        filename = entry + ".npy"
+    elif PARQUET and isinstance(data, pd.DataFrame) and all(isinstance(col, str) for col in data.columns):
+        filename = entry + ".parquet"
+    else:
+        filename = entry + ".pkl"
+
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"  # write and rename, so other processes never see partial files
+    try:
+        with open(tmp_filename, "wb") as f:
+            if filename.endswith(".npy"):
+                np.save(f, data)
+            elif filename.endswith(".parquet"):
+                data.to_parquet(f)
+            else:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+    except Exception:  # caching should never break loading
+        _remove(tmp_filename)
+
+
+def _read(filename):
+    if filename.endswith(".npy"):
+        return np.load(filename)
+    elif filename.endswith(".parquet"):
+        return pd.read_parquet(filename)
+    with open(filename, "rb") as f:
+        return pickle.load(f)
+
+
+def _cache_entries(pattern="*"):
+    """Cache entries in the cache directory that match the glob pattern, other files in the directory are ignored."""
+    if not cache_enabled():
+        return []
+    return [entry for entry in glob(path.join(_config["directory"], pattern)) if _ENTRY.fullmatch(path.basename(entry))]
+
+
+def _evict():
+    """Remove the least recently used entries until the cache fits within max_size."""
+    entries = []
+    for entry in _cache_entries():
+        try:
+            stat = os.stat(entry)
+        except FileNotFoundError:  # removed by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= _config["max_size"]:
+            break
+        _remove(entry)
+        total -= size
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
@@ -1,28 +1,59 @@
-import copy
-import csv
-from collections import defaultdict
-from glob import glob
+import io
+from collections import OrderedDict, defaultdict
+from contextlib import redirect_stdout
+from glob import escape, glob
 from os import listdir, path
 from struct import unpack
 
 import numpy as np
 import pandas as pd
 
-from .utils import pick_file, pd_dt_to_s, merge_chars, metamax_to_s
-
-
-def load(filename=""):
+from .cache import cached
+from .profiling import profiled
+from .utils import pick_file, pd_dt_to_s, merge_chars, metamax_to_s, cast_channels, FULL_PRECISION
+
+N3D_HEADER_SIZE = 256  # bytes before the marker data in an Optotrak .n3d file
+
+
+HEAD_SIZE = 4096  # bytes that are read to detect the format of a file
+SPIRO_COLUMNS = [  # columns of load_spiro, in order
+    "time",
+    "HR",
+    "EE",
+    "RER",
+    "VO2",
+    "VCO2",
+    "VE",
+    "VE/VO2",
+    "VE/VCO2",
+    "O2pulse",
+    "PetO2",
+    "PetCO2",
+    "VT",
+    "weights",
+]
+SPIRO_OPTIONAL = ["EEm", "HR", "PetO2", "PetCO2", "VT"]  # breath fields that are not always recorded, NaN if missing
+_loaders = OrderedDict()  # name: (loader, sniffer, description), checked in order by detect_format
+
+
+@profiled
+def load(filename="", verbose=True, **kwargs):
     """
     Attempt to load a common data format.
 
     Most important function in the module. Provides high level loading function to load common data formats.
-    If no filename is given will try to load filename using a file dialog. Will try to infer data source from filename.
-    Try to use a specific load function if load cannot infer the datatype.
+    If no filename is given will try to load filename using a file dialog. The data source is detected from the content
+    of the file (first few KB, Excel sheet names, folder layout), not from the filename, see detect_format. Use a
+    specific load function if load cannot detect the data source.
 
     Parameters
     ----------
     filename : str
-        name or path to file of interest
+        name or path to file (or folder for IMU sessions) of interest
+    verbose : bool
+        print which data source was detected and the messages of the load function, default is True
+    kwargs
+        passed on to the load function of the data source, e.g. dtype=np.float32
 
     Returns
     -------
@@ -31,56 +62,204 @@ def load(filename=""):
 
     See Also
     --------
-    load_bike, load_esseda, load_hsb, load_n3d, load_opti, load_optitrack, load_imu, load_spiro, load_spline,
-    load_sw, load_opti_offset
-
-    """
-    filename = pick_file() if not filename else filename
-    filename_lower = filename.lower()
-    if not filename_lower:
-        raise Exception("Please provide a filename")
-    print("\n" + "=" * 80)
-    print(f"Initializing loading for {filename} ...")
-    if ".xlsx" in filename_lower or "spiro" in filename_lower:  # COSMED
-        print("File identified as COSMED datafile. Attempting to load ...")
-        data = load_spiro(filename)
-    elif "bike" in filename_lower:
-        print("File identified as Bicycle ergometer datafile. Attempting to load ...")
-        data = load_bike(filename)
-    elif "offset" in filename_lower:
-        print("File identified as Optipush offset datafile. Attempting to load...")
-        data = load_opti_offset(filename)
-    elif ".xls" in filename_lower:
-        print("File identified as Esseda datafile. Attempting to load ...")
-        data = load_esseda(filename)
-    elif "HSB.csv" in filename_lower:
-        print("File identified as HSB-logger datafile. Attempting to load ...")
-        data = load_hsb(filename)
-    elif ".txt" in filename_lower and "drag" not in filename_lower:
-        print("File identified as SMARTwheel datafile. Attempting to load ...")
-        data = load_sw(filename)
-    elif ".dat" in filename_lower:
-        print("File identified as Optipush datafile. Attempting to load ...")
-        data = load_opti(filename)
-    elif ".n3d" in filename_lower:
-        print("File identified as Optotrak datafile. Attempting to load ...")
-        data = load_n3d(filename)
-    elif ".xml" in filename_lower:
-        print("Folder identified as NGIMU folder. Attempting to load ...")
-        data = load_imu(path.split(filename)[0])
-    elif "drag" in filename_lower:
-        print("File identified as dragtest datafile. Attempting to load ...")
-        data = load_drag_test(filename)
-    elif ".csv" in filename_lower:
-        print("File identified as optitrack datafile. Attempting to load ...")
-        data = load_optitrack(filename)
-    else:
-        raise Exception("No file name given or could not identify data source with load!!")
+    detect_format, register_loader, load_bike, load_esseda, load_hsb, load_n3d, load_opti, load_optitrack, load_imu,
+    load_ximu3, load_spiro, load_sw, load_opti_offset, load_drag_test
+
+    """
+    filename = pick_file() if not filename else str(filename)
+    if not filename:
+        raise ValueError("Please provide a filename")
+    if verbose:
+        print("\n" + "=" * 80)
+        print(f"Initializing loading for {filename} ...")
+    name = detect_format(filename)
+    if name is None:
+        raise ValueError(
+            f"Could not identify the data source of {filename}, use a specific load function or register a loader for "
+            f"it with register_loader. Known data sources: {', '.join(_loaders)}"
+        )
+    loader, _, description = _loaders[name]
+    if not verbose:
+        with redirect_stdout(io.StringIO()):  # also silences the messages of the loader
+            return loader(filename, **kwargs)
+    print(f"File identified as {description}. Attempting to load ...")
+    data = loader(filename, **kwargs)
     print("Data loaded!")
     print("=" * 80 + "\n")
     return data
 
 
+def register_loader(name, loader, sniffer, description=None, first=True):
+    """
+    Register a load function for a data source, so it can be loaded with load.
+
+    Parameters
+    ----------
+    name : str
+        name of the data source, registering an existing name replaces that loader
+    loader : callable
+        function that takes the filename (and keyword arguments of load) and returns the data
+    sniffer : callable
+        function that takes a FileHead and returns True if the file belongs to the data source, it should be cheap
+        (only use the head, sheet names or folder layout) and should not raise for other data sources
+    description : str, optional
+        description of the data source for the messages of load, default is the name
+    first : bool
+        check this data source before the registered ones, default is True so custom loaders take precedence
+
+    Examples
+    --------
+    >>> register_loader("treadmill", load_treadmill, lambda file: file.lines[:1] == ["Treadmill log"])
+
+    .. note:: batch_process workers only know loaders that are registered when your module is imported, so register
+        them at the top level of a module (not under if __name__ == "__main__")
+
+    """
+    _loaders.pop(name, None)
+    _loaders[name] = (loader, sniffer, name if description is None else description)
+    if first:
+        _loaders.move_to_end(name, last=False)
+
+
+def unregister_loader(name):
+    """Remove a data source from load, raises a KeyError for unknown names."""
+    del _loaders[name]
+
+
+def detect_format(filename):
+    """
+    Detect the data source of a file from its content.
+
+    Reads the first few KB of the file (or the layout of a folder) and returns the name of the first registered data
+    source whose sniffer accepts it.
+
+    Parameters
+    ----------
+    filename : str
+        name or path to file or folder
+
+    Returns
+    -------
+    name : str, None
+        name of the data source, None if it could not be identified
+
+    See Also
+    --------
+    load, register_loader
+
+    """
+    head = FileHead(filename)
+    for name, (_, sniffer, _) in _loaders.items():
+        try:
+            if sniffer(head):
+                return name
+        except Exception:  # a sniffer should never break detection of the other sources
+            continue
+    return None
+
+
+class FileHead:
+    """
+    Cheap view on the start of a file, passed to the sniffers of detect_format.
+
+    Attributes
+    ----------
+    filename : str
+        name or path to the file or folder
+    is_dir : bool
+        True if filename is a folder
+    size : int
+        size of the file in bytes, 0 for folders
+    head : bytes
+        first HEAD_SIZE bytes of the file, empty for folders
+    lines : list
+        complete text lines in head (decoded as latin-1)
+    sheet_names : list
+        names of the sheets for Excel files (.xls and .xlsx), empty for other files, only read when used
+    first_row : list
+        text in the first row of the first sheet for Excel files, empty for other files, only read when used
+
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+        self.is_dir = path.isdir(self.filename)
+        self.size = 0 if self.is_dir else path.getsize(self.filename)
+        self.head = b""
+        if not self.is_dir:
+            with open(self.filename, "rb") as f:
+                self.head = f.read(HEAD_SIZE)
+        lines = self.head.decode("latin-1").splitlines()
+        self.lines = lines[:-1] if len(self.head) == HEAD_SIZE else lines  # last line can be cut off
+        self._sheet_names = None
+        self._first_row = None
+
+    @property
+    def is_xls(self):
+        return self.head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")  # OLE2 compound file
+
+    @property
+    def is_xlsx(self):
+        return self.head.startswith(b"PK\x03\x04") and "xl/workbook.xml" in self._zip_names()
+
+    @property
+    def sheet_names(self):
+        if self._sheet_names is None:
+            self._sheet_names = _xls_sheet_names(self.filename) if self.is_xls else []
+            self._sheet_names = _xlsx_sheets(self.filename)[0] if self.is_xlsx else self._sheet_names
+        return self._sheet_names
+
+    @property
+    def first_row(self):
+        if self._first_row is None:
+            self._first_row = _xls_first_row(self.filename) if self.is_xls else []
+            self._first_row = _xlsx_sheets(self.filename)[1] if self.is_xlsx else self._first_row
+        return self._first_row
+
+    def _zip_names(self):
+        from zipfile import ZipFile, BadZipFile
+
+        try:
+            with ZipFile(self.filename) as archive:
+                return archive.namelist()
+        except BadZipFile:
+            return []
+
+
+def _xls_sheet_names(filename):
+    """Sheet names of an .xls file, none of the sheets are parsed."""
+    import xlrd
+
+    with xlrd.open_workbook(filename, on_demand=True, logfile=io.StringIO()) as workbook:
+        return workbook.sheet_names()
+
+
+def _xls_first_row(filename):
+    """Text in the first row of the first sheet of an .xls file, only the first sheet is parsed."""
+    import xlrd
+
+    with xlrd.open_workbook(filename, on_demand=True, logfile=io.StringIO()) as workbook:
+        first = workbook.sheet_by_index(0)
+        return [cell for cell in (first.row_values(0) if first.nrows else []) if isinstance(cell, str) and cell]
+
+
+def _xlsx_sheets(filename):
+    """Sheet names and the first shared strings (in practice the header of the first sheet), nothing else is parsed."""
+    import re
+    from zipfile import ZipFile
+
+    with ZipFile(filename) as archive:
+        workbook = archive.read("xl/workbook.xml").decode("utf-8", errors="ignore")
+        strings = ""
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with archive.open("xl/sharedStrings.xml") as f:
+                strings = f.read(HEAD_SIZE * 4).decode("utf-8", errors="ignore")
+    names = re.findall(r'<(?:\w+:)?sheet\b[^>]*?\bname="([^"]*)"', workbook)
+    return names, re.findall(r"<(?:\w+:)?t(?:\s[^>]*)?>([^<]*)</(?:\w+:)?t>", strings)
+
+
+@profiled
+@cached
 def load_spiro(filename):
     """
     Loads COSMED spirometer data from Excel file.
@@ -132,39 +311,51 @@ def load_spiro(filename):
         Spirometer data in pandas DataFrame
 
     """
-    data = pd.read_excel(filename, skiprows=[1, 2])
-    data["time"] = data.apply(lambda row: pd_dt_to_s(row["t"]), axis=1)  # hh:mm:ss to s
+    data = convert_spiro(pd.read_excel(filename, skiprows=[1, 2]))
+    return data[data["time"] > 0]  # remove "missing" data
+
+
+@profiled
+def convert_spiro(data, previous_time=None):
+    """
+    Converts raw COSMED breath records to the columns and units of load_spiro.
+
+    Used by load_spiro for a whole export and by physio.SpiroStream for breaths that come in during a test. Breaths
+    with a time of zero (missing data) are not removed, missing optional fields (SPIRO_OPTIONAL) are filled with NaN.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        breath records with the columns of the COSMED export (t, VO2, VCO2, VE, EEm, HR, PetO2, PetCO2, VT)
+    previous_time : float, optional
+        time of the breath before the first record [s], used for the weight of the first record, which is zero if not
+        given
+
+    Returns
+    -------
+    data : pd.DataFrame
+        Spirometer data with the columns of load_spiro (SPIRO_COLUMNS)
+
+    """
+    data = data.copy()
+    for col in SPIRO_OPTIONAL:  # e.g. HR is missing when the sensor is not detected
+        if col not in data:
+            data[col] = np.NaN
+    data["time"] = pd_dt_to_s(data["t"])  # hh:mm:ss to s
     data["EE"] = data["EEm"] * 4184 / 60  # kcal/min to J/s
-    data["weights"] = np.insert(np.diff(data["time"]), 0, 0)  # used for calculating weighted average
+    first = 0 if previous_time is None else data["time"].iloc[0] - previous_time
+    data["weights"] = np.insert(np.diff(data["time"]), 0, first) if len(data) else []  # for the weighted average
     data["VO2"] = data["VO2"] / 1000  # to l/min
     data["VCO2"] = data["VCO2"] / 1000  # to l/min
     data["RER"] = data["VCO2"] / data["VO2"]
-    data["HR"] = np.NaN if "HR" not in data else data["HR"]  # missing when sensor is not detected
     data["O2pulse"] = data["VO2"] / data["HR"]
     data["VE/VO2"] = data["VE"] / data["VO2"]
     data["VE/VCO2"] = data["VE"] / data["VCO2"]
-
-    data = data[data["time"] > 0]  # remove "missing" data
-    return data[
-        [
-            "time",
-            "HR",
-            "EE",
-            "RER",
-            "VO2",
-            "VCO2",
-            "VE",
-            "VE/VO2",
-            "VE/VCO2",
-            "O2pulse",
-            "PetO2",
-            "PetCO2",
-            "VT",
-            "weights",
-        ]
-    ]
+    return data[SPIRO_COLUMNS]
 
 
+@profiled
+@cached
 def load_spiro_metamax(filename):
     """
     Loads metamax 3B spirometer data from Excel file.
@@ -229,7 +420,7 @@ def load_spiro_metamax(filename):
     data.drop(
         labels=["Phase", "Marker", "V'O2/kg", "V'O2/HR", "WR", "V'E/V'O2", "V'E/V'CO2", "BF"], axis=1, inplace=True
     )
-    data["time"] = data.apply(lambda row: metamax_to_s(row["time"]), axis=1)  # hh:mm:ss.000 to s
+    data["time"] = metamax_to_s(data["time"])  # hh:mm:ss.000 to s
     data["VO2"] = data["VO2"].astype(float)
     data["EE"] = ((4.94 * data["RER"] + 16.04) * (1000 * data["VO2"])) / 60
     data["weights"] = np.insert(np.diff(data["time"]), 0, 0)  # used for calculating weighted average
@@ -245,7 +436,9 @@ def load_spiro_metamax(filename):
     return data[["time", "HR", "EE", "RER", "VO2", "VCO2", "VE", "VE/VO2", "VE/VCO2", "O2pulse", "VT", "weights"]]
 
 
-def load_opti(filename, rotate=True):
+@profiled
+@cached
+def load_opti(filename, rotate=True, dtype=np.float64):
     """
     Loads Optipush data from .data file.
 
@@ -280,6 +473,9 @@ def load_opti(filename, rotate=True):
         filename or path to Optipush .data (.csv) file
     rotate : bool
         whether or not to rotate from a local rotating axis system to a global non-rotating one, default is True
+    dtype : np.dtype
+        dtype of the force and torque channels, use np.float32 to halve the memory footprint, time and angle are always
+        float64, default is np.float64
 
     Returns
     -------
@@ -291,10 +487,53 @@ def load_opti(filename, rotate=True):
     load_sw : Load measurement wheel data from a SMARTwheel
 
     """
+    return _convert_opti(_read_opti(filename, dtype=dtype), rotate, dtype)
+
+
+def iter_opti(filename, chunksize=100_000, rotate=True, dtype=np.float64):
+    """
+    Loads Optipush data in chunks.
+
+    Generator version of load_opti that reads and converts the file in chunks, for recordings that are too large to
+    load at once. Every chunk is a DataFrame in the same format as the output of load_opti.
+
+    Parameters
+    ----------
+    filename : str
+        filename or path to Optipush .data (.csv) file
+    chunksize : int
+        number of samples per chunk, default is 100000
+    rotate : bool
+        whether or not to rotate from a local rotating axis system to a global non-rotating one, default is True
+    dtype : np.dtype
+        dtype of the force and torque channels, use np.float32 to halve the memory footprint, time and angle are always
+        float64, default is np.float64
+
+    Yields
+    ------
+    opti_df : pd.DataFrame
+        chunk of raw Optipush data
+
+    See Also
+    --------
+    load_opti, .kin.process_mw_chunked
+
+    """
+    with _read_opti(filename, chunksize=chunksize, dtype=dtype) as reader:
+        for chunk in reader:
+            yield _convert_opti(chunk.reset_index(drop=True), rotate, dtype)
+
+
+def _read_opti(filename, chunksize=None, dtype=np.float64):
     names = ["time", "fx", "fy", "fz", "mx", "my", "torque", "angle"]
-    dtypes = {name: np.float64 for name in names}
+    dtypes = {name: np.float64 if name in FULL_PRECISION else dtype for name in names}
     usecols = [0, 3, 4, 5, 6, 7, 8, 9]
-    opti_df = pd.read_csv(filename, names=names, delimiter="\t", usecols=usecols, dtype=dtypes, skiprows=12)
+    return pd.read_csv(
+        filename, names=names, delimiter="\t", usecols=usecols, dtype=dtypes, skiprows=12, chunksize=chunksize
+    )
+
+
+def _convert_opti(opti_df, rotate=True, dtype=np.float64):
     opti_df["angle"] *= np.pi / 180
     opti_df["torque"] *= -1
     if rotate:
@@ -302,10 +541,12 @@ def load_opti(filename, rotate=True):
         fy = opti_df["fx"] * -np.sin(opti_df["angle"]) + opti_df["fy"] * np.cos(opti_df["angle"])
         opti_df["fx"] = fx
         opti_df["fy"] = fy
-    return opti_df
+    return cast_channels(opti_df, dtype)
 
 
-def load_sw(filename, sfreq=200):
+@profiled
+@cached
+def load_sw(filename, sfreq=200, dtype=np.float64):
     """
     Loads SMARTwheel data from .txt file.
 
@@ -339,6 +580,9 @@ def load_sw(filename, sfreq=200):
         filename or path to SMARTwheel .data (.csv) file
     sfreq : int
         sample frequency of SMARTwheel, default is 200Hz
+    dtype : np.dtype
+        dtype of the force and torque channels, use np.float32 to halve the memory footprint, time and angle are always
+        float64, default is np.float64
 
     Returns
     -------
@@ -350,16 +594,67 @@ def load_sw(filename, sfreq=200):
     load_opti : Load measurement wheel data from an Optipush wheel.
 
     """
-    names = ["time", "angle", "fx", "fy", "fz", "mx", "my", "torque"]
-    dtypes = {name: np.float64 for name in names}
-    usecols = [1, 3, 18, 19, 20, 21, 22, 23]
-    sw_df = pd.read_csv(filename, names=names, usecols=usecols, dtype=dtypes)
+    sw_df = _read_sw(filename, dtype=dtype)
     sw_df["time"] /= sfreq
     sw_df["angle"] = np.unwrap(sw_df["angle"] * (np.pi / 180)) * -1  # in radians
     return sw_df
 
 
-def load_hsb(filename):
+def iter_sw(filename, chunksize=100_000, sfreq=200, dtype=np.float64):
+    """
+    Loads SMARTwheel data in chunks.
+
+    Generator version of load_sw that reads and converts the file in chunks, for recordings that are too large to load
+    at once. Every chunk is a DataFrame in the same format as the output of load_sw, the angle is unwrapped across
+    chunks.
+
+    Parameters
+    ----------
+    filename : str
+        filename or path to SMARTwheel .data (.csv) file
+    chunksize : int
+        number of samples per chunk, default is 100000
+    sfreq : int
+        sample frequency of SMARTwheel, default is 200Hz
+    dtype : np.dtype
+        dtype of the force and torque channels, use np.float32 to halve the memory footprint, time and angle are always
+        float64, default is np.float64
+
+    Yields
+    ------
+    sw_df : pd.DataFrame
+        chunk of raw SMARTwheel data
+
+    See Also
+    --------
+    load_sw, .kin.process_mw_chunked
+
+    """
+    last_angle = None  # (raw, unwrapped) angle of the previous chunk
+    with _read_sw(filename, chunksize=chunksize, dtype=dtype) as reader:
+        for sw_df in reader:
+            sw_df = sw_df.reset_index(drop=True)
+            sw_df["time"] /= sfreq
+            angle = sw_df["angle"].to_numpy() * (np.pi / 180)
+            if last_angle is None:
+                unwrapped = np.unwrap(angle)
+            else:  # continue from the last sample of the previous chunk
+                unwrapped = np.unwrap(np.concatenate(([last_angle[0]], angle)))[1:] + (last_angle[1] - last_angle[0])
+            last_angle = (angle[-1], unwrapped[-1])
+            sw_df["angle"] = unwrapped * -1  # in radians
+            yield sw_df
+
+
+def _read_sw(filename, chunksize=None, dtype=np.float64):
+    names = ["time", "angle", "fx", "fy", "fz", "mx", "my", "torque"]
+    dtypes = {name: np.float64 if name in FULL_PRECISION else dtype for name in names}
+    usecols = [1, 3, 18, 19, 20, 21, 22, 23]
+    return pd.read_csv(filename, names=names, usecols=usecols, dtype=dtypes, chunksize=chunksize)
+
+
+@profiled
+@cached
+def load_hsb(filename, chunksize=None, dtype=np.float64):
     """
     Loads HSB ergometer data from HSB datafile.
 
@@ -371,6 +666,11 @@ def load_hsb(filename):
     ----------
     filename : str
         full file path or file in existing path from HSB .csv file
+    chunksize : int, optional
+        number of rows to parse at a time, can be used to limit memory usage for very long logs, default is None
+    dtype : np.dtype
+        dtype of the force and speed channels, use np.float32 to halve the memory footprint, time is always float64,
+        default is np.float64
 
     Returns
     -------
@@ -378,39 +678,49 @@ def load_hsb(filename):
         dictionary with DataFrame for left and right module
 
     """
-    # noinspection PyTypeChecker
-    data = {"left": defaultdict(list), "right": defaultdict(list)}
-    with open(filename, "r") as csvfile:
-        reader = csv.reader(csvfile, delimiter=";")
-        next(reader, None)  # skip header
-        for row in reader:
-            if row[0] == "0":
-                data["left"]["time"].append(float(row[1].replace(",", ".")))
-                data["left"]["force"].append(float(row[2].replace(",", ".")))
-                data["left"]["speed"].append(float(row[3].replace(",", ".")))
-            else:
-                data["right"]["time"].append(float(row[1].replace(",", ".")))
-                data["right"]["force"].append(float(row[2].replace(",", ".")))
-                data["right"]["speed"].append(float(row[3].replace(",", ".")))
+    names = ["module", "time", "force", "speed"]
+    reader = pd.read_csv(
+        filename,
+        sep=";",
+        decimal=",",
+        header=0,
+        names=names,
+        usecols=[0, 1, 2, 3],
+        dtype=np.float64,
+        float_precision="round_trip",
+        chunksize=chunksize,
+    )
+    chunks = [reader] if chunksize is None else reader
+
+    data = {"left": {key: [] for key in names[1:]}, "right": {key: [] for key in names[1:]}}
+    for chunk in chunks:
+        values = chunk.to_numpy()
+        left = values[:, 0] == 0  # left module is 0, everything else is right
+        for key, col in zip(names[1:], values[:, 1:].T):
+            data["left"][key].append(col[left])
+            data["right"][key].append(col[~left])
+
     for side in data:
-        data[side] = {dkey: np.asarray(data[side][dkey]) for dkey in data[side]}  # Convert to arrays
+        data[side] = {dkey: np.concatenate(data[side][dkey]) for dkey in data[side]}
         if data[side]["time"].size:  # Remove time offset
             data[side]["time"] -= data[side]["time"][0]
-            if data[side]["time"][1] - data[side]["time"][0] > 0.1:
+            if data[side]["time"].size > 1 and data[side]["time"][1] - data[side]["time"][0] > 0.1:
                 data[side]["time"] *= 0.01
-        else:
-            print("No right module detected!")
-            data["right"] = {key: np.zeros(data["left"]["time"].size) for key in data["right"]}
+    if not data["right"]["time"].size:
+        print("No right module detected!")
+        data["right"] = {key: np.zeros(data["left"]["time"].size) for key in data["right"]}
     for side in data:
         if np.mean(data[side]["force"]) < 0:
             data[side]["force"] *= -1  # Flip force direction
         if np.mean(data[side]["speed"]) < 0:
             data[side]["speed"] *= -1  # Flip speed direction
     data = {"left": pd.DataFrame(data["left"]), "right": pd.DataFrame(data["right"])}
-    return data
+    return cast_channels(data, dtype)
 
 
-def load_esseda(filename):
+@profiled
+@cached
+def load_esseda(filename, dtype=np.float64):
     """
     Loads HSB ergometer data from LEM datafile.
 
@@ -421,6 +731,9 @@ def load_esseda(filename):
     ----------
     filename : str
         full file path or file in existing path from LEM Excel sheet (.xls)
+    dtype : np.dtype
+        dtype of the force and speed channels, use np.float32 to halve the memory footprint, time is always float64,
+        default is np.float64
 
     Returns
     -------
@@ -431,14 +744,21 @@ def load_esseda(filename):
     --------
     load_wheelchair: Load wheelchair information from LEM datafile.
     load_spline: Load calibration splines from LEM datafile.
+    load_lem_session: Load all of the above at once.
 
     """
-    df = pd.read_excel(filename, sheet_name="HSB")
+    return _parse_esseda(pd.read_excel(filename, sheet_name="HSB"), dtype)
+
+
+def _parse_esseda(df, dtype=np.float64):
+    """Converts the HSB sheet of a LEM datafile to the load_esseda format."""
     df = df.dropna(axis=1, how="all")  # remove empty columns
-    df = df.apply(lambda col: pd.to_numeric(col.str.replace(",", ".")) if isinstance(col[0], str) else col, axis=0)
+    values = df.to_numpy(dtype=object if (df.dtypes == object).any() else np.float64)
+    if values.dtype == object:
+        values = _decimal_comma(values)
 
     cols = len(df.columns) // 5  # LEM does this annoying thing where it starts in new columns
-    mats = np.split(df.values, cols, axis=1)
+    mats = np.split(values, cols, axis=1)
     dmat = np.concatenate(tuple(mats), axis=0)
 
     data = {"left": pd.DataFrame(), "right": pd.DataFrame()}
@@ -452,9 +772,17 @@ def load_esseda(filename):
     for side in data:
         data[side].interpolate(inplace=True)
         data[side]["time"] -= data[side]["time"][0]  # time should start at 0.0s
-    return data
+    return cast_channels(data, dtype)
+
+
+def _decimal_comma(values):
+    """Converts an array of numbers and strings with decimal commas to floats, all at once instead of per column."""
+    text = "\n".join(map(str, values.ravel())).replace(",", ".")
+    return np.array(text.split("\n"), dtype=np.float64).reshape(values.shape)
 
 
+@profiled
+@cached
 def load_wheelchair(filename):
     """
     Loads wheelchair from LEM datafile.
@@ -486,8 +814,12 @@ def load_wheelchair(filename):
         dictionary with wheelchair information
     """
 
-    data = pd.read_excel(filename, sheet_name=2)
-    data.iloc[10, 1] = data.iloc[10, 1].replace(",", ".")
+    return _parse_wheelchair(pd.read_excel(filename, sheet_name=2))
+
+
+def _parse_wheelchair(data):
+    """Converts the wheelchair settings sheet of a LEM datafile to the load_wheelchair format."""
+    data.iloc[10, 1] = str(data.iloc[10, 1]).replace(",", ".")
     wheelchair = {
         "name": data.iloc[1, 1],
         "rimsize": float(data.iloc[7, 1]) / 1000 / 2,
@@ -498,6 +830,8 @@ def load_wheelchair(filename):
     return wheelchair
 
 
+@profiled
+@cached
 def load_bike(filename):
     """
     Load bicycle ergometer data from LEM datafile.
@@ -518,6 +852,8 @@ def load_bike(filename):
     return pd.read_excel(filename, sheet_name=2, names=["time", "load", "rpm", "HR"])  # 5 Hz data
 
 
+@profiled
+@cached
 def load_spline(filename):
     """
     Load wheelchair ergometer calibration spline from LEM datafile.
@@ -536,69 +872,183 @@ def load_spline(filename):
         left and right calibration values
 
     """
+    return _parse_spline(pd.read_excel(filename, sheet_name="Devices", header=5, skiprows=0))
+
+
+def _parse_spline(df):
+    """Converts the devices sheet of a LEM datafile to the load_spline format."""
     gear_ratio = 4  # Roller to load cell
-    data = {"left": None, "right": None}
-    df = pd.read_excel(filename, sheet_name="Devices", header=5, skiprows=0)
     df = df.iloc[:, [1, 2]]  # Remove random columns
     df = df[8:88:8]  # Remove random rows
-    data["left"] = df.values[:, 0]
-    data["right"] = df.values[:, 1]
-    for side in data:
-        for idx, value in enumerate(data[side]):
-            data[side][idx] = value.replace(",", ".")
-        data[side] = data[side].astype(float) * gear_ratio
-    return data
+    values = _decimal_comma(df.to_numpy(dtype=object)) * gear_ratio
+    return {"left": values[:, 0], "right": values[:, 1]}
 
 
-def load_n3d(filename, verbose=True):
+@profiled
+@cached
+def load_lem_session(filename, dtype=np.float64):
     """
-    Reads NDI-Optotrak data files
+    Loads ergometer data, wheelchair information and calibration splines from a LEM datafile at once.
+
+    Opens the workbook only once, which is about twice as fast as calling load_esseda, load_wheelchair and load_spline
+    on the same file.
+
+    Parameters
+    ----------
+    filename : str
+        full file path or file in existing path from LEM Excel sheet (.xls)
+    dtype : np.dtype
+        dtype of the force and speed channels, use np.float32 to halve the memory footprint, time is always float64,
+        default is np.float64
+
+    Returns
+    -------
+    data : dict
+        dictionary with DataFrame for left and right module, see load_esseda
+    wheelchair : dict
+        dictionary with wheelchair information, see load_wheelchair
+    spline : dict
+        left and right calibration values, see load_spline
+
+    """
+    with pd.ExcelFile(filename) as workbook:
+        data = _parse_esseda(workbook.parse("HSB"), dtype)
+        wheelchair = _parse_wheelchair(workbook.parse(2))
+        spline = _parse_spline(workbook.parse("Devices", header=5, skiprows=0))
+    return data, wheelchair, spline
+
+
+@profiled
+def read_n3d_header(filename):
+    """
+    Reads the 256-byte header of an NDI-Optotrak data file.
 
     Parameters
     ----------
     filename : str
         Optotrak data file (.n3d)
-    verbose : bool
-        Print some information about the data from the file.
-        If True (default) it prints the information.
 
     Returns
     -------
-    optodata : ndarray
-        Multidimensional numpy array with marker positions (in m) in sample x xyz x marker dimensions.
+    header : dict
+        dictionary with the number of markers (items), dimensions (subitems), frames (numframes), sample frequency
+        (sfreq), and the collection time and date
 
     """
     with open(filename, "rb") as f:
-        content = f.read()
+        content = f.read(N3D_HEADER_SIZE)
 
     # filetype = unpack('c', content[0:1])[0]
-    items = unpack("h", content[1:3])[0]  # int16, number of markers
-    subitems = unpack("h", content[3:5])[0]  # int16, number of dimensions (usually 3)
-    numframes = unpack("i", content[5:9])[0]  # int32, number of frames
-    sfreq = unpack("f", content[9:13])[0]  # float32, sample frequency
     # usercomment = merge_chars(unpack('c' * 60, content[13:73]))  # char
     # sys_comment = merge_chars(unpack('c' * 60, content[73:133]))
     # descrp_file = merge_chars(unpack('c' * 30, content[133:163]))
     # cuttoff_frq = unpack('h', content[163:165])
-    coll_time = merge_chars(unpack("c" * 10, content[165:175]))
-    coll_date = merge_chars(unpack("c" * 10, content[175:185]))
     # rest = merge_chars(unpack('c' * 71, content[185:256]))  # padding
+    header = {
+        "items": unpack("<h", content[1:3])[0],  # int16, number of markers
+        "subitems": unpack("<h", content[3:5])[0],  # int16, number of dimensions (usually 3)
+        "numframes": unpack("<i", content[5:9])[0],  # int32, number of frames
+        "sfreq": unpack("<f", content[9:13])[0],  # float32, sample frequency
+        "coll_time": merge_chars(unpack("c" * 10, content[165:175])),
+        "coll_date": merge_chars(unpack("c" * 10, content[175:185])),
+    }
+    return header
+
+
+@profiled
+def open_n3d(filename):
+    """
+    Memory-maps the marker data of an NDI-Optotrak data file without reading it.
+
+    The returned array is a read-only view on the file in frames x markers x dimensions order. Values are raw: in
+    millimeters and with the Optotrak missing data value (<= -10e20) still in place. Nothing is read from disk until
+    the array is indexed, so slicing a few markers or a frame range only touches that part of the file.
+
+    Parameters
+    ----------
+    filename : str
+        Optotrak data file (.n3d)
+
+    Returns
+    -------
+    header : dict
+        header information, see read_n3d_header
+    optodata : np.memmap
+        raw float32 marker positions in frames x markers x dimensions
+
+    See Also
+    --------
+    load_n3d : Load (a selection of) marker positions in meters.
+
+    """
+    header = read_n3d_header(filename)
+    shape = (header["numframes"], header["items"], header["subitems"])
+    optodata = np.memmap(filename, dtype="<f4", mode="r", offset=N3D_HEADER_SIZE, shape=shape)
+    return header, optodata
+
 
+@profiled
+def load_n3d(filename, verbose=True, markers=None, frames=None, dtype=np.float64):
+    """
+    Reads NDI-Optotrak data files
+
+    The file is memory-mapped, only the selected markers and frames are read and converted. The information is read
+    from the header, so it is also printed if the data comes from the cache (see .cache.enable_cache).
+
+    Parameters
+    ----------
+    filename : str
+        Optotrak data file (.n3d)
+    verbose : bool
+        Print some information about the data from the file.
+        If True (default) it prints the information.
+    markers : int, list, slice, optional
+        index or indices of the markers to load, loads all markers if not specified
+    frames : slice, optional
+        range of frames to load, e.g. slice(1000, 2000), loads all frames if not specified
+    dtype : np.dtype
+        dtype of the marker data, the file contains float32 data so np.float32 halves the memory footprint without
+        losing precision, default is np.float64
+
+    Returns
+    -------
+    optodata : ndarray
+        Multidimensional numpy array with marker positions (in m) in sample x xyz x marker dimensions.
+
+    See Also
+    --------
+    open_n3d : Memory-map the raw marker data.
+
+    """
     if verbose:
+        header = read_n3d_header(filename)
         print("-" * 50)
-        print(f"Reading data from {filename}, recorded on {coll_date} at {coll_time} with {sfreq} Hz.")
+        print(
+            f"Reading data from {filename}, recorded on {header['coll_date']} at {header['coll_time']} "
+            f"with {header['sfreq']} Hz."
+        )
         print("-" * 50)
+    return _load_n3d(filename, markers=markers, frames=frames, dtype=dtype)
+
 
-    num_total = items * subitems * numframes  # total number of 'samples'
-    optodata = np.array(unpack("f" * num_total, content[256:]))
+@cached
+def _load_n3d(filename, markers=None, frames=None, dtype=np.float64):
+    """Reads the marker data for load_n3d, cached without the verbose argument."""
+    _, raw = open_n3d(filename)
+    frames = slice(None) if frames is None else frames
+    markers = slice(None) if markers is None else markers
+    markers = markers if isinstance(markers, slice) else np.atleast_1d(markers)
+    optodata = np.array(raw[frames][:, markers], dtype=dtype)  # only reads the selection from disk
+    del raw  # release the memory map
 
     optodata[optodata <= -10e20] = np.nan  # replace NDF nan with nan
-    optodata = np.reshape(optodata, (numframes, items, subitems)).transpose((0, 2, 1))
+    optodata = optodata.transpose((0, 2, 1))
     optodata /= 1000  # to meters
     return optodata
 
 
-def load_imu(root_dir, filenames=None, inplace=False):
+@profiled
+def load_imu(root_dir, filenames=None, inplace=False, dtype=np.float64):
     """
     Import NGIMU session in nested dictionary with all devices with all sensors. Translated from xio-Technologies.
 
@@ -609,7 +1059,11 @@ def load_imu(root_dir, filenames=None, inplace=False):
     filenames : list, optional
         list of sensor names or single sensor name that you would like to include, only loads sensor if not specified
     inplace : bool, default False
-        Whether to modify the DataFrame rather than creating a new one.
+        not used, the loaded data is always new, kept for backwards compatibility
+    dtype : np.dtype
+        dtype of the sensor channels, use np.float32 to halve the memory footprint, time is always float64, default is
+        np.float64
+
     Returns
     -------
     sessiondata : dict
@@ -648,13 +1102,11 @@ def load_imu(root_dir, filenames=None, inplace=False):
             new_col_names = sessiondata[device_name][sensor_name].columns
             new_col_names = [col.lower().replace(" ", "_").rsplit("_", 1)[0] for col in new_col_names]
             sessiondata[device_name][sensor_name].columns = new_col_names
+            cast_channels(sessiondata[device_name][sensor_name], dtype)
 
         if not sessiondata[device_name]:
             raise Exception("No data was imported")
 
-    if not inplace:
-        sessiondata = copy.deepcopy(sessiondata)
-
     if 'right' in sessiondata.keys():
         sessiondata["right"] = sessiondata["right"]["sensors"]
         sessiondata["right"]["time"] -= sessiondata["right"]["time"][0]
@@ -680,6 +1132,8 @@ def load_imu(root_dir, filenames=None, inplace=False):
     return sessiondata
 
 
+@profiled
+@cached
 def load_drag_test(filename):
     """
     Loads a drag test file.
@@ -706,16 +1160,25 @@ def load_drag_test(filename):
     return pd.DataFrame(dragtest)
 
 
-def load_optitrack(filename, include_header=False):
+@profiled
+@cached
+def load_optitrack(filename, include_header=False, markers=None, dtype=np.float64):
     """
     Loads Optitrack marker data.
 
+    The numeric block is parsed once into a single frames x markers x xyz array, the DataFrame of each marker is a view
+    into that array.
+
     Parameters
     ----------
     filename : str
         full path to filename or filename in current path
     include_header : bool
         include the header in the output, default is False
+    markers : list, optional
+        labels of the markers to load, loads all markers if not specified
+    dtype : np.dtype
+        dtype of the marker data, use np.float32 to halve the memory footprint, default is np.float64
 
     Returns
     -------
@@ -746,19 +1209,28 @@ def load_optitrack(filename, include_header=False):
     first_marker = header["marker_type"].index("Marker")
     n_markers = (len(header["marker_type"]) - first_marker) // 3
 
-    marker_data = {}
+    marker_labels = {}
     for i in range(n_markers):
         marker_label = header["marker_label"][first_marker + i * 3]
         if "Unlabeled" in marker_label:
             marker_label = "marker_" + str(i)
-        marker_columns = [first_marker + i * 3, first_marker + 1 + i * 3, first_marker + 2 + i * 3]
-        marker_data[marker_label] = pd.read_csv(
-            filename, skiprows=list(range(7)), usecols=marker_columns, names=["X", "Y", "Z"]
-        )
-        marker_data[marker_label] = marker_data[marker_label][:-1]  # remove last (empty) row
+        if markers is None or marker_label in markers:
+            marker_labels[marker_label] = first_marker + i * 3
+
+    # Parse all selected marker columns in one go
+    usecols = [col + axis for col in marker_labels.values() for axis in range(3)]
+    block = pd.read_csv(filename, skiprows=7, header=None, usecols=usecols, dtype=dtype)
+    block = block[usecols].to_numpy(dtype=dtype)[:-1]  # remove last (empty) row
+    block = block.reshape((len(block), len(marker_labels), 3))
+
+    marker_data = {}
+    for i, marker_label in enumerate(marker_labels):
+        marker_data[marker_label] = pd.DataFrame(block[:, i, :], columns=["X", "Y", "Z"], copy=False)
     return (marker_data, header) if include_header else marker_data
 
 
+@profiled
+@cached
 def load_opti_offset(filename):
     """
     Loads Offset Optipush data from .xls file.
@@ -805,6 +1277,7 @@ def load_opti_offset(filename):
     return opti_offset_df
 
 
+@profiled
 def load_movesense(root_dir, right=None, frame=None, left=None):
     """
     Imports MoveSense data in nested dictionary with all sensors.
@@ -887,7 +1360,8 @@ def load_movesense(root_dir, right=None, frame=None, left=None):
     return sessiondata, sfreq
 
 
-def load_ximu3(root_dir, filenames=None, inplace=False):
+@profiled
+def load_ximu3(root_dir, filenames=None, inplace=False, dtype=np.float64):
     """
     Imports X-IMU3 session in nested dictionary with all devices with all sensors. Translated from xio-Technologies.
 
@@ -898,7 +1372,11 @@ def load_ximu3(root_dir, filenames=None, inplace=False):
     filenames : list, optional
         list of sensor names or single sensor name that you would like to include, only loads Inertial if not specified
     inplace : bool, default False
-        Whether to modify the DataFrame rather than creating a new one.
+        not used, the loaded data is always new, kept for backwards compatibility
+    dtype : np.dtype
+        dtype of the sensor channels, use np.float32 to halve the memory footprint, time is always float64, default is
+        np.float64
+
     Returns
     -------
     sessiondata : dict
@@ -937,13 +1415,11 @@ def load_ximu3(root_dir, filenames=None, inplace=False):
             new_col_names = sessiondata[device_name][sensor_name].columns
             new_col_names = [col.lower().replace(" ", "_").rsplit("_", 1)[0] for col in new_col_names]
             sessiondata[device_name][sensor_name].columns = new_col_names
+            cast_channels(sessiondata[device_name][sensor_name], dtype)
 
         if not sessiondata[device_name]:
             raise Exception("No data was imported")
 
-    if not inplace:
-        sessiondata = copy.deepcopy(sessiondata)
-
     if 'right' in sessiondata.keys():
         sessiondata["right"] = sessiondata["right"]["Inertial"]
         sessiondata["right"]["timestamp"] -= sessiondata["right"]["timestamp"][0]
@@ -973,3 +1449,73 @@ def load_ximu3(root_dir, filenames=None, inplace=False):
     sessiondata = {a: b for a, b in sessiondata.items() if b is not None}
 
     return sessiondata
+
+
+def _is_n3d(file):
+    """Header with a positive number of markers and dimensions that matches the file size"""
+    if file.size < N3D_HEADER_SIZE:
+        return False
+    items, subitems, numframes = unpack("<hhi", file.head[1:9])
+    return items > 0 and subitems > 0 and file.size == N3D_HEADER_SIZE + 4 * items * subitems * numframes
+
+
+def _optipush_columns(file):
+    """Number of tab separated columns after the 12 header lines (starting with %) of Optipush files, 0 otherwise"""
+    if len(file.lines) < 13 or not all(line.startswith("%") for line in file.lines[:12]):
+        return 0
+    return len(file.lines[12].strip().split("\t"))
+
+
+def _is_sw(file):
+    """Comma separated numbers without a header, with (at least) the 24 channels of a SMARTwheel"""
+    values = file.lines[0].strip().rstrip(",").split(",") if file.lines else []
+    try:
+        return len([float(value) for value in values]) >= 24
+    except ValueError:
+        return False
+
+
+def _session_folder(filename):
+    return filename if path.isdir(filename) else path.dirname(filename)
+
+
+def _is_imu_session(file, sensor_file):
+    """Session folder (or a .xml file in it) with a folder per device that contains sensor_file"""
+    if not file.is_dir and not file.filename.lower().endswith(".xml"):
+        return False
+    return bool(glob(path.join(escape(_session_folder(file.filename)), "*", sensor_file)))
+
+
+def _load_imu_session(filename, **kwargs):
+    return load_imu(_session_folder(filename), **kwargs)
+
+
+def _load_ximu3_session(filename, **kwargs):
+    return load_ximu3(_session_folder(filename), **kwargs)
+
+
+def _is_lem_bike(file):
+    """LEM files of the bicycle ergometer have a sheet per device (e.g. Fietsergometer-1-) but no HSB sheet"""
+    return "HSB" not in file.sheet_names and any("ergometer" in name.lower() for name in file.sheet_names)
+
+
+def _is_cosmed(file):
+    """COSMED exports start with the subject information next to the breath-by-breath header (t, Rf, VT)"""
+    return {"t", "Rf", "VT"} <= set(file.first_row)
+
+
+for _name, _loader, _sniffer, _description in [
+    ("n3d", load_n3d, _is_n3d, "Optotrak datafile"),
+    ("opti", load_opti, lambda file: _optipush_columns(file) == 10, "Optipush datafile"),
+    ("opti_offset", load_opti_offset, lambda file: _optipush_columns(file) == 8, "Optipush offset datafile"),
+    ("sw", load_sw, _is_sw, "SMARTwheel datafile"),
+    ("hsb", load_hsb, lambda file: file.lines[0].startswith("Side (Left=0);"), "HSB-logger datafile"),
+    ("optitrack", load_optitrack, lambda file: file.lines[0].startswith("Format Version,"), "Optitrack datafile"),
+    ("drag", load_drag_test, lambda file: "POWER TABLE" in file.lines[:10], "dragtest datafile"),
+    ("imu", _load_imu_session, lambda file: _is_imu_session(file, "sensors.csv"), "NGIMU folder"),
+    ("ximu3", _load_ximu3_session, lambda file: _is_imu_session(file, "Inertial.csv"), "x-IMU3 folder"),
+    ("esseda", load_esseda, lambda file: "HSB" in file.sheet_names, "Esseda datafile"),
+    ("bike", load_bike, _is_lem_bike, "Bicycle ergometer datafile"),
+    ("spiro", load_spiro, _is_cosmed, "COSMED datafile"),
+]:
+    register_loader(_name, _loader, _sniffer, _description, first=False)
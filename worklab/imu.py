@@ -1,14 +1,16 @@
-import copy
 from warnings import warn
 
 import numpy as np
+import pandas as pd
 from scipy.integrate import cumtrapz
 from scipy.signal import periodogram, find_peaks
 
-from .utils import lowpass_butter, pd_interp
+from .utils import lowpass_butter, lowpass_butter_columns, pd_interp
+from .profiling import profiled
 
 
-def resample_imu(sessiondata, sfreq=400.0):
+@profiled
+def resample_imu(sessiondata, sfreq=400.0, antialias=False):
     """
     Resample all devices and sensors to new sample frequency.
 
@@ -21,11 +23,14 @@ def resample_imu(sessiondata, sfreq=400.0):
         original session data structure to be resampled
     sfreq : float
         new intended sample frequency
+    antialias : bool
+        low-pass filter devices that are downsampled at 40% of the new sample frequency before resampling, default is
+        False
 
     Returns
     -------
     sessiondata : dict
-        resampled session data structure
+        resampled session data structure, the original session is not changed
 
     References
     ----------
@@ -39,17 +44,24 @@ def resample_imu(sessiondata, sfreq=400.0):
 
     new_time = np.arange(0, end_time, 1 / sfreq)
 
-    for device in sessiondata:
-        if device == "quaternion":
-            sessiondata[device] = pd_interp(sessiondata[device], "time", new_time)
-            sessiondata[device] *= 1 / np.linalg.norm(sessiondata[device], axis=0)
-        elif device == "matrix":
+    resampled = dict()
+    for device, data in sessiondata.items():
+        if device == "matrix":
             warn("Rotation matrix cannot be resampled. This dataframe has been removed")
-        else:
-            sessiondata[device] = pd_interp(sessiondata[device], "time", new_time)
-    return sessiondata
-
-
+            continue
+        old_sfreq = 1 / data["time"].diff().median() if antialias else sfreq
+        if old_sfreq > sfreq:
+            values = data.columns.drop("time")
+            data = data.copy(deep=False)
+            data[values] = lowpass_butter_columns(data[values], sfreq=old_sfreq, cutoff=0.4 * sfreq)
+        resampled[device] = pd_interp(data, "time", new_time)
+        if device == "quaternion":  # unit quaternions, normalise every sample (row)
+            values = resampled[device].columns.drop("time")
+            resampled[device][values] /= np.linalg.norm(resampled[device][values], axis=1)[:, None]
+    return resampled
+
+
+@profiled
 def process_imu(sessiondata, camber=18, wsize=0.32, wbase=0.80, n_sensors=3, sensor_type='ngimu', inplace=False):
     """
     Calculate wheelchair kinematic variables based on NGIMU data
@@ -79,7 +91,7 @@ def process_imu(sessiondata, camber=18, wsize=0.32, wbase=0.80, n_sensors=3, sen
 
     """
     if not inplace:
-        sessiondata = copy.deepcopy(sessiondata)
+        sessiondata = copy_session(sessiondata)
     frame = sessiondata["frame"]
     right = sessiondata["right"]
 
@@ -117,13 +129,14 @@ def process_imu(sessiondata, camber=18, wsize=0.32, wbase=0.80, n_sensors=3, sen
         frame["vel_wheel"] = right["vel"]
         frame["dist_wheel"] = right["dist"]
 
-    frame["vel_wheel"] = lowpass_butter(frame["vel_wheel"], sfreq=sfreq, cutoff=10)
-    frame["acc_wheel"] = np.gradient(frame["vel_wheel"]) * sfreq  # mean acceleration from velocity
-    frame['acc_wheel'] = lowpass_butter(frame['acc_wheel'], sfreq=sfreq, cutoff=10)
-
     if sensor_type == 'ngimu' or sensor_type == 'ximu3':  # Acceleration for NGIMU/XIMU3 is in g
         frame["accelerometer_x"] = frame["accelerometer_x"] * 9.81
-    frame['acc'] = lowpass_butter(frame['accelerometer_x'], sfreq=sfreq, cutoff=10)
+    vel_wheel, acc = lowpass_butter_columns(frame[["vel_wheel", "accelerometer_x"]], sfreq=sfreq, cutoff=10).T
+
+    frame["vel_wheel"] = vel_wheel
+    frame["acc_wheel"] = np.gradient(frame["vel_wheel"]) * sfreq  # mean acceleration from velocity
+    frame['acc_wheel'] = lowpass_butter(frame['acc_wheel'], sfreq=sfreq, cutoff=10)
+    frame['acc'] = acc
 
     """Perform skid correction from Rienk vd Slikke, please refer and reference to: Van der Slikke, R. M. A., et. al.
     Wheel skid correction is a prerequisite to reliably measure wheelchair sports kinematics based on inertial sensors.
@@ -164,6 +177,7 @@ def process_imu(sessiondata, camber=18, wsize=0.32, wbase=0.80, n_sensors=3, sen
     return sessiondata
 
 
+@profiled
 def process_imu_left(sessiondata, camber=18, wsize=0.32, wbase=0.80,
                      sensor_type='ngimu', inplace=False):
     """
@@ -192,7 +206,7 @@ def process_imu_left(sessiondata, camber=18, wsize=0.32, wbase=0.80,
 
     """
     if not inplace:
-        sessiondata = copy.deepcopy(sessiondata)
+        sessiondata = copy_session(sessiondata)
     frame = sessiondata["frame"]
     left = sessiondata["left"]
     sfreq = int(1 / frame["time"].diff().mean())
@@ -212,18 +226,19 @@ def process_imu_left(sessiondata, camber=18, wsize=0.32, wbase=0.80,
 
     left["vel"] = left["gyro_cor"] * wsize * deg2rad
     left["dist"] = cumtrapz(left["vel"] / sfreq, initial=0.0)
+
+    if sensor_type == 'ngimu' or sensor_type == 'ximu3':  # Acceleration for NGIMU/XIMU3 is in g
+        frame["accelerometer_x"] = frame["accelerometer_x"] * 9.81
     frame["vel_wheel"] = left["vel"]
-    frame["vel_wheel"] = lowpass_butter(frame["vel_wheel"], sfreq=sfreq, cutoff=10)
+    vel_wheel, acc = lowpass_butter_columns(frame[["vel_wheel", "accelerometer_x"]], sfreq=sfreq, cutoff=10).T
+
+    frame["vel_wheel"] = vel_wheel
     frame["dist_wheel"] = cumtrapz(frame["vel_wheel"] / sfreq, initial=0.0)
 
     frame["acc_wheel"] = np.gradient(frame["vel_wheel"]) * sfreq
     frame['acc_wheel'] = lowpass_butter(frame['acc_wheel'],
                                         sfreq=sfreq, cutoff=10)
-
-    if sensor_type == 'ngimu' or sensor_type == 'ximu3':  # Acceleration for NGIMU/XIMU3 is in g
-        frame["accelerometer_x"] = frame["accelerometer_x"] * 9.81
-    frame['acc'] = lowpass_butter(frame['accelerometer_x'],
-                                  sfreq=sfreq, cutoff=10)
+    frame['acc'] = acc
 
     frame["vel_left"] = left["vel"]
     frame["vel_left"] += np.tan(np.deg2rad(frame["rot_vel"] / sfreq)) * wbase / 2 * sfreq
@@ -241,6 +256,7 @@ def process_imu_left(sessiondata, camber=18, wsize=0.32, wbase=0.80,
     return sessiondata
 
 
+@profiled
 def change_imu_orientation(sessiondata, inplace=False):
     """
     Changes IMU orientation from in-wheel to on-wheel
@@ -259,15 +275,47 @@ def change_imu_orientation(sessiondata, inplace=False):
 
     """
     if not inplace:
-        sessiondata = copy.deepcopy(sessiondata)
+        sessiondata = copy_session(sessiondata)
 
     order = {"gyroscope_x": "gyroscope_z", "gyroscope_z": "gyroscope_y", "gyroscope_y": "gyroscope_x"}
     sessiondata["left"]["sensors"].rename(columns=order, inplace=True)
     sessiondata["right"]["sensors"].rename(columns=order, inplace=True)
-    sessiondata["right"]["sensors"]["gyroscope_y"] *= -1
+    sessiondata["right"]["sensors"]["gyroscope_y"] = -sessiondata["right"]["sensors"]["gyroscope_y"]
     return sessiondata
 
 
+@profiled
+def copy_session(sessiondata):
+    """
+    Copy a session without copying the data.
+
+    Returns a new (nested) session dictionary with new DataFrames that share their columns with the original ones. New
+    and replaced columns only end up in the copy, so the original session is never changed, as long as columns are
+    replaced (df[col] = ...) instead of modified in place (df[col] *= ...).
+
+    Parameters
+    ----------
+    sessiondata : dict
+        original sessiondata structure
+
+    Returns
+    -------
+    sessiondata : dict
+        copy of the sessiondata structure that shares the data with the original
+
+    """
+    copied = dict()
+    for device, data in sessiondata.items():
+        if isinstance(data, pd.DataFrame):
+            copied[device] = data.copy(deep=False)
+        elif isinstance(data, dict):
+            copied[device] = copy_session(data)
+        else:
+            copied[device] = data
+    return copied
+
+
+@profiled
 def push_imu(acceleration, sfreq=400.0):
     """
     Push detection based on velocity signal of IMU on a wheelchair.
@@ -311,6 +359,7 @@ def push_imu(acceleration, sfreq=400.0):
     return push_idx, acc_filt, n_pushes, cycle_time, push_freq
 
 
+@profiled
 def movesense_offset(sessiondata, n_sensors=2, right_wheel=True):
     """
     Remove offset MoveSense sensors
@@ -1,11 +1,74 @@
 import numpy as np
 import pandas as pd
 from scipy.integrate import cumtrapz
-from scipy.signal import savgol_filter
-from .utils import lowpass_butter, find_peaks
+from scipy.signal import savgol_filter, sosfilt, sosfilt_zi
+from .utils import lowpass_butter, lowpass_butter_columns, find_peaks, butter_sos, cast_channels, FULL_PRECISION
 from .move import rotate_matrix
-
-
+from .profiling import profiled
+
+# columns of the push-by-push DataFrames
+_PBP_KEYS_MW = [
+    "start",
+    "stop",
+    "peak",
+    "tstart",
+    "tstop",
+    "tpeak",
+    "cangle",
+    "cangle_deg",
+    "ptime",
+    "meanpower",
+    "maxpower",
+    "meantorque",
+    "maxtorque",
+    "meanuforce",
+    "maxuforce",
+    "meanforce",
+    "maxforce",
+    "work",
+    "meanfeff",
+    "maxfeff",
+    "meanftot",
+    "maxftot",
+    "slope",
+    "smoothness",
+    "ctime",
+    "reltime",
+    "cwork",
+    "negwork",
+]
+
+_PBP_KEYS_ERGO = [
+    "start",
+    "stop",
+    "peak",
+    "tstart",
+    "tstop",
+    "tpeak",
+    "cangle",
+    "cangle_deg",
+    "ptime",
+    "meanpower",
+    "maxpower",
+    "meantorque",
+    "maxtorque",
+    "meanuforce",
+    "maxuforce",
+    "meanforce",
+    "maxforce",
+    "meanspeed",
+    "maxspeed",
+    "work",
+    "slope",
+    "smoothness",
+    "ctime",
+    "reltime",
+    "cwork",
+    "negwork",
+]
+
+
+@profiled
 def auto_process(
     data,
     wheelsize=0.31,
@@ -22,6 +85,7 @@ def auto_process(
     wl=201,
     ord_a=2,
     minpeak=5.0,
+    dtype=None,
 ):
     """
     Top level processing function that performs all processing steps for mw/ergo data.
@@ -61,29 +125,38 @@ def auto_process(
         order angle filter [..]
     minpeak : float
         min peak height for peak (push) detection
+    dtype : np.dtype, optional
+        dtype of the force and derived channels, use np.float32 to halve the memory footprint, time, angle and dist are
+        always float64, default is the dtype of the input
 
     Returns
     -------
     data : pd.DataFrame, dict
     pushes : pd.DataFrame, dict
 
+    Notes
+    -----
+    With dtype=np.float32 the processed channels differ less than 1e-5 times the range of the channel from the float64
+    path, see .utils.cast_channels.
+
     See Also
     --------
     filter_mw, process_mw, push_by_push_mw, filter_ergo, process_ergo, push_by_push_ergo
 
     """
     if "right" in data:
-        data = filter_ergo(data, co_f, ord_f, co_s, ord_s, force, speed)
-        data = process_ergo(data, wheelsize, rimsize)
+        data = filter_ergo(data, co_f, ord_f, co_s, ord_s, force, speed, dtype)
+        data = process_ergo(data, wheelsize, rimsize, dtype)
         pushes = push_by_push_ergo(data, variable, cutoff, minpeak)
     else:
-        data = filter_mw(data, sfreq, co_f, ord_f, wl, ord_a, force, speed)
-        data = process_mw(data, wheelsize, rimsize, sfreq)
+        data = filter_mw(data, sfreq, co_f, ord_f, wl, ord_a, force, speed, dtype)
+        data = process_mw(data, wheelsize, rimsize, sfreq, dtype)
         pushes = push_by_push_mw(data, variable, cutoff, minpeak)
     return data, pushes
 
 
-def filter_mw(data, sfreq=200.0, co_f=15.0, ord_f=2, wl=201, ord_a=2, force=True, speed=True):
+@profiled
+def filter_mw(data, sfreq=200.0, co_f=15.0, ord_f=2, wl=201, ord_a=2, force=True, speed=True, dtype=None):
     """
     Filters measurement wheel data.
 
@@ -107,6 +180,9 @@ def filter_mw(data, sfreq=200.0, co_f=15.0, ord_f=2, wl=201, ord_a=2, force=True
         force filter toggle, default is True
     speed : bool
         speed filter toggle, default is True
+    dtype : np.dtype, optional
+        dtype of the force and derived channels, use np.float32 to halve the memory footprint, time, angle and dist are
+        always float64, default is the dtype of the input
 
     Returns
     -------
@@ -115,19 +191,20 @@ def filter_mw(data, sfreq=200.0, co_f=15.0, ord_f=2, wl=201, ord_a=2, force=True
 
     See Also
     --------
-    .utils.lowpass_butter
+    .utils.lowpass_butter_columns
 
     """
+    dtype = data["torque"].dtype if dtype is None else dtype
     if force:
         frel = ["fx", "fy", "fz", "mx", "my", "torque"]
-        for var in frel:
-            data[var] = lowpass_butter(data[var], cutoff=co_f, order=ord_f, sfreq=sfreq)
+        data[frel] = lowpass_butter_columns(data[frel], cutoff=co_f, order=ord_f, sfreq=sfreq).astype(dtype)
     if speed:
         data["angle"] = savgol_filter(data["angle"], window_length=wl, polyorder=ord_a)
-    return data
+    return cast_channels(data, dtype)
 
 
-def filter_ergo(data, co_f=15.0, ord_f=2, co_s=6.0, ord_s=2, force=True, speed=True):
+@profiled
+def filter_ergo(data, co_f=15.0, ord_f=2, co_s=6.0, ord_s=2, force=True, speed=True, dtype=None):
     """
     Filters ergometer data.
 
@@ -149,6 +226,9 @@ def filter_ergo(data, co_f=15.0, ord_f=2, co_s=6.0, ord_s=2, force=True, speed=T
         force filter toggle, default is True
     speed : bool
         speed filter toggle, default is True
+    dtype : np.dtype, optional
+        dtype of the force and derived channels, use np.float32 to halve the memory footprint, time, angle and dist are
+        always float64, default is the dtype of the input
 
     Returns
     -------
@@ -162,14 +242,19 @@ def filter_ergo(data, co_f=15.0, ord_f=2, co_s=6.0, ord_s=2, force=True, speed=T
     """
     sfreq = 100
     for side in data:
+        side_dtype = data[side]["force"].dtype if dtype is None else dtype
         if force:
-            data[side]["force"] = lowpass_butter(data[side]["force"], cutoff=co_f, order=ord_f, sfreq=sfreq)
+            filtered = lowpass_butter(data[side]["force"], cutoff=co_f, order=ord_f, sfreq=sfreq)
+            data[side]["force"] = filtered.astype(side_dtype)
         if speed:
-            data[side]["speed"] = lowpass_butter(data[side]["speed"], cutoff=co_s, order=ord_s, sfreq=sfreq)
+            filtered = lowpass_butter(data[side]["speed"], cutoff=co_s, order=ord_s, sfreq=sfreq)
+            data[side]["speed"] = filtered.astype(side_dtype)
+        cast_channels(data[side], side_dtype)
     return data
 
 
-def process_mw(data, wheelsize=0.31, rimsize=0.275, sfreq=200):
+@profiled
+def process_mw(data, wheelsize=0.31, rimsize=0.275, sfreq=200, dtype=None):
     """
     Basic processing for measurement wheel data.
 
@@ -208,6 +293,9 @@ def process_mw(data, wheelsize=0.31, rimsize=0.275, sfreq=200):
         handrim radius [m]
     sfreq : int
         sample frequency [Hz]
+    dtype : np.dtype, optional
+        dtype of the force and derived channels, use np.float32 to halve the memory footprint, time, angle and dist are
+        always float64, default is the dtype of the input
 
     Returns
     -------
@@ -218,20 +306,14 @@ def process_mw(data, wheelsize=0.31, rimsize=0.275, sfreq=200):
     .com.load_opti, .com.load_sw
 
     """
-    data["aspeed"] = np.gradient(data["angle"]) * sfreq
-    data["speed"] = data["aspeed"] * wheelsize
-    data["dist"] = cumtrapz(data["speed"], initial=0.0) / sfreq
-    data["acc"] = np.gradient(data["speed"]) * sfreq
-    data["ftot"] = (data["fx"] ** 2 + data["fy"] ** 2 + data["fz"] ** 2) ** 0.5
-    data["uforce"] = data["torque"] / rimsize
-    data["feff"] = (data["uforce"] / data["ftot"]) * 100
-    data["force"] = data["torque"] / wheelsize
-    data["power"] = data["torque"] * data["aspeed"]
-    data["work"] = data["power"] / sfreq
-    return data
+    dtype = data["torque"].dtype if dtype is None else dtype
+    channels = [data[col].to_numpy(dtype=np.float64) for col in ["angle", "torque", "fx", "fy", "fz"]]
+    channels = _mw_kernel(*channels, wheelsize=wheelsize, rimsize=rimsize, sfreq=sfreq)
+    return _add_channels(data, channels, _MW_CHANNELS, dtype)
 
 
-def process_ergo(data, wheelsize=0.31, rimsize=0.275):
+@profiled
+def process_ergo(data, wheelsize=0.31, rimsize=0.275, dtype=None):
     """
     Basic processing for ergometer data.
 
@@ -268,6 +350,9 @@ def process_ergo(data, wheelsize=0.31, rimsize=0.275):
         wheel radius [m]
     rimsize : float
         handrim radius [m]
+    dtype : np.dtype, optional
+        dtype of the force and derived channels, use np.float32 to halve the memory footprint, time, angle and dist are
+        always float64, default is the dtype of the input
 
     Returns
     -------
@@ -279,19 +364,92 @@ def process_ergo(data, wheelsize=0.31, rimsize=0.275):
 
     """
     sfreq = 100  # ergometer is always 100Hz
+    groups = dict()  # modules of the same length are processed as one stacked array
     for side in data:
-        data[side]["aspeed"] = data[side]["speed"] / wheelsize
-        data[side]["angle"] = cumtrapz(data[side]["aspeed"], initial=0.0) / sfreq
-        data[side]["torque"] = data[side]["force"] * wheelsize
-        data[side]["acc"] = np.gradient(data[side]["speed"]) * sfreq
-        data[side]["power"] = data[side]["speed"] * data[side]["force"]
-        data[side]["dist"] = cumtrapz(data[side]["speed"], initial=0.0) / sfreq
-        data[side]["work"] = data[side]["power"] / sfreq
-        data[side]["uforce"] = data[side]["force"] * (wheelsize / rimsize)
+        groups.setdefault(len(data[side]), []).append(side)
+    for sides in groups.values():
+        force = np.stack([data[side]["force"].to_numpy(dtype=np.float64) for side in sides])
+        speed = np.stack([data[side]["speed"].to_numpy(dtype=np.float64) for side in sides])
+        channels = _ergo_kernel(force, speed, wheelsize=wheelsize, rimsize=rimsize, sfreq=sfreq)
+        for i, side in enumerate(sides):
+            side_dtype = data[side]["force"].dtype if dtype is None else dtype
+            data[side] = _add_channels(data[side], [channel[i] for channel in channels], _ERGO_CHANNELS, side_dtype)
     return data
 
 
-def push_by_push_mw(data, variable="torque", cutoff=0.0, minpeak=5.0, mindist=5, verbose=True):
+# derived channels of process_mw and process_ergo, in the order of the kernel output
+_MW_CHANNELS = ["aspeed", "speed", "dist", "acc", "ftot", "uforce", "feff", "force", "power", "work"]
+_ERGO_CHANNELS = ["aspeed", "angle", "torque", "acc", "power", "dist", "work", "uforce"]
+
+
+def _mw_kernel(angle, torque, fx, fy, fz, wheelsize, rimsize, sfreq):
+    """Derived measurement wheel channels from float64 arrays, returns a list of arrays in _MW_CHANNELS order."""
+    channels = [np.empty(len(angle)) for _ in _MW_CHANNELS]  # separate arrays reuse freed memory, one block does not
+    aspeed, speed, dist, acc, ftot, uforce, feff, force, power, work = channels
+    np.multiply(_gradient(angle, out=aspeed), sfreq, out=aspeed)
+    np.multiply(aspeed, wheelsize, out=speed)
+    np.divide(_cumtrapz(speed, out=dist), sfreq, out=dist)
+    np.multiply(_gradient(speed, out=acc), sfreq, out=acc)
+    np.square(fx, out=ftot)
+    np.add(ftot, np.square(fy, out=feff), out=ftot)  # feff is used as scratch space
+    np.add(ftot, np.square(fz, out=feff), out=ftot)
+    np.sqrt(ftot, out=ftot)
+    np.divide(torque, rimsize, out=uforce)
+    with np.errstate(divide="ignore", invalid="ignore"):  # no force at all gives NaN or inf, like pandas
+        np.divide(uforce, ftot, out=feff)
+    np.multiply(feff, 100, out=feff)
+    np.divide(torque, wheelsize, out=force)
+    np.multiply(torque, aspeed, out=power)
+    np.divide(power, sfreq, out=work)
+    return channels
+
+
+def _ergo_kernel(force, speed, wheelsize, rimsize, sfreq):
+    """
+    Derived ergometer channels from stacked [modules, n] float64 arrays, returns a list of [modules, n] arrays in
+    _ERGO_CHANNELS order.
+    """
+    channels = [np.empty(force.shape) for _ in _ERGO_CHANNELS]
+    aspeed, angle, torque, acc, power, dist, work, uforce = channels
+    np.divide(speed, wheelsize, out=aspeed)
+    np.divide(_cumtrapz(aspeed, out=angle), sfreq, out=angle)
+    np.multiply(force, wheelsize, out=torque)
+    np.multiply(_gradient(speed, out=acc), sfreq, out=acc)
+    np.multiply(speed, force, out=power)
+    np.divide(_cumtrapz(speed, out=dist), sfreq, out=dist)
+    np.divide(power, sfreq, out=work)
+    np.multiply(force, wheelsize / rimsize, out=uforce)
+    return channels
+
+
+def _gradient(y, out):
+    """np.gradient with unit spacing along the last axis, written to out."""
+    np.subtract(y[..., 2:], y[..., :-2], out=out[..., 1:-1])
+    np.divide(out[..., 1:-1], 2.0, out=out[..., 1:-1])
+    np.subtract(y[..., 1], y[..., 0], out=out[..., 0])
+    np.subtract(y[..., -1], y[..., -2], out=out[..., -1])
+    return out
+
+
+def _cumtrapz(y, out):
+    """cumtrapz with unit spacing and initial=0 along the last axis, written to out."""
+    np.add(y[..., 1:], y[..., :-1], out=out[..., 1:])
+    np.divide(out[..., 1:], 2.0, out=out[..., 1:])
+    np.cumsum(out[..., 1:], axis=-1, out=out[..., 1:])
+    out[..., 0] = 0.0
+    return out
+
+
+def _add_channels(data, channels, columns, dtype):
+    """Adds the channel arrays to data as columns, time, angle and dist stay float64."""
+    dtype = np.dtype(dtype)
+    for col, channel in zip(columns, channels):
+        data[col] = channel if col in FULL_PRECISION else channel.astype(dtype, copy=False)
+    return cast_channels(data, dtype)
+
+
+@profiled
+def push_by_push_mw(data, variable="torque", cutoff=0.0, minpeak=5.0, mindist=5, verbose=True, extra=None):
     """
     Push-by-push analysis for measurement wheel data.
 
@@ -351,6 +509,10 @@ def push_by_push_mw(data, variable="torque", cutoff=0.0, minpeak=5.0, mindist=5,
         minimum sample distance between peak candidates, can be used to speed up algorithm
     verbose : Boolean
         can be used to print out the number of pushes, default = True
+    extra : dict, optional
+        additional per push statistics as {variable: [reducers]}, reducers can be "mean", "max", "min", "sum" or a
+        function that takes the samples of a push, e.g. {"fz": ["mean", "min"], "speed": [np.std]}. Results are stored
+        as reducer + variable (e.g. "minfz", "stdspeed")
 
     Returns
     -------
@@ -359,36 +521,7 @@ def push_by_push_mw(data, variable="torque", cutoff=0.0, minpeak=5.0, mindist=5,
     """
     peaks = find_peaks(data[variable], cutoff, minpeak, mindist)
 
-    keys = [
-        "start",
-        "stop",
-        "peak",
-        "tstart",
-        "tstop",
-        "tpeak",
-        "cangle",
-        "cangle_deg",
-        "ptime",
-        "meanpower",
-        "maxpower",
-        "meantorque",
-        "maxtorque",
-        "meanuforce",
-        "maxuforce",
-        "meanforce",
-        "maxforce",
-        "work",
-        "meanfeff",
-        "maxfeff",
-        "meanftot",
-        "maxftot",
-        "slope",
-        "smoothness",
-        "ctime",
-        "reltime",
-        "cwork",
-        "negwork",
-    ]
+    keys = _PBP_KEYS_MW
     pbp = pd.DataFrame(data=np.full((len(peaks["start"]), len(keys)), np.NaN), columns=keys)  # preallocate dataframe
 
     pbp["start"] = peaks["start"]
@@ -403,32 +536,22 @@ def push_by_push_mw(data, variable="torque", cutoff=0.0, minpeak=5.0, mindist=5,
     pbp["cangle"] = data["angle"][pbp["stop"]].values - data["angle"][pbp["start"]].values
     pbp["cangle_deg"] = np.rad2deg(pbp["cangle"])
 
-    bins = pbp[["start", "stop"]].values
-    bins[:, 1] += 1
-    push_bins = np.digitize(data.index, bins.ravel())  # slice dataframe from push start:stop
-    push_group = data.groupby(push_bins)
-    grouped = push_group.agg(["mean", "max"])[1::2].reset_index(drop=True)
-    grouped.columns = [f"{col[1]}{col[0]}" for col in grouped.columns]  # collapse multiindex to match cols with pbp
-
-    mean_max_variables = [var for var in keys if "mean" in var or "max" in var]
-    pbp[mean_max_variables] = grouped[mean_max_variables]
+    variables = {var: ["mean", "max"] for var in ["power", "torque", "uforce", "force", "feff", "ftot"]}
+    variables["work"] = ["sum"]
+    stats = _push_stats(data, peaks["start"], peaks["stop"], variables, extra)
+    stats["work"] = stats.pop("sumwork")
+    pbp = pbp.assign(**stats)
     pbp["slope"] = pbp["maxtorque"] / (pbp["tpeak"] - pbp["tstart"])
     pbp["smoothness"] = pbp["meanforce"] / pbp["maxforce"]
-    pbp["work"] = push_group["work"].sum()[1::2].reset_index(drop=True)
-
-    cycle_bins = np.digitize(data.index, pbp["start"].values)
-    pbp["cwork"] = data[["work"]].groupby(cycle_bins).sum()[1:].reset_index(drop=True)
-    negative_work = data["work"].copy()
-    negative_work[negative_work >= 0] = 0
-    pbp["negwork"] = negative_work.groupby(cycle_bins).sum()[1:].reset_index(drop=True)
-    pbp.loc[len(pbp) - 1, ["cwork", "negwork"]] = np.NaN
+    pbp["cwork"], pbp["negwork"] = _cycle_work(data["work"], peaks["start"])
 
     if verbose:
         print("\n" + "=" * 80 + f"\nFound {len(pbp)} pushes!\n" + "=" * 80 + "\n")
     return pbp
 
 
-def push_by_push_ergo(data, variable="power", cutoff=0.0, minpeak=50.0, mindist=5, verbose=True):
+@profiled
+def push_by_push_ergo(data, variable="power", cutoff=0.0, minpeak=50.0, mindist=5, verbose=True, extra=None):
     """
     Push-by-push analysis for wheelchair ergometer data.
 
@@ -486,6 +609,10 @@ def push_by_push_ergo(data, variable="power", cutoff=0.0, minpeak=50.0, mindist=
         minimum sample distance between peak candidates, can be used to speed up algorithm
     verbose : Boolean
         can be used to print out the number of pushes for left, right and mean, default = True
+    extra : dict, optional
+        additional per push statistics as {variable: [reducers]}, reducers can be "mean", "max", "min", "sum" or a
+        function that takes the samples of a push, e.g. {"fz": ["mean", "min"], "speed": [np.std]}. Results are stored
+        as reducer + variable (e.g. "minfz", "stdspeed"), for every side
 
     Returns
     -------
@@ -493,34 +620,7 @@ def push_by_push_ergo(data, variable="power", cutoff=0.0, minpeak=50.0, mindist=
         dictionary with left, right and mean push-by-push DataFrame
     """
     pbp_sides = {"left": [], "right": [], "mean": []}
-    keys = [
-        "start",
-        "stop",
-        "peak",
-        "tstart",
-        "tstop",
-        "tpeak",
-        "cangle",
-        "cangle_deg",
-        "ptime",
-        "meanpower",
-        "maxpower",
-        "meantorque",
-        "maxtorque",
-        "meanuforce",
-        "maxuforce",
-        "meanforce",
-        "maxforce",
-        "meanspeed",
-        "maxspeed",
-        "work",
-        "slope",
-        "smoothness",
-        "ctime",
-        "reltime",
-        "cwork",
-        "negwork",
-    ]
+    keys = _PBP_KEYS_ERGO
 
     for side in data:
         if (side == "left") | (side == "right"):
@@ -541,25 +641,14 @@ def push_by_push_ergo(data, variable="power", cutoff=0.0, minpeak=50.0, mindist=
         pbp["cangle"] = data[side]["angle"][pbp["stop"]].values - data[side]["angle"][pbp["start"]].values
         pbp["cangle_deg"] = np.rad2deg(pbp["cangle"])
 
-        bins = pbp[["start", "stop"]].values
-        bins[:, 1] += 1
-        push_bins = np.digitize(data[side].index, bins.ravel())  # slice dataframe from push start:stop
-        push_group = data[side].groupby(push_bins)
-        grouped = push_group.agg(["mean", "max"])[1::2].reset_index(drop=True)
-        grouped.columns = [f"{col[1]}{col[0]}" for col in grouped.columns]  # collapse multiindex to match cols with pbp
-
-        mean_max_variables = [var for var in keys if "mean" in var or "max" in var]
-        pbp[mean_max_variables] = grouped[mean_max_variables]
+        variables = {var: ["mean", "max"] for var in ["power", "torque", "uforce", "force", "speed"]}
+        variables["work"] = ["sum"]
+        stats = _push_stats(data[side], peaks["start"], peaks["stop"], variables, extra)
+        stats["work"] = stats.pop("sumwork")
+        pbp = pbp.assign(**stats)
         pbp["slope"] = pbp["maxtorque"] / (pbp["tpeak"] - pbp["tstart"])
         pbp["smoothness"] = pbp["meanforce"] / pbp["maxforce"]
-        pbp["work"] = push_group["work"].sum()[1::2].reset_index(drop=True)
-
-        cycle_bins = np.digitize(data[side].index, pbp["start"].values)
-        pbp["cwork"] = data[side][["work"]].groupby(cycle_bins).sum()[1:].reset_index(drop=True)
-        negative_work = data[side]["work"].copy()
-        negative_work[negative_work >= 0] = 0
-        pbp["negwork"] = negative_work.groupby(cycle_bins).sum()[1:].reset_index(drop=True)
-        pbp.loc[len(pbp) - 1, ["cwork", "negwork"]] = np.NaN
+        pbp["cwork"], pbp["negwork"] = _cycle_work(data[side]["work"], peaks["start"])
 
         pbp_sides[side] = pd.DataFrame(pbp)
 
@@ -572,6 +661,489 @@ def push_by_push_ergo(data, variable="power", cutoff=0.0, minpeak=50.0, mindist=
     return pbp_sides
 
 
+@profiled
+def process_mw_chunked(
+    chunks,
+    outfile=None,
+    wheelsize=0.31,
+    rimsize=0.275,
+    sfreq=200,
+    co_f=15.0,
+    ord_f=2,
+    wl=201,
+    ord_a=2,
+    force=True,
+    speed=True,
+    variable="torque",
+    cutoff=0.0,
+    minpeak=5.0,
+    mindist=5,
+    verbose=True,
+):
+    """
+    Filtering, processing and push-by-push analysis for measurement wheel recordings that don't fit in memory.
+
+    Chunked version of filter_mw, process_mw and push_by_push_mw. Every chunk is filtered together with a margin of
+    samples from the neighbouring chunks that is longer than the impulse response of the filters, after which the
+    margins are trimmed, so the (zero-phase) filtering matches filtering the whole recording at once. The distance is
+    integrated across chunks and pushes that straddle two chunks are stitched together. The processed data is appended
+    to outfile chunk by chunk, only the pushes are kept in memory.
+
+    Parameters
+    ----------
+    chunks : iterable
+        raw measurement wheel DataFrames in order, e.g. com.iter_opti(filename) or com.iter_sw(filename)
+    outfile : str, optional
+        csv file the processed data is written to, default is None (data is not stored)
+    wheelsize : float
+        wheel radius [m]
+    rimsize : float
+        handrim radius [m]
+    sfreq : int
+        sample frequency [Hz]
+    co_f : float
+        cutoff frequency force filter [Hz]
+    ord_f : int
+        order force filter [..]
+    wl : int
+        window length angle filter
+    ord_a : int
+        order angle filter [..]
+    force : bool
+        force filter toggle, default is True
+    speed : bool
+        speed filter toggle, default is True
+    variable : str
+        variable name used for peak (push) detection
+    cutoff : float
+        noise level for peak (push) detection
+    minpeak : float
+        min peak height for peak (push) detection
+    mindist : int
+        minimum sample distance between peak candidates, can be used to speed up algorithm
+    verbose : Boolean
+        can be used to print out the number of pushes, default = True
+
+    Returns
+    -------
+    pbp : pd.DataFrame
+        push-by-push DataFrame, same as push_by_push_mw
+
+    See Also
+    --------
+    filter_mw, process_mw, push_by_push_mw, .com.iter_opti, .com.iter_sw
+
+    """
+    impulse = sosfilt(butter_sos(ord_f, co_f, sfreq), np.r_[1.0, np.zeros(100 * sfreq)])
+    impulse_length = np.nonzero(np.abs(impulse) > 1e-12 * np.abs(impulse).max())[0][-1]
+    margin = max(impulse_length if force else 0, wl // 2 if speed else 0) + 2  # +2 for the gradients
+
+    buffer = pd.DataFrame()  # raw samples: margin before the unprocessed samples, and the unprocessed samples
+    done = 0  # number of samples that have been processed
+    state = {"dist": 0.0, "speed": None, "pending": None, "offset": 0, "work": 0.0, "negwork": 0.0}
+    pushes = []
+
+    def process(data, first, last):
+        """Process data and write samples first:last to file."""
+        data = data.reset_index(drop=True)
+        data = filter_mw(data, sfreq, co_f, ord_f, wl, ord_a, force, speed)
+        data = process_mw(data, wheelsize, rimsize, sfreq).iloc[first:last].reset_index(drop=True)
+
+        speeds = data["speed"].to_numpy()
+        if state["speed"] is not None:  # continue the integral from the previous chunk
+            speeds = np.r_[state["speed"], speeds]
+        dist = state["dist"] + cumtrapz(speeds, initial=0.0) / sfreq
+        data["dist"] = dist[-len(data) :]
+        state["dist"], state["speed"] = data["dist"].iloc[-1], speeds[-1]
+
+        first_chunk = state["pending"] is None
+        if outfile is not None:
+            data.to_csv(outfile, mode="w" if first_chunk else "a", header=first_chunk, index=False)
+        pending = data if first_chunk else pd.concat([state["pending"], data], ignore_index=True)
+        state["pending"] = _chunk_pushes(pending, state, pushes, variable, cutoff, minpeak, mindist)
+
+    for chunk in chunks:
+        buffer = pd.concat([buffer, chunk], ignore_index=True)
+        context = min(done, margin)  # samples before the unprocessed ones
+        if len(buffer) - context > 2 * margin:
+            process(buffer, context, len(buffer) - margin)
+            processed = len(buffer) - margin - context
+            done += processed
+            buffer = buffer.iloc[-2 * margin :]
+    if len(buffer) > min(done, margin):
+        process(buffer, min(done, margin), len(buffer))
+    if state["pending"] is not None:
+        _chunk_pushes(state["pending"], state, pushes, variable, cutoff, minpeak, mindist, final=True)
+
+    columns = _PBP_KEYS_MW + ["cumwork", "cumnegwork"]
+    pbp = pd.concat(pushes, ignore_index=True) if pushes else pd.DataFrame(columns=columns, dtype=float)
+    pbp["ctime"] = pbp["tstart"].shift(-1) - pbp["tstart"]
+    pbp["reltime"] = (pbp["ptime"] / pbp["ctime"]) * 100
+    pbp["cwork"] = pbp["cumwork"].shift(-1) - pbp["cumwork"]
+    pbp["negwork"] = pbp["cumnegwork"].shift(-1) - pbp["cumnegwork"]
+    pbp = pbp[_PBP_KEYS_MW]
+    if verbose:
+        print("\n" + "=" * 80 + f"\nFound {len(pbp)} pushes!\n" + "=" * 80 + "\n")
+    return pbp
+
+
+def _chunk_pushes(data, state, pushes, variable, cutoff, minpeak, mindist, final=False):
+    """
+    Push-by-push analysis of processed data up to the last sample below the cutoff, returns the remaining samples.
+
+    Pushes can't extend past a sample below the cutoff, so all pushes before it are complete. That sample is kept as
+    the first sample of the remaining data, as a push can only start after a sample below the cutoff.
+    """
+    below = np.nonzero(data[variable].to_numpy() < cutoff)[0]
+    end = len(data) if final else (below[-1] + 1 if below.size else 0)
+    if end < 2:
+        return data
+
+    complete = data.iloc[:end]
+    work = np.nan_to_num(complete["work"].to_numpy())
+    cumwork = state["work"] + np.r_[0.0, np.cumsum(work)]  # total work before every sample
+    cumnegwork = state["negwork"] + np.r_[0.0, np.cumsum(np.minimum(work, 0.0))]
+
+    pbp = push_by_push_mw(complete, variable, cutoff, minpeak, mindist, verbose=False)
+    pbp["cumwork"] = cumwork[pbp["start"].to_numpy(dtype=int)]
+    pbp["cumnegwork"] = cumnegwork[pbp["start"].to_numpy(dtype=int)]
+    pbp[["start", "stop", "peak"]] += state["offset"]
+    if len(pbp):
+        pushes.append(pbp)
+
+    keep = end - 1  # keep the last sample below the cutoff
+    state["work"], state["negwork"], state["offset"] = cumwork[keep], cumnegwork[keep], state["offset"] + keep
+    return data.iloc[keep:].reset_index(drop=True)
+
+
+class PushDetector:
+    """
+    Streaming push detection for live measurement wheel or ergometer data.
+
+    Incremental version of filtering, processing and push-by-push analysis that is fed blocks of samples as they come
+    in, e.g. for live feedback during training. Forces and speed are filtered with causal (sosfilt) versions of the
+    filter_mw/filter_ergo filters, angle and distance are integrated incrementally as in process_mw/process_ergo. A push
+    is returned with the same fields as push_by_push_mw/push_by_push_ergo as soon as the signal drops below the cutoff.
+    Only the running totals and the push in progress are kept, so memory use does not grow with the session length.
+
+    .. note:: the cycle fields (ctime, reltime, cwork, negwork) of a push depend on the start of the next push and are
+        NaN when the push is returned. They are filled in, in the dictionary that was returned before, when the next
+        push is completed (a start that does not reach minpeak is not a push), so copy a push that should not change.
+        The cycle fields of the last push of a session stay NaN, as in push_by_push_mw/push_by_push_ergo.
+
+    .. note:: for measurement wheel data the speed is derived from the angle with a backward difference and filtered
+        with a causal low-pass filter (co_s) instead of the (non-causal) Savitzky-Golay filter in filter_mw
+
+    Parameters
+    ----------
+    kind : str
+        "mw" for measurement wheel data (time, fx, fy, fz, mx, my, torque and angle) or "ergo" for a single side of the
+        ergometer (time, force and speed), default is "mw"
+    sfreq : float
+        sample frequency [Hz], default is 200 for "mw" and 100 for "ergo"
+    wheelsize : float
+        wheel radius [m]
+    rimsize : float
+        handrim radius [m]
+    variable : str
+        variable name used for peak (push) detection, default is torque for "mw" and power for "ergo"
+    cutoff : float
+        noise level for peak (push) detection
+    minpeak : float
+        min peak height for peak (push) detection, default is 5.0 for "mw" and 50.0 for "ergo"
+    co_f : float
+        cutoff frequency force filter [Hz]
+    ord_f : int
+        order force filter [..]
+    co_s : float
+        cutoff frequency speed filter [Hz]
+    ord_s : int
+        order speed filter [..]
+    filtered : bool
+        filter toggle, default is True
+
+    Methods
+    -------
+    update
+        process a block of samples, returns the pushes that were completed in that block
+    reset
+        start a new session
+
+    Examples
+    --------
+    >>> detector = PushDetector(kind="ergo")
+    >>> for block in stream:  # e.g. a dict with time, force and speed arrays
+    ...     for push in detector.update(block):
+    ...         print(push["meanpower"])
+
+    """
+
+    def __init__(
+        self,
+        kind="mw",
+        sfreq=None,
+        wheelsize=0.31,
+        rimsize=0.275,
+        variable=None,
+        cutoff=0.0,
+        minpeak=None,
+        co_f=15.0,
+        ord_f=2,
+        co_s=6.0,
+        ord_s=2,
+        filtered=True,
+    ):
+        if kind not in ("mw", "ergo"):
+            raise ValueError(f"kind should be 'mw' or 'ergo', got {kind!r}")
+        mw = kind == "mw"
+        self.kind = kind
+        self.sfreq = (200.0 if mw else 100.0) if sfreq is None else sfreq
+        self.wheelsize = wheelsize
+        self.rimsize = rimsize
+        self.variable = ("torque" if mw else "power") if variable is None else variable
+        self.cutoff = cutoff
+        self.minpeak = (5.0 if mw else 50.0) if minpeak is None else minpeak
+        self.filtered = filtered
+        self.keys = _PBP_KEYS_MW if mw else _PBP_KEYS_ERGO
+        self._force_cols = ["fx", "fy", "fz", "mx", "my", "torque"] if mw else ["force"]
+        self._variables = ["power", "torque", "uforce", "force"] + (["feff", "ftot"] if mw else ["speed"])
+        self._sos_f = butter_sos(ord_f, co_f, self.sfreq)
+        self._sos_s = butter_sos(ord_s, co_s, self.sfreq)
+        self.reset()
+
+    def reset(self):
+        """Forget all state, the next block is treated as the start of a new session."""
+        self.n_samples = 0
+        self._zi = dict()  # filter states
+        self._last = dict()  # last sample of the previous block, for differences and integrals
+        self._totals = {"angle": 0.0, "dist": 0.0, "work": 0.0, "negwork": 0.0}
+        self._below = False  # a push can only start after the signal was below the cutoff
+        self._push = None  # push in progress
+        self._previous = None  # last completed push, waits for the next push to complete its cycle
+
+    def update(self, block):
+        """
+        Process a block of samples.
+
+        Parameters
+        ----------
+        block : pd.DataFrame, dict
+            new samples with time, fx, fy, fz, mx, my, torque and angle for "mw" or time, force and speed for "ergo"
+
+        Returns
+        -------
+        pushes : list
+            dictionaries with the push-by-push fields of every push that was completed in this block, start, stop and
+            peak are sample indices from the start of the session, the cycle fields of the previous push are filled in
+            by this update
+
+        """
+        data = self._process(block)
+        n = len(data["time"])
+        if not n:
+            return []
+
+        below = data[self.variable] < self.cutoff
+        flips = np.flatnonzero(np.concatenate(([self._below], below[:-1])) != below)
+        cumwork = self._totals["work"] + np.concatenate(([0.0], np.cumsum(np.nan_to_num(data["work"]))))
+        negwork = self._totals["negwork"] + np.concatenate(
+            ([0.0], np.cumsum(np.minimum(np.nan_to_num(data["work"]), 0.0)))
+        )
+
+        pushes = []
+        edges = np.union1d([0, n], flips)  # the signal is either below or above the cutoff between the edges
+        for start, stop in zip(edges[:-1], edges[1:]):
+            if start in flips:
+                if below[start]:  # stop crossing
+                    push = self._finish_push()
+                    if push is not None:
+                        pushes.append(push)
+                else:
+                    self._start_push(data, start, cumwork[start], negwork[start])
+            if self._push is not None and not below[start]:
+                self._add_samples(data, start, stop)
+
+        self._below = bool(below[-1])
+        self._totals["work"], self._totals["negwork"] = cumwork[-1], negwork[-1]
+        self.n_samples += n
+        return pushes
+
+    def _process(self, block):
+        """Causal filtering and processing of a block, returns a dictionary with arrays."""
+        data = {col: np.asarray(block[col], dtype=float) for col in ["time"] + self._force_cols}
+        if not len(data["time"]):
+            return data
+        if self.filtered:
+            forces = self._filter("force", np.column_stack([data[col] for col in self._force_cols]), self._sos_f)
+            data.update({col: forces[:, i] for i, col in enumerate(self._force_cols)})
+
+        if self.kind == "mw":
+            angle = np.asarray(block["angle"], dtype=float)
+            if "angle" in self._last:
+                previous = self._last["angle"]
+            else:  # first sample, use the forward difference
+                previous = 2 * angle[0] - angle[1] if len(angle) > 1 else angle[0]
+            aspeed = np.diff(angle, prepend=previous) * self.sfreq
+            self._last["angle"] = angle[-1]
+            data["angle"] = angle
+            data["aspeed"] = self._filter("speed", aspeed[:, None], self._sos_s)[:, 0] if self.filtered else aspeed
+            data["speed"] = data["aspeed"] * self.wheelsize
+            data["dist"] = self._integrate("dist", data["speed"])
+            data["acc"] = self._difference("speed", data["speed"])
+            data["ftot"] = (data["fx"] ** 2 + data["fy"] ** 2 + data["fz"] ** 2) ** 0.5
+            data["uforce"] = data["torque"] / self.rimsize
+            with np.errstate(invalid="ignore", divide="ignore"):
+                data["feff"] = (data["uforce"] / data["ftot"]) * 100
+            data["force"] = data["torque"] / self.wheelsize
+            data["power"] = data["torque"] * data["aspeed"]
+        else:
+            speed = np.asarray(block["speed"], dtype=float)
+            data["speed"] = self._filter("speed", speed[:, None], self._sos_s)[:, 0] if self.filtered else speed
+            data["aspeed"] = data["speed"] / self.wheelsize
+            data["angle"] = self._integrate("angle", data["aspeed"])
+            data["torque"] = data["force"] * self.wheelsize
+            data["acc"] = self._difference("speed", data["speed"])
+            data["power"] = data["speed"] * data["force"]
+            data["dist"] = self._integrate("dist", data["speed"])
+            data["uforce"] = data["force"] * (self.wheelsize / self.rimsize)
+        data["work"] = data["power"] / self.sfreq
+        return data
+
+    def _filter(self, name, array, sos):
+        """Causal low-pass filter that keeps its state between blocks, starts in steady state on the first sample."""
+        if name not in self._zi:
+            self._zi[name] = sosfilt_zi(sos)[:, :, None] * np.nan_to_num(array[0])
+        filtered, self._zi[name] = sosfilt(sos, array, axis=0, zi=self._zi[name])
+        return filtered
+
+    def _integrate(self, name, values):
+        """Cumulative trapezoidal integral that continues from the previous block, starts at zero."""
+        previous = self._last.get(f"integral_{name}", values[0])
+        steps = (np.concatenate(([previous], values[:-1])) + values) / (2 * self.sfreq)
+        result = self._totals[name] + np.cumsum(steps)
+        self._last[f"integral_{name}"], self._totals[name] = values[-1], result[-1]
+        return result
+
+    def _difference(self, name, values):
+        """Backward difference times the sample frequency, continues from the previous block."""
+        previous = self._last.get(f"difference_{name}", values[0])
+        self._last[f"difference_{name}"] = values[-1]
+        return np.diff(values, prepend=previous) * self.sfreq
+
+    def _start_push(self, data, idx, cumwork, negwork):
+        self._push = {
+            "start": self.n_samples + idx,
+            "tstart": data["time"][idx],
+            "anglestart": data["angle"][idx],
+            "cumwork": cumwork,
+            "negwork": negwork,
+            "sum": dict.fromkeys(self._variables, 0.0),
+            "count": dict.fromkeys(self._variables, 0),
+            "max": dict.fromkeys(self._variables, np.NaN),
+            "work": 0.0,
+            "peakvalue": -np.inf,
+        }
+
+    def _add_samples(self, data, start, stop):
+        """Update the statistics of the push in progress with samples start:stop of the block."""
+        push = self._push
+        for var in self._variables:
+            values = data[var][start:stop]
+            valid = ~np.isnan(values)
+            if valid.any():
+                push["sum"][var] += values[valid].sum()
+                push["count"][var] += valid.sum()
+                push["max"][var] = np.fmax(push["max"][var], values[valid].max())
+        push["work"] += np.nansum(data["work"][start:stop])
+
+        values = data[self.variable][start:stop]
+        if not np.isnan(values).all() and np.nanmax(values) > push["peakvalue"]:  # first maximum, like find_peaks
+            peak = start + np.nanargmax(values)
+            push.update(peakvalue=data[self.variable][peak], peak=self.n_samples + peak, tpeak=data["time"][peak])
+        push.update(stop=self.n_samples + stop - 1, tstop=data["time"][stop - 1], anglestop=data["angle"][stop - 1])
+
+    def _finish_push(self):
+        """Close the push in progress, returns the push record if it was high enough."""
+        push, self._push = self._push, None
+        if push is None or push["peakvalue"] <= self.minpeak:
+            return None
+
+        record = dict.fromkeys(self.keys, np.NaN)
+        record.update({key: push[key] for key in ["start", "stop", "peak", "tstart", "tstop", "tpeak", "work"]})
+        record["cangle"] = push["anglestop"] - push["anglestart"]
+        record["cangle_deg"] = np.rad2deg(record["cangle"])
+        record["ptime"] = record["tstop"] - record["tstart"]
+        for var in self._variables:
+            record[f"mean{var}"] = push["sum"][var] / push["count"][var] if push["count"][var] else np.NaN
+            record[f"max{var}"] = push["max"][var]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            record["slope"] = np.float64(record["maxtorque"]) / (record["tpeak"] - record["tstart"])
+            record["smoothness"] = np.float64(record["meanforce"]) / record["maxforce"]
+
+        if self._previous is not None:  # this push completes the cycle of the previous one
+            previous, cumwork, negwork = self._previous
+            previous["ctime"] = record["tstart"] - previous["tstart"]
+            previous["reltime"] = (previous["ptime"] / previous["ctime"]) * 100
+            previous["cwork"] = push["cumwork"] - cumwork
+            previous["negwork"] = push["negwork"] - negwork
+        self._previous = (record, push["cumwork"], push["negwork"])
+        return record
+
+
+def _push_stats(data, starts, stops, variables, extra=None):
+    """
+    Per push statistics for the samples from start to stop (inclusive), NaNs are ignored like in pandas.
+
+    Only the requested variables are aggregated, with ufunc.reduceat on the start/stop indices instead of a groupby over
+    all columns. Returns a dictionary with reducer + variable (e.g. "meanpower") as keys.
+    """
+    variables = dict(variables)
+    for var, reducers in (extra or {}).items():
+        variables[var] = list(variables.get(var, [])) + [red for red in reducers if red not in variables.get(var, [])]
+
+    starts = np.asarray(starts, dtype=int)
+    stops = np.asarray(stops, dtype=int)
+    indices = np.ravel([starts, stops + 1], order="F")  # reduceat gives push, gap, push, gap, ...
+    indices = indices[indices < len(data)]
+
+    stats = dict()
+    for var, reducers in variables.items():
+        values = data[var].to_numpy(dtype=float)
+        nan = np.isnan(values)
+        filled = np.where(nan, 0.0, values)
+        for reducer in reducers:
+            name = reducer if isinstance(reducer, str) else reducer.__name__
+            if not len(starts):
+                stats[name + var] = np.array([])
+            elif reducer == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    stats[name + var] = np.add.reduceat(filled, indices)[::2] / np.add.reduceat(~nan, indices)[::2]
+            elif reducer == "sum":
+                stats[name + var] = np.add.reduceat(filled, indices)[::2]
+            elif reducer == "max":
+                stats[name + var] = np.fmax.reduceat(values, indices)[::2]  # fmax skips NaNs
+            elif reducer == "min":
+                stats[name + var] = np.fmin.reduceat(values, indices)[::2]
+            elif callable(reducer):
+                stats[name + var] = np.array([reducer(values[start : stop + 1]) for start, stop in zip(starts, stops)])
+            else:
+                raise ValueError(f"Unknown reducer {reducer!r}, use 'mean', 'max', 'min', 'sum' or a function")
+    return stats
+
+
+def _cycle_work(work, starts):
+    """Total and negative work per cycle (start to next start), the last cycle is incomplete and therefore NaN."""
+    work = np.nan_to_num(work.to_numpy(dtype=float))
+    starts = np.asarray(starts, dtype=int)
+    if not len(starts):
+        return np.array([]), np.array([])
+    cwork = np.add.reduceat(work, starts)
+    negwork = np.add.reduceat(np.minimum(work, 0.0), starts)
+    cwork[-1] = negwork[-1] = np.NaN
+    return cwork, negwork
+
+
+@profiled
 def camber_correct(data, ang):
     """Correct for camber angle in measurement wheel data
 
@@ -467,30 +467,105 @@ def rotate_matrix(ang, axis="z"):
 def get_local_coordinate(marker, acs, origin):
     """Make the local coordinate system from the anatomical coordinate system
 
+    For orthonormal coordinate systems the transpose of the acs is used as its inverse, which gives the same result as
+    solving the linear system but is a lot faster. Coordinate systems that are not orthonormal (e.g. the forearm in
+    DSEM) are solved with one factorisation per frame for all markers.
+
     Parameters
     ----------
     marker : np.array
-        marker points
+        [n, 3] marker points or [n, m, 3] points of m markers
 
     acs : np.array
-        anatomical coordinate system
+        [n, 3, 3] anatomical coordinate system
 
     origin : np.array
-        origin for the local coordinate system
+        [n, 3] origin for the local coordinate system
 
     Returns
     -------
-    local_marker : dict[np.array]
-        local coordinate system
+    local_marker : np.array
+        marker points in the local coordinate system, same shape as marker
     """
 
-    marker = marker.copy()
-    marker -= origin
-    local_marker = solve(acs, marker)
+    marker = np.asarray(marker)
+    marker = marker - (origin[:, None, :] if marker.ndim == 3 else origin)
+    if is_orthonormal(acs):
+        local_marker = marker @ acs if marker.ndim == 3 else (marker[:, None, :] @ acs)[:, 0]  # acs.T @ marker
+    elif marker.ndim == 3:
+        local_marker = solve(acs, marker.transpose(0, 2, 1)).transpose(0, 2, 1)
+    else:
+        local_marker = solve(acs, marker)
 
     return local_marker
 
 
+def get_local_coordinates(markers, acs, origin):
+    """Transform several markers to the local coordinate system in one go
+
+    Parameters
+    ----------
+    markers : dict[np.array]
+        [n, 3] marker points per marker name
+
+    acs : np.array
+        [n, 3, 3] anatomical coordinate system
+
+    origin : np.array
+        [n, 3] origin for the local coordinate system
+
+    Returns
+    -------
+    local : dict[np.array]
+        marker points in the local coordinate system per marker name
+    """
+
+    local_markers = get_local_coordinate(np.stack(list(markers.values()), axis=1), acs, origin)
+    return {name: local_markers[:, i] for i, name in enumerate(markers)}
+
+
+def is_orthonormal(acs, atol=1.0e-8):
+    """Check if all [3, 3] frames of an [n, 3, 3] coordinate system are orthonormal, frames with NaNs are skipped
+
+    Parameters
+    ----------
+    acs : np.array
+        [n, 3, 3] anatomical coordinate system
+
+    atol : float
+        absolute tolerance, default is 1e-8
+
+    Returns
+    -------
+    orthonormal : bool
+    """
+
+    error = np.abs(acs.transpose(0, 2, 1) @ acs - np.eye(3))
+    return not (error > atol).any()
+
+
+def relative_rotation(acs_proximal, acs_distal):
+    """Rotation matrix of a distal segment relative to a proximal segment
+
+    Parameters
+    ----------
+    acs_proximal : np.array
+        [n, 3, 3] anatomical coordinate system of the proximal segment
+
+    acs_distal : np.array
+        [n, 3, 3] anatomical coordinate system of the distal segment
+
+    Returns
+    -------
+    rotation : np.array
+        [n, 3, 3] rotation matrix
+    """
+
+    if is_orthonormal(acs_proximal):
+        return acs_proximal.transpose(0, 2, 1) @ acs_distal
+    return solve(acs_proximal, acs_distal)
+
+
 def make_acs_sc(AA, TS, AI, DSEM=False):
     """Make the anatomical coordinate system of the scapula based on ISB recommendations
 
@@ -542,11 +617,9 @@ def make_acs_sc(AA, TS, AI, DSEM=False):
     y_axis = normalize(y_axis)
 
     acs = np.stack([x_axis, y_axis, z_axis], axis=2)
-    local = {}
     points = [AA, TS, AI]
     names = ["AA", "TS", "AI"]
-    for points, names in zip(points, names):
-        local[names] = get_local_coordinate(points, acs, origin)
+    local = get_local_coordinates(dict(zip(names, points)), acs, origin)
 
     return local, acs, origin
 
@@ -604,11 +677,9 @@ def make_acs_th(IJ, PX, C7, T8, DSEM=False):
     y_axis = normalize(y_axis)
 
     acs = np.stack([x_axis, y_axis, z_axis], axis=2)
-    local = {}
     points = [IJ, PX, C7, T8]
     names = ["IJ", "PX", "C7", "T8"]
-    for points, names in zip(points, names):
-        local[names] = get_local_coordinate(points, acs, origin)
+    local = get_local_coordinates(dict(zip(names, points)), acs, origin)
 
     return local, acs, origin
 
@@ -681,9 +752,7 @@ def make_acs_cl(SC, AC, IJ, PX, C7, T8, AA=None, DSEM=False):
     y_axis = normalize(y_axis)
 
     acs = np.stack([x_axis, y_axis, z_axis], axis=2)
-    local = {}
-    for points, names in zip(points, names):
-        local[names] = get_local_coordinate(points, acs, origin)
+    local = get_local_coordinates(dict(zip(names, points)), acs, origin)
 
     return local, acs, origin
 
@@ -739,11 +808,9 @@ def make_acs_hu(GH, EL, EM, DSEM=False):
     y_axis = normalize(y_axis)
 
     acs = np.stack([x_axis, y_axis, z_axis], axis=2)
-    local = {}
     points = [GH, EL, EM]
     names = ["GH", "EL", "EM"]
-    for points, names in zip(points, names):
-        local[names] = get_local_coordinate(points, acs, origin)
+    local = get_local_coordinates(dict(zip(names, points)), acs, origin)
 
     return local, acs, origin
 
@@ -801,11 +868,9 @@ def make_acs_fa(US, RS, EL, EM, DSEM=False):
     y_axis = normalize(y_axis)
 
     acs = np.stack([x_axis, y_axis, z_axis], axis=2)
-    local = {}
     points = [US, RS, EL, EM]
     names = ["US", "RS", "EL", "EM"]
-    for points, names in zip(points, names):
-        local[names] = get_local_coordinate(points, acs, origin)
+    local = get_local_coordinates(dict(zip(names, points)), acs, origin)
 
     return local, acs, origin
 
@@ -853,11 +918,9 @@ def make_acs_hand(M2, M5, US, RS):
     y_axis = normalize(y_axis)
 
     acs = np.stack([x_axis, y_axis, z_axis], axis=2)
-    local = {}
     points = [M2, M5, US, RS]
     names = ["M2", "M5", "US", "RS"]
-    for points, names in zip(points, names):
-        local[names] = get_local_coordinate(points, acs, origin)
+    local = get_local_coordinates(dict(zip(names, points)), acs, origin)
 
     return local, acs, origin
 
@@ -892,7 +955,7 @@ def flexext_prosup(GH, EL, EM, US, RS):
     local_hu, acs_hu, origin_hu = make_acs_hu(GH, EL, EM, DSEM=True)
     local_fa, acs_fa, origin_fa = make_acs_fa(US, RS, EL, EM, DSEM=True)
 
-    elbow = solve(acs_hu, acs_fa)
+    elbow = relative_rotation(acs_hu, acs_fa)
     angles = acs_to_car_ang(elbow, order=[0, 2, 1]) * 180 / np.pi
     angles = angles[:, 0:2]
 
@@ -917,10 +980,7 @@ def find_gh_regression(markers):
 
     origin = markers["AA"]
     local, acs, origin = make_acs_sc(origin, markers["TS"], markers["AI"], DSEM=True)
-    data_r = {}
-
-    for name in ["AA", "AC", "AI", "PC", "TS"]:
-        data_r[name] = get_local_coordinate(markers[name], acs, origin)
+    data_r = get_local_coordinates({name: markers[name] for name in ["AA", "AC", "AI", "PC", "TS"]}, acs, origin)
 
     AI2AA = magnitude(data_r["AI"] - data_r["AA"])[0]
     AC2AA = magnitude(data_r["AC"] - data_r["AA"])[0]
@@ -937,3 +997,117 @@ def find_gh_regression(markers):
     gh_global = origin + np.einsum("ijk,ik->ij", acs, gh_location)
 
     return gh_global
+
+
+SEGMENTS = {
+    "thorax": ["IJ", "PX", "C7", "T8"],
+    "clavicle": ["SC", "AC", "IJ", "PX", "C7", "T8"],
+    "scapula": ["AA", "TS", "AI"],
+    "humerus": ["GH", "EL", "EM"],
+    "forearm": ["US", "RS", "EL", "EM"],
+    "hand": ["M2", "M5", "US", "RS"],
+}
+
+# proximal segment, distal segment and the ISB recommended rotation order (0='x', 1='y', 2='z') in ISB and DSEM axes
+JOINTS = {
+    "sternoclavicular": ("thorax", "clavicle", [1, 0, 2], [1, 2, 0]),
+    "acromioclavicular": ("clavicle", "scapula", [1, 0, 2], [1, 2, 0]),
+    "scapulothoracic": ("thorax", "scapula", [1, 0, 2], [1, 2, 0]),
+    "glenohumeral": ("scapula", "humerus", [1, 0, 1], [1, 2, 1]),
+    "humerothoracic": ("thorax", "humerus", [1, 0, 1], [1, 2, 1]),
+    "elbow": ("humerus", "forearm", [2, 0, 1], [0, 2, 1]),
+    "wrist": ("forearm", "hand", [2, 0, 1], [0, 2, 1]),
+}
+
+
+def make_segment_model(markers, segments=None, DSEM=False):
+    """Make the anatomical coordinate systems of all segments at once
+
+    Every segment is only computed once, so joints that share a segment (e.g. the thorax) reuse its coordinate system.
+    Segments of which markers are missing are skipped unless they are asked for explicitly.
+
+    Parameters
+    ----------
+    markers: dict[np.array]
+        [n, 3] data points per marker name, e.g. from make_marker_dict, add GH with find_gh_regression
+
+    segments: list[str]
+        names of the segments to make, see SEGMENTS, default is all segments with markers
+
+    DSEM: boolean (default = False)
+        set to True to use coordinate system guidelines DSEM
+        Y pointing upward, X pointing laterally to the right and Z point backwards
+
+    Returns
+    -------
+    model : dict[tuple]
+        (local, acs, origin) per segment, like the output of the make_acs functions
+    """
+
+    required = {name: list(segment_markers) for name, segment_markers in SEGMENTS.items()}
+    if DSEM:
+        required["clavicle"] = ["SC", "AC", "AA"]
+    if segments is None:
+        segments = [name for name in SEGMENTS if all(marker in markers for marker in required[name])]
+    else:
+        for name in segments:
+            if name not in SEGMENTS:
+                raise ValueError(f"Unknown segment '{name}', use one of {list(SEGMENTS)}")
+            missing = [marker for marker in required[name] if marker not in markers]
+            if missing:
+                raise ValueError(f"Markers {missing} are required for the {name}")
+
+    m = markers
+    builders = {
+        "thorax": lambda: make_acs_th(m["IJ"], m["PX"], m["C7"], m["T8"], DSEM=DSEM),
+        "clavicle": lambda: make_acs_cl(
+            m["SC"], m["AC"], m.get("IJ"), m.get("PX"), m.get("C7"), m.get("T8"), AA=m.get("AA"), DSEM=DSEM
+        ),
+        "scapula": lambda: make_acs_sc(m["AA"], m["TS"], m["AI"], DSEM=DSEM),
+        "humerus": lambda: make_acs_hu(m["GH"], m["EL"], m["EM"], DSEM=DSEM),
+        "forearm": lambda: make_acs_fa(m["US"], m["RS"], m["EL"], m["EM"], DSEM=DSEM),
+        "hand": lambda: make_acs_hand(m["M2"], m["M5"], m["US"], m["RS"]),
+    }
+    return {name: builders[name]() for name in segments}
+
+
+def joint_angles(model, joints=None, DSEM=False, deg=True):
+    """Joint angles of all joints in one call
+
+    The angles are the decomposition of the rotation of the distal segment relative to the proximal segment in the
+    rotation order of the joint, the same decomposition as acs_to_car_ang. The elbow in DSEM gives the same angles as
+    flexext_prosup (plus a third angle).
+
+    Parameters
+    ----------
+    model : dict[tuple]
+        output of make_segment_model
+
+    joints : list[str], dict[tuple]
+        names of the joints to compute, see JOINTS, or a dictionary with (proximal, distal, order) per joint, default
+        is all joints of which both segments are in the model
+
+    DSEM: boolean (default = False)
+        the model is made with DSEM=True, used for the rotation order of the joints in JOINTS
+
+    deg : bool
+        return the angles in degrees instead of radians, default is True
+
+    Returns
+    -------
+    angles : dict[np.array]
+        [n, 3] angles per joint, in the rotation order of the joint
+    """
+
+    if joints is None:
+        joints = [name for name, (proximal, distal, *_) in JOINTS.items() if proximal in model and distal in model]
+    if not isinstance(joints, dict):
+        joints = {name: JOINTS[name][:2] + (JOINTS[name][3] if DSEM else JOINTS[name][2],) for name in joints}
+
+    angles = {}
+    for name, (proximal, distal, order) in joints.items():
+        rotation = relative_rotation(model[proximal][1], model[distal][1])
+        angles[name] = acs_to_car_ang(rotation, order=order)
+        if deg:
+            angles[name] = np.rad2deg(angles[name])
+    return angles
@@ -1,15 +1,17 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import pandas as pd
-import tkinter as tk
-from tkinter import simpledialog
 
-from .utils import find_nearest
+from .com import SPIRO_COLUMNS, SPIRO_OPTIONAL, convert_spiro
+from .utils import find_nearest, pd_dt_to_s
+from .profiling import profiled
 
 
+@profiled
 def cut_spiro(data_spiro, start, end):
     """
-    Cuts data to time of interest
+    Cuts data to time of interest, the breaths after the one nearest to start up to the one nearest to end.
+
+    The columns other than time are views of the input data, changing them in place also changes the input data.
 
     Parameters
     ----------
@@ -26,14 +28,15 @@ def cut_spiro(data_spiro, start, end):
         data cutted to time of interest
 
     """
-    index_start = abs(data_spiro["time"] - start).idxmin() + 1
-    index_end = abs(data_spiro["time"] - end).idxmin()
-    data_spiro["time"] = data_spiro["time"] - start
+    index_start = find_nearest(data_spiro["time"], start, index=True, assume_sorted=True) + 1
+    index_end = find_nearest(data_spiro["time"], end, index=True, assume_sorted=True)
 
-    data_spiro = data_spiro.iloc[index_start:index_end]
+    data_spiro = data_spiro.iloc[index_start:index_end].copy(deep=False)
+    data_spiro["time"] = data_spiro["time"] - start  # a new column, the other columns stay views
     return data_spiro
 
 
+@profiled
 def calc_weighted_average(dataframe, weights):
     """
     Calculate the weighted average of all columns in a DataFrame.
@@ -54,6 +57,201 @@ def calc_weighted_average(dataframe, weights):
     return dataframe.apply(lambda col: np.average(col[~np.isnan(col)], weights=weights[~np.isnan(col)]), axis=0)
 
 
+class SpiroStream:
+    """
+    Streaming spirometry processing for breath-by-breath data.
+
+    Incremental version of load_spiro and calc_weighted_average that is fed breaths as they come in during a test, one
+    at a time or in blocks. Keeps rolling means over the last breaths, the same as the rolling(window=15).mean() used
+    in wasserman and aerobic_threshold, and time-weighted averages of all breaths so far. Every breath is processed in
+    constant time: only the breaths in the window and running sums are kept.
+
+    Parameters
+    ----------
+    window : int
+        number of breaths in the rolling mean, default is 15
+
+    Attributes
+    ----------
+    n_breaths : int
+        number of breaths processed
+    time : float
+        time of the last breath [s]
+
+    Methods
+    -------
+    update
+        process one breath or a block of breaths, returns them in the format of load_spiro
+    rolling_mean
+        rolling means over the last window breaths
+    weighted_average
+        time-weighted averages of all breaths so far
+    snapshot
+        rolling means or weighted averages as a DataFrame with the columns of load_spiro
+    reset
+        start a new test
+
+    Examples
+    --------
+    >>> stream = SpiroStream()
+    >>> for breath in breaths:  # e.g. a dict with t, VO2, VCO2, VE, EEm, HR, PetO2, PetCO2 and VT from the COSMED
+    ...     stream.update(breath)
+    ...     print(stream.rolling_mean()["VO2"])
+
+    """
+
+    def __init__(self, window=15):
+        self.window = window
+        self.columns = [col for col in SPIRO_COLUMNS if col not in ("time", "weights")]
+        self.reset()
+
+    def reset(self):
+        """Forget all breaths, the next breath is treated as the start of a new test."""
+        n_columns = len(self.columns)
+        self.n_breaths = 0
+        self.time = np.NaN
+        self._previous_time = None  # time of the last breath, also if it was missing data
+        self._buffer = np.full((self.window, n_columns), np.NaN)  # last window breaths, used as a ring buffer
+        self._buffer_weights = np.zeros(self.window)
+        self._sum = np.zeros(n_columns)  # sums and counts of the valid (not NaN) values in the window
+        self._count = np.zeros(n_columns, dtype=int)
+        self._weighted_sum = np.zeros(n_columns)  # sums of weight * value and weight of all valid values
+        self._weight_sum = np.zeros(n_columns)
+        self._duration = 0.0  # summed weights of all breaths
+
+    def update(self, breaths):
+        """
+        Process one breath or a block of breaths.
+
+        Parameters
+        ----------
+        breaths : dict, pd.Series, pd.DataFrame, list
+            one breath or a block of breaths with the columns of the COSMED export (t, VO2, VCO2, VE, EEm, HR, PetO2,
+            PetCO2, VT), see com.load_spiro, missing EEm, HR, PetO2, PetCO2 or VT are NaN
+
+        Returns
+        -------
+        data : pd.DataFrame
+            the breaths in the format of load_spiro, without breaths with missing data
+
+        """
+        if isinstance(breaths, (dict, pd.Series)):
+            return self._update_breath(breaths)
+        if not isinstance(breaths, pd.DataFrame):
+            breaths = pd.DataFrame(breaths)
+        if not len(breaths):
+            return pd.DataFrame(columns=SPIRO_COLUMNS)
+
+        data = convert_spiro(breaths, previous_time=self._previous_time)
+        self._previous_time = data["time"].iloc[-1]
+        data = data[data["time"] > 0]  # remove "missing" data
+        for values, weight in zip(data[self.columns].to_numpy(dtype=np.float64), data["weights"].to_numpy()):
+            self._add(values, weight)
+        if len(data):
+            self.time = data["time"].iloc[-1]
+        return data
+
+    def _update_breath(self, breath):
+        """Single breath version of update, the same conversions as com.convert_spiro without DataFrames."""
+        time = pd_dt_to_s(breath["t"])
+        weight = 0 if self._previous_time is None else time - self._previous_time
+        self._previous_time = time
+        if time <= 0:  # missing data
+            return pd.DataFrame(columns=SPIRO_COLUMNS)
+
+        vo2, vco2, ve = np.float64(breath["VO2"]) / 1000, np.float64(breath["VCO2"]) / 1000, np.float64(breath["VE"])
+        optional = {col: np.float64(breath.get(col, np.NaN)) for col in SPIRO_OPTIONAL}
+        hr = optional["HR"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            row = {
+                "time": time,
+                "HR": hr,
+                "EE": optional["EEm"] * 4184 / 60,
+                "RER": vco2 / vo2,
+                "VO2": vo2,
+                "VCO2": vco2,
+                "VE": ve,
+                "VE/VO2": ve / vo2,
+                "VE/VCO2": ve / vco2,
+                "O2pulse": vo2 / hr,
+                "PetO2": optional["PetO2"],
+                "PetCO2": optional["PetCO2"],
+                "VT": optional["VT"],
+                "weights": weight,
+            }
+        self._add(np.array([row[col] for col in self.columns], dtype=np.float64), weight)
+        self.time = time
+        return pd.DataFrame([row], columns=SPIRO_COLUMNS)
+
+    def _add(self, values, weight):
+        """Replaces the oldest breath in the window and updates the running sums."""
+        idx = self.n_breaths % self.window
+        oldest = self._buffer[idx]
+        valid = ~np.isnan(oldest)
+        self._sum[valid] -= oldest[valid]
+        self._count -= valid
+
+        valid = ~np.isnan(values)
+        self._sum[valid] += values[valid]
+        self._count += valid
+        self._weighted_sum[valid] += weight * values[valid]
+        self._weight_sum[valid] += weight
+        self._buffer[idx] = values
+        self._buffer_weights[idx] = weight
+        self._duration += weight
+        self.n_breaths += 1
+
+    def rolling_mean(self):
+        """
+        Rolling means over the last window breaths, NaN until the window holds window valid values of a column.
+
+        Returns
+        -------
+        means : pd.Series
+            rolling mean per column
+
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(self._count >= self.window, self._sum / self._count, np.NaN)
+        return pd.Series(means, index=self.columns)
+
+    def weighted_average(self):
+        """
+        Time-weighted averages of all breaths so far, the same as calc_weighted_average on the breaths.
+
+        Returns
+        -------
+        averages : pd.Series
+            weighted average per column, NaN if the column has no valid values with a weight
+
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = np.where(self._weight_sum > 0, self._weighted_sum / self._weight_sum, np.NaN)
+        return pd.Series(averages, index=self.columns)
+
+    def snapshot(self, average=False):
+        """
+        Current rolling means or weighted averages in the format of load_spiro.
+
+        Parameters
+        ----------
+        average : bool
+            return the weighted averages of all breaths instead of the rolling means, default is False
+
+        Returns
+        -------
+        snapshot : pd.DataFrame
+            one row with the time of the last breath, the means or averages and the summed weights (duration [s]) of
+            the breaths they are calculated from
+
+        """
+        values = self.weighted_average() if average else self.rolling_mean()
+        weights = self._duration if average else self._buffer_weights.sum()
+        row = {"time": self.time, **values, "weights": weights}
+        return pd.DataFrame([row], columns=SPIRO_COLUMNS)
+
+
+@profiled
 def wasserman(data_spiro, power, title=None):
     """
     Makes the 9 wasserman plot from a graded exercise test
@@ -85,6 +283,7 @@ def wasserman(data_spiro, power, title=None):
         most important outcomes of the maximal exercise test
 
     """
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots(3, 3, figsize=[10, 7])
     if title:
         fig.suptitle("9 Wasserman plots " + str(title), size=20)
@@ -221,7 +420,8 @@ def wasserman(data_spiro, power, title=None):
     return fig, result_gxt
 
 
-def aerobic_threshold(data_spiro, power, start_spiro, muser):
+@profiled
+def aerobic_threshold(data_spiro, power, start_spiro, muser, time=None):
     """
     Shows four plots to determine the aerobic ventilatory threshold from the maximal exercise test
         Plot 1: HR vs VO2
@@ -239,6 +439,9 @@ def aerobic_threshold(data_spiro, power, start_spiro, muser):
         start of maximal exercise test on spirometer
     muser : float
         mass user (kg)
+    time : float, optional
+        time of VT1 on the spirometer [s], e.g. from detect_vt1, draws the line at this time instead of asking where it
+        is, NaN (not found) draws no line, default is None
 
     Returns
     -------
@@ -248,6 +451,7 @@ def aerobic_threshold(data_spiro, power, start_spiro, muser):
         main outcomes at vt1
 
     """
+    import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots(2, 2, figsize=[10, 7])
     fig.suptitle("Determination VT1", size=20)
@@ -322,11 +526,22 @@ def aerobic_threshold(data_spiro, power, start_spiro, muser):
     # If you are satisfied with the result --> y, and the outcomes are printed
     # If you are not satisfied with the result --> n, and you can place a new line
 
-    while True:
+    if time is not None and not np.isnan(time):  # no line if the threshold was not found
+        time = find_nearest(data_spiro["time"], time, assume_sorted=True)
+        ax[0, 0].axvline(x=data_spiro["VO2"][data_spiro["time"] == time].values, color="k", linestyle="--")
+        for axis in [ax[0, 1], ax[1, 0], ax[1, 1]]:
+            axis.axvline(x=time, color="k", linestyle="--")
+
+    ask = time is None
+    if ask:
+        import tkinter as tk
+        from tkinter import simpledialog
+
+    while ask:
         pts = plt.ginput(1)
         time = pts[0][0]
         if time > 10:
-            time = find_nearest(data_spiro["time"], time)
+            time = find_nearest(data_spiro["time"], time, assume_sorted=True)
             line1 = ax[0, 0].axvline(x=data_spiro["VO2"][data_spiro["time"] == time].values, color="k", linestyle="--")
 
         else:
@@ -353,34 +568,25 @@ def aerobic_threshold(data_spiro, power, start_spiro, muser):
             print("Wrong input, expected y or n")
             break
 
-    print(
-        "VT1-time: " + str(time - int(start_spiro)) + " s"
-        "\nVT1-power: " + str(round(power.iloc[time].values[0], 2)) + " W"
-        "\nVT1-HR: " + str(data_spiro["HR"][data_spiro["time"] == time].values[0]) + " bpm"
-        "\nVT1-VO2: "
-        + str(round(data_spiro["VO2"].rolling(window=30).mean()[data_spiro["time"] == time].values[0], 3))
-        + " l/min"
-    )
+    if np.isnan(time):
+        print("VT1 not found")
+    else:
+        print(
+            "VT1-time: " + str(time - int(start_spiro)) + " s"
+            "\nVT1-power: " + str(round(power.iloc[time].values[0], 2)) + " W"
+            "\nVT1-HR: " + str(data_spiro["HR"][data_spiro["time"] == time].values[0]) + " bpm"
+            "\nVT1-VO2: "
+            + str(round(data_spiro["VO2"].rolling(window=30).mean()[data_spiro["time"] == time].values[0], 3))
+            + " l/min"
+        )
 
-    vt1 = pd.DataFrame(
-        [
-            {
-                "VT1-time": time - int(start_spiro),
-                "VT1-power": power.iloc[time].values[0],
-                "VT1-HR": data_spiro["HR"][data_spiro["time"] == time].values[0],
-                "VT1-VO2": data_spiro["VO2"].rolling(window=30).mean()[data_spiro["time"] == time].values[0],
-                "VT1-VO2/kg": (
-                    (data_spiro["VO2"].rolling(window=30).mean()[data_spiro["time"] == time].values[0]) * 1000
-                )
-                / muser,
-            }
-        ]
-    )
+    vt1 = _threshold_outcomes("VT1", data_spiro, power, time, start_spiro, muser)
 
     return fig, vt1
 
 
-def anaerobic_threshold(data_spiro, power, start_spiro, muser):
+@profiled
+def anaerobic_threshold(data_spiro, power, start_spiro, muser, time=None):
     """
     Shows four plots to determine the anaerobic ventilatory threshold from the maximal exercise test
         Plot 1: time vs VE
@@ -398,6 +604,9 @@ def anaerobic_threshold(data_spiro, power, start_spiro, muser):
         start of maximal exercise test on spirometer
     muser : float
         mass user (kg)
+    time : float, optional
+        time of VT2 on the spirometer [s], e.g. from detect_vt2, draws the line at this time instead of asking where it
+        is, NaN (not found) draws no line, default is None
 
     Returns
     -------
@@ -407,6 +616,7 @@ def anaerobic_threshold(data_spiro, power, start_spiro, muser):
         main outcomes at vt2
 
     """
+    import matplotlib.pyplot as plt
 
     fig, ax = plt.subplots(2, 2, figsize=[10, 7])
     fig.suptitle("Determination VT2", size=20)
@@ -481,10 +691,20 @@ def anaerobic_threshold(data_spiro, power, start_spiro, muser):
     # If you are satisfied with the result --> y, and the outcomes are printed
     # If you are not satisfied with the result --> n, and you can place a new line
 
-    while True:
+    if time is not None and not np.isnan(time):  # no line if the threshold was not found
+        time = find_nearest(data_spiro["time"], time, assume_sorted=True)
+        for axis in ax.flat:
+            axis.axvline(x=time, color="k", linestyle="--")
+
+    ask = time is None
+    if ask:
+        import tkinter as tk
+        from tkinter import simpledialog
+
+    while ask:
         pts = plt.ginput(1)
         time = pts[0][0]
-        time = find_nearest(data_spiro["time"], time)
+        time = find_nearest(data_spiro["time"], time, assume_sorted=True)
         line1 = ax[0, 0].axvline(x=time, color="k", linestyle="--")
         line2 = ax[0, 1].axvline(x=time, color="k", linestyle="--")
         line3 = ax[1, 0].axvline(x=time, color="k", linestyle="--")
@@ -504,28 +724,247 @@ def anaerobic_threshold(data_spiro, power, start_spiro, muser):
             print("Wrong input, expected y or n")
             break
 
-    print(
-        "VT2-time: " + str(time - int(start_spiro)) + " s"
-        "\nVT2-power: " + str(round(power.iloc[time].values[0], 2)) + " W"
-        "\nVT2-HR: " + str(data_spiro["HR"][data_spiro["time"] == time].values[0]) + " bpm"
-        "\nVT2-VO2: "
-        + str(round(data_spiro["VO2"].rolling(window=30).mean()[data_spiro["time"] == time].values[0], 3))
-        + " l/min"
-    )
+    if np.isnan(time):
+        print("VT2 not found")
+    else:
+        print(
+            "VT2-time: " + str(time - int(start_spiro)) + " s"
+            "\nVT2-power: " + str(round(power.iloc[time].values[0], 2)) + " W"
+            "\nVT2-HR: " + str(data_spiro["HR"][data_spiro["time"] == time].values[0]) + " bpm"
+            "\nVT2-VO2: "
+            + str(round(data_spiro["VO2"].rolling(window=30).mean()[data_spiro["time"] == time].values[0], 3))
+            + " l/min"
+        )
+
+    vt2 = _threshold_outcomes("VT2", data_spiro, power, time, start_spiro, muser)
 
-    vt2 = pd.DataFrame(
+    return fig, vt2
+
+
+def _threshold_outcomes(label, data_spiro, power, time, start_spiro, muser):
+    """Main outcomes at a ventilatory threshold, NaN if no threshold was found."""
+    at_time = data_spiro["time"] == time
+    if np.isnan(time) or not at_time.any():
+        hr = vo2 = np.NaN
+    else:
+        hr = data_spiro["HR"][at_time].values[0]
+        vo2 = data_spiro["VO2"].rolling(window=30).mean()[at_time].values[0]
+    in_power = power is not None and not np.isnan(time) and 0 <= int(time) < len(power)
+    return pd.DataFrame(
         [
             {
-                "VT2-time": time - int(start_spiro),
-                "VT2-power": power.iloc[time].values[0],
-                "VT2-HR": data_spiro["HR"][data_spiro["time"] == time].values[0],
-                "VT2-VO2": data_spiro["VO2"].rolling(window=30).mean()[data_spiro["time"] == time].values[0],
-                "VT2-VO2/kg": (
-                    (data_spiro["VO2"].rolling(window=30).mean()[data_spiro["time"] == time].values[0]) * 1000
-                )
-                / muser,
+                f"{label}-time": time - int(start_spiro),
+                f"{label}-power": power.iloc[int(time)].values[0] if in_power else np.NaN,
+                f"{label}-HR": hr,
+                f"{label}-VO2": vo2,
+                f"{label}-VO2/kg": vo2 * 1000 / muser,
             }
         ]
     )
 
-    return fig, vt2
+
+def _breakpoint(x, y, min_points=15):
+    """
+    Best split of a two segment linear regression of y on x.
+
+    The sums of x, y, x^2, xy and y^2 of both segments follow from cumulative sums, so the squared error of every
+    candidate split is computed in O(1) and all splits are evaluated at once.
+
+    Returns
+    -------
+    split : int
+        index of the first point of the second segment, None if there are less than 2 * min_points points
+    slopes : tuple
+        slopes of the first and second segment
+
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    if len(x) < 2 * min_points:
+        return None, (np.NaN, np.NaN)
+    x, y = x - x.mean(), y - y.mean()  # centred for a better numerical precision of the sums
+
+    sums = np.zeros((6, len(x) + 1))  # sums over the first k points in column k
+    np.cumsum([np.ones_like(x), x, y, x * x, x * y, y * y], axis=1, out=sums[:, 1:])
+    splits = np.arange(min_points, len(x) - min_points + 1)
+    first = sums[:, splits]
+    second = sums[:, -1:] - first
+
+    def fit(segment):
+        n, sx, sy, sxx, sxy, syy = segment
+        var_x, cov, var_y = sxx - sx * sx / n, sxy - sx * sy / n, syy - sy * sy / n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = cov / var_x
+            error = var_y - np.where(var_x > 0, cov * slope, 0.0)
+        return error, slope
+
+    error_first, slope_first = fit(first)
+    error_second, slope_second = fit(second)
+    best = np.argmin(error_first + error_second)
+    return np.flatnonzero(valid)[splits[best]], (slope_first[best], slope_second[best])
+
+
+def _exercise(data_spiro, power, start_spiro, window):
+    """Breaths of the exercise test (after start_spiro and within power if given), smoothed with a centred window."""
+    end = len(power) if power is not None else np.inf
+    test = data_spiro[(data_spiro["time"] >= start_spiro) & (data_spiro["time"] < end)]
+    smooth = test.rolling(window=window, center=True, min_periods=1).mean()
+    smooth["time"] = test["time"]
+    return smooth.reset_index(drop=True)
+
+
+def _slope_increase(data, x, y, window):
+    """Time at which the slope of y against x increases, NaN if it does not."""
+    split, (slope_first, slope_second) = _breakpoint(data[x], data[y], min_points=window)
+    return data["time"][split] if split is not None and slope_second > slope_first else np.NaN
+
+
+def _turning_point(data, column, window, peak=False):
+    """
+    Time of the nadir (or peak) of a column, NaN if the column is missing or the nadir is less than window breaths from
+    the start or end, like the segments of _breakpoint.
+    """
+    if column not in data:
+        return np.NaN
+    valid = data[column].notna().to_numpy()
+    values = data[column].to_numpy()[valid]
+    if len(values) < 2 * window:
+        return np.NaN
+    idx = np.argmax(values) if peak else np.argmin(values)
+    return data["time"].to_numpy()[valid][idx] if window <= idx <= len(values) - window else np.NaN
+
+
+def _combine(data_spiro, times, min_methods=2):
+    """Median of the times of the methods at the nearest breath, NaN if less than min_methods found a threshold."""
+    times = [time for time in times.values() if not np.isnan(time)]
+    if len(times) < min_methods:
+        return np.NaN
+    return find_nearest(data_spiro["time"].values, np.median(times), assume_sorted=True)
+
+
+@profiled
+def detect_vt1(data_spiro, power=None, start_spiro=0, muser=np.NaN, window=15, plot=False):
+    """
+    Automatically determines the aerobic ventilatory threshold (VT1) from the maximal exercise test.
+
+    Headless alternative for aerobic_threshold, so many tests can be processed without user input (e.g. with batch).
+    VT1 is the median of three methods, NaN if less than two of them find a threshold:
+
+        V-slope: breakpoint of a two segment regression of VCO2 against VO2 (Beaver et al., 1986)
+        Ventilatory equivalent: breakpoint of VE/VO2 over time, where it starts to increase
+        PetO2: time of the nadir of the end-tidal O2 tension, where it starts to increase
+
+    The breakpoints are searched over all splits at once with cumulative sums, see _breakpoint. The data is smoothed
+    with a centred rolling mean over window breaths. Every method needs at least window breaths on both sides of the
+    threshold, the PetO2 method is skipped if that column is missing.
+
+    Parameters
+    ----------
+    data_spiro : pd.DataFrame
+        dataframe containing spirometer data, see com.load_spiro
+    power : pd.DataFrame, optional
+        dataframe containing the mean power output per step, showed as a continuous signal (see power_per_min), the
+        search stops at the end of the test if given, so cut off the recovery if it is not given
+    start_spiro : float
+        start of maximal exercise test on spirometer
+    muser : float
+        mass user (kg)
+    window : int
+        number of breaths in the smoothing window and minimum number of breaths per segment, default is 15
+    plot : bool
+        also make the plots of aerobic_threshold with the detected VT1, requires power, default is False
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        plots to check vt1, None if plot is False
+    vt1 : pd.DataFrame
+        main outcomes at vt1, the same as aerobic_threshold, and the times of the separate methods
+
+    See Also
+    --------
+    aerobic_threshold, detect_vt2
+
+    """
+    data = _exercise(data_spiro, power, start_spiro, window)
+    times = {
+        "vslope": _slope_increase(data, "VO2", "VCO2", window),
+        "equivalent": _slope_increase(data, "time", "VE/VO2", window),
+        "PetO2": _turning_point(data, "PetO2", window),
+    }
+    return _threshold_result("VT1", data_spiro, power, start_spiro, muser, times, plot)
+
+
+@profiled
+def detect_vt2(data_spiro, power=None, start_spiro=0, muser=np.NaN, window=15, vt1=None, plot=False):
+    """
+    Automatically determines the anaerobic ventilatory threshold (VT2) from the maximal exercise test.
+
+    Headless alternative for anaerobic_threshold, so many tests can be processed without user input (e.g. with batch).
+    VT2 is searched after VT1 and is the median of three methods, NaN if less than two of them find a threshold:
+
+        VE against VCO2: breakpoint of a two segment regression (respiratory compensation point)
+        Ventilatory equivalent: breakpoint of VE/VCO2 over time, where it starts to increase
+        PetCO2: time of the peak of the end-tidal CO2 tension, where it starts to decrease
+
+    The breakpoints are searched over all splits at once with cumulative sums, see _breakpoint. The data is smoothed
+    with a centred rolling mean over window breaths. Every method needs at least window breaths on both sides of the
+    threshold, the PetCO2 method is skipped if that column is missing.
+
+    Parameters
+    ----------
+    data_spiro : pd.DataFrame
+        dataframe containing spirometer data, see com.load_spiro
+    power : pd.DataFrame, optional
+        dataframe containing the mean power output per step, showed as a continuous signal (see power_per_min), the
+        search stops at the end of the test if given, so cut off the recovery if it is not given
+    start_spiro : float
+        start of maximal exercise test on spirometer
+    muser : float
+        mass user (kg)
+    window : int
+        number of breaths in the smoothing window and minimum number of breaths per segment, default is 15
+    vt1 : pd.DataFrame, optional
+        outcomes of detect_vt1 or aerobic_threshold, VT1 is detected if not given
+    plot : bool
+        also make the plots of anaerobic_threshold with the detected VT2, requires power, default is False
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        plots to check vt2, None if plot is False
+    vt2 : pd.DataFrame
+        main outcomes at vt2, the same as anaerobic_threshold, and the times of the separate methods
+
+    See Also
+    --------
+    anaerobic_threshold, detect_vt1
+
+    """
+    if vt1 is None:
+        _, vt1 = detect_vt1(data_spiro, power, start_spiro, muser, window)
+    data = _exercise(data_spiro, power, start_spiro, window)
+    after_vt1 = vt1["VT1-time"][0] + int(start_spiro)
+    data = data[data["time"] > after_vt1].reset_index(drop=True) if not np.isnan(after_vt1) else data
+    times = {
+        "VE": _slope_increase(data, "VCO2", "VE", window),
+        "equivalent": _slope_increase(data, "time", "VE/VCO2", window),
+        "PetCO2": _turning_point(data, "PetCO2", window, peak=True),
+    }
+    return _threshold_result("VT2", data_spiro, power, start_spiro, muser, times, plot)
+
+
+def _threshold_result(label, data_spiro, power, start_spiro, muser, times, plot):
+    """Outcomes (and optionally the plots) at the combined time of the methods."""
+    time = _combine(data_spiro, times)
+    fig = None
+    if plot:
+        if power is None:
+            raise ValueError("The plots require the power, see utils.power_per_min")
+        plot_threshold = aerobic_threshold if label == "VT1" else anaerobic_threshold
+        fig, _ = plot_threshold(data_spiro, power, start_spiro, muser, time=time)
+    outcomes = _threshold_outcomes(label, data_spiro, power, time, start_spiro, muser)
+    for method, method_time in times.items():
+        outcomes[f"{label}-time-{method}"] = method_time - int(start_spiro)
+    return fig, outcomes
@@ -0,0 +1,237 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+import pandas as pd
+
+_config = {"enabled": False, "memory": False}
+_records = []  # one dictionary per finished call or stage
+_state = threading.local()  # stack of running calls per thread, for nesting and self time
+
+
+def enable_profiling(memory=False):
+    """
+    Enable the instrumentation of the com, kin, imu, physio and ana functions.
+
+    Once enabled, every call of an instrumented function is recorded with its wall time, CPU time, number of input rows
+    and (optionally) the peak memory allocated during the call. Profiling is disabled by default, the instrumented
+    functions then only check a flag before calling the original function.
+
+    Parameters
+    ----------
+    memory : bool
+        also record the peak allocated memory with tracemalloc, this slows down the instrumented functions
+        considerably, default is False
+
+    See Also
+    --------
+    disable_profiling, profiling_report, reset_profiling, profile_stage
+
+    """
+    _config["enabled"] = True
+    _config["memory"] = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _config["tracemalloc"] = True  # only stop tracing if it was started here
+
+
+def disable_profiling():
+    """Disable the instrumentation, the recorded calls are kept until reset_profiling is called."""
+    _config["enabled"] = False
+    if _config.pop("tracemalloc", False):
+        tracemalloc.stop()
+
+
+def profiling_enabled():
+    """Returns True if the instrumentation is enabled."""
+    return _config["enabled"]
+
+
+def reset_profiling():
+    """Remove all recorded calls."""
+    _records.clear()
+
+
+def profiled(func):
+    """
+    Decorator that records the calls of a function when profiling is enabled.
+
+    The stage name is the module and name of the function (e.g. kin.auto_process), the number of rows is taken from the
+    first argument if that is a DataFrame, array or dictionary of DataFrames. The decorated function behaves exactly
+    like the original one.
+
+    """
+    name = f"{func.__module__.rpartition('.')[2]}.{func.__qualname__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _config["enabled"]:
+            return func(*args, **kwargs)
+        with profile_stage(name, rows=count_rows(args[0]) if args else None):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def profile_stage(name, rows=None):
+    """
+    Context manager that records a block of code as a stage when profiling is enabled.
+
+    Stages can be nested, calls of instrumented functions within the block are recorded with the stage as parent.
+
+    Parameters
+    ----------
+    name : str
+        name of the stage in the report
+    rows : int, optional
+        number of rows that are processed in the stage
+
+    Examples
+    --------
+    >>> with profile_stage("cut sprints", rows=len(data)):
+    ...     sprints = [cut_data(data, start, end) for start, end in zip(starts, ends)]
+
+    """
+    if not _config["enabled"]:
+        yield
+        return
+
+    stack = _stack()
+    parent = stack[-1] if stack else None
+    frame = {"name": name, "children": 0.0, "memory": None}
+    if _config["memory"] and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        if parent is not None and parent["memory"] is not None:
+            parent["peak"] = max(parent["peak"], peak)
+        if hasattr(tracemalloc, "reset_peak"):  # python 3.9+, the peak is an upper bound on older versions
+            tracemalloc.reset_peak()
+        frame["memory"] = frame["peak"] = current
+    stack.append(frame)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        stack.pop()
+        peak_memory = None
+        if frame["memory"] is not None and tracemalloc.is_tracing():
+            frame["peak"] = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            peak_memory = frame["peak"] - frame["memory"]
+            if parent is not None and parent["memory"] is not None:
+                parent["peak"] = max(parent["peak"], frame["peak"])
+        if parent is not None:
+            parent["children"] += wall
+        _record(name, wall, cpu, rows, peak_memory, parent=parent, self_time=wall - frame["children"])
+
+
+def _record(name, wall, cpu, rows=None, peak_memory=None, parent=None, self_time=None):
+    """Adds a call to the records, also used by utils.Timer for named timers."""
+    if parent is None and _stack():
+        parent = _stack()[-1]
+        parent["children"] += wall
+    _records.append(
+        {
+            "stage": name,
+            "parent": parent["name"] if parent is not None else None,
+            "wall_time": wall,
+            "self_time": wall if self_time is None else self_time,
+            "cpu_time": cpu,
+            "rows": rows,
+            "peak_memory": peak_memory,
+        }
+    )
+
+
+def _stack():
+    if not hasattr(_state, "stack"):
+        _state.stack = []
+    return _state.stack
+
+
+def count_rows(data):
+    """
+    Number of rows in a DataFrame, array or dictionary of DataFrames (summed), None for anything else.
+
+    Parameters
+    ----------
+    data : pd.DataFrame, np.array, dict
+        input of an instrumented function
+
+    Returns
+    -------
+    rows : int, None
+
+    """
+    if isinstance(data, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(data)
+    if isinstance(data, dict):
+        rows = [count_rows(value) for value in data.values()]
+        rows = [row for row in rows if row is not None]
+        return sum(rows) if rows else None
+    return None
+
+
+def profiling_records():
+    """
+    Returns all recorded calls and stages.
+
+    Returns
+    -------
+    records : pd.DataFrame
+        one row per call with the stage, parent stage, wall time [s], self time (without instrumented calls within the
+        stage) [s], CPU time [s], number of input rows and peak allocated memory [bytes]
+
+    """
+    columns = ["stage", "parent", "wall_time", "self_time", "cpu_time", "rows", "peak_memory"]
+    return pd.DataFrame(_records, columns=columns)
+
+
+def profiling_report(filename=None):
+    """
+    Summary of the recorded calls per stage.
+
+    Parameters
+    ----------
+    filename : str, optional
+        also write the report to this JSON file
+
+    Returns
+    -------
+    report : pd.DataFrame
+        number of calls, total wall, self and CPU time [s], mean wall time [s], total number of rows and maximum peak
+        memory [bytes] per stage, sorted by total self time
+
+    See Also
+    --------
+    profiling_records
+
+    """
+    records = profiling_records()
+    report = records.groupby("stage", sort=False).agg(
+        calls=("wall_time", "size"),
+        wall_time=("wall_time", "sum"),
+        self_time=("self_time", "sum"),
+        cpu_time=("cpu_time", "sum"),
+        mean_wall_time=("wall_time", "mean"),
+        rows=("rows", lambda rows: rows.sum(min_count=1)),
+        peak_memory=("peak_memory", "max"),
+    )
+    report = report.sort_values("self_time", ascending=False).reset_index()
+    if filename is not None:
+        report.to_json(filename, orient="records", indent=2)
+    return report
+
+
+def _take_records(start=0):
+    """Removes and returns the records from start on, used to send the records of batch workers to the main process."""
+    taken = _records[start:]
+    del _records[start:]
+    return taken
+
+
+def _add_records(records):
+    _records.extend(records)
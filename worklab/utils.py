@@ -2,16 +2,16 @@ import datetime
 import re
 import time
 from collections import defaultdict
-from tkinter import Tk
-from tkinter.filedialog import askopenfilename, askopenfilenames, asksaveasfilename, askdirectory
+from functools import lru_cache
 import math
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.interpolate import InterpolatedUnivariateSpline, interp1d
-from scipy.optimize import curve_fit
-from scipy.signal import butter, sosfiltfilt, correlate
+
+from . import profiling
+
+# com imports this module, so scipy, matplotlib and tkinter are imported in the functions that use them: loading a file
+# then doesn't import scipy (~0.4 s). kin, imu and ana need scipy for their main functions and import it at the top.
 
 
 def pick_file(initialdir=None):
@@ -29,6 +29,9 @@ def pick_file(initialdir=None):
         full path to picked file
 
     """
+    from tkinter import Tk
+    from tkinter.filedialog import askopenfilename
+
     root = Tk()
     root.withdraw()  # no root window
     filename = askopenfilename(initialdir=initialdir, title="Open data file or files")  # return path to selected file
@@ -54,6 +57,9 @@ def pick_files(initialdir=None):
         full path to picked file
 
     """
+    from tkinter import Tk
+    from tkinter.filedialog import askopenfilenames
+
     root = Tk()
     root.withdraw()  # no root window
     filenames = askopenfilenames(initialdir=initialdir, title="Open data file or files")  # path to selected files
@@ -79,6 +85,9 @@ def pick_directory(initialdir=None):
         full path to selected directory
 
     """
+    from tkinter import Tk
+    from tkinter.filedialog import askdirectory
+
     root = Tk()
     root.withdraw()  # no root window
     directory = askdirectory(initialdir=initialdir, title="Select data directory")  # return path to selected directory
@@ -104,6 +113,9 @@ def pick_save_file(initialdir=None):
         full path to selected savefile
 
     """
+    from tkinter import Tk
+    from tkinter.filedialog import asksaveasfilename
+
     root = Tk()
     root.withdraw()  # no root window
     filename = asksaveasfilename(initialdir=initialdir, title="Save file or files")  # return path to selected file
@@ -129,6 +141,8 @@ def make_calibration_spline(calibration_points):
         dict with left: np.array, right: np.array containing the interpolated splines
 
     """
+    from scipy.interpolate import InterpolatedUnivariateSpline
+
     spl_line = {"left": [], "right": []}
     for side in spl_line:
         x = np.arange(0, 10)
@@ -181,10 +195,73 @@ def lowpass_butter(array, sfreq=100.0, cutoff=20.0, order=2):
         filtered array
 
     """
-    # noinspection PyTupleAssignmentBalance
+    from scipy.signal import sosfiltfilt
+
+    array = np.asarray(array)
+    return sosfiltfilt(_butter_sos(order, cutoff, sfreq), array)
+
+
+def lowpass_butter_columns(array, sfreq=100.0, cutoff=20.0, order=2):
+    """
+    Apply the zero-phase low-pass Butterworth filter on every column of a 2-D array at once.
+
+    Same as calling lowpass_butter on every column, but in a single call, e.g. data[["fx", "fy", "fz"]].
+
+    Parameters
+    ----------
+    array : np.array, pd.DataFrame
+        input array (samples x channels) to be filtered
+    sfreq : float
+        sample frequency of the signal, default is 100
+    cutoff : float
+        cutoff frequency for the filter, default is 20
+    order : int
+        order of the filter, default is 2
+
+    Returns
+    -------
+    array : np.array
+        filtered array (samples x channels)
+
+    See Also
+    --------
+    lowpass_butter
+
+    """
+    from scipy.signal import sosfiltfilt
+
     array = np.asarray(array)
-    sos = butter(order, cutoff, fs=sfreq, btype="low", output="sos")
-    return sosfiltfilt(sos, array)
+    return sosfiltfilt(_butter_sos(order, cutoff, sfreq), array, axis=0)
+
+
+def butter_sos(order, cutoff, sfreq):
+    """
+    Design a low-pass Butterworth filter in second-order sections, the designs are cached for repeated calls.
+
+    Parameters
+    ----------
+    order : int
+        order of the filter
+    cutoff : float
+        cutoff frequency for the filter
+    sfreq : float
+        sample frequency of the signal
+
+    Returns
+    -------
+    sos : np.array
+        second-order sections
+
+    """
+    return _butter_sos(order, cutoff, sfreq).copy()  # copy, so the cached design can't be changed by the caller
+
+
+@lru_cache(maxsize=128)
+def _butter_sos(order, cutoff, sfreq):
+    from scipy.signal import butter
+
+    # noinspection PyTupleAssignmentBalance
+    return butter(order, cutoff, fs=sfreq, btype="low", output="sos")
 
 
 def interpolate_array(x, y, kind="linear", fill_value="extrapolate", assume=True):
@@ -210,6 +287,8 @@ def interpolate_array(x, y, kind="linear", fill_value="extrapolate", assume=True
         interpolated y-array
 
     """
+    from scipy.interpolate import interp1d
+
     y_fun = interp1d(x[~np.isnan(y)], y[~np.isnan(y)], kind=kind, fill_value=fill_value, assume_sorted=assume)
     return y_fun(x)
 
@@ -218,29 +297,40 @@ def pd_dt_to_s(dt):
     """
     Calculates time in seconds from datetime or string.
 
+    Accepts a single value or a whole Series, the latter is converted in one vectorised operation. Fractional seconds
+    are truncated.
+
     Parameters
     ----------
-    dt : pd.Series
-        datetime instance or a string with H:m:s data
+    dt : pd.Series, datetime.time, str
+        datetime instance or a string with H:m:s data, or a Series thereof
 
     Returns
     -------
-    time : pd.Series
+    time : pd.Series, int
         time in seconds
 
     """
     if isinstance(dt, datetime.time):
         time = (dt.hour * 60 + dt.minute) * 60 + dt.second
-    else:
+    elif isinstance(dt, str):
         h, m, s = dt.split(":")
-        time = int(h) * 3600 + int(m) * 60 + int(s)
+        time = int(h) * 3600 + int(m) * 60 + int(float(s))
+    else:
+        time = _series_to_s(dt)
     return time
 
 
+def _series_to_s(dt):
+    """Vectorised conversion of a Series with datetime.time objects or h:mm:ss(.fff) strings to whole seconds"""
+    dt = pd.Series(dt)
+    seconds = np.floor(pd.to_timedelta(dt.astype(str)).dt.total_seconds())
+    return seconds if seconds.isna().any() else seconds.astype(np.int64)
+
+
 def pd_interp(df, interp_column, at):
     """
-    Resamples (and extrapolates) DataFrame with Scipy's interp1d, this was more performant than the pandas one for some
-    reason.
+    Resamples (and extrapolates) DataFrame with Scipy's interp1d, all columns are interpolated in a single call.
 
     Parameters
     ----------
@@ -257,14 +347,58 @@ def pd_interp(df, interp_column, at):
         interpolated DataFrame
 
     """
-    interp_df = pd.DataFrame()
-    for col in df:
-        f = interp1d(df[interp_column], df[col], fill_value="extrapolate")
-        interp_df[col] = f(at)
+    from scipy.interpolate import interp1d
+
+    at = np.asarray(at)
+    f = interp1d(df[interp_column].to_numpy(), df.to_numpy(dtype=float), axis=0, fill_value="extrapolate")
+    interp_df = pd.DataFrame(f(at), columns=df.columns, copy=False)
     interp_df[interp_column] = at
     return interp_df
 
 
+FULL_PRECISION = ("time", "timestamp", "angle", "dist")  # cumulative channels, always kept as float64
+
+
+def cast_channels(data, dtype=np.float64):
+    """
+    Casts the float channels of a DataFrame (or dictionary of DataFrames) to dtype in place.
+
+    Time and the cumulative channels (angle and distance) are never cast, their values grow over the measurement while
+    the differences between samples stay small, so they would lose precision as float32.
+
+    Parameters
+    ----------
+    data : pd.DataFrame, dict
+        data with one or more float channels
+    dtype : np.dtype
+        dtype of the channels, e.g. np.float32 to halve the memory footprint, default is np.float64
+
+    Returns
+    -------
+    data : pd.DataFrame, dict
+        the same data with the cast channels
+
+    Notes
+    -----
+    Storing a channel as float32 gives a relative error of at most 2^-24 (6e-8) per value, which is far below the
+    resolution of the measurement wheels and ergometer (12-16 bit). Processing steps integrate in float64 and only store
+    the result in dtype, so the derived channels stay within 1e-5 times the range of the channel of the float64 path.
+    Most channels are within 1e-6, derivatives of stored channels (e.g. the acceleration of the ergometer) are the least
+    precise.
+
+    """
+    if isinstance(data, dict):
+        for key in data:
+            data[key] = cast_channels(data[key], dtype)
+        return data
+    dtype = np.dtype(dtype)
+    columns = [col for col in data.columns if col not in FULL_PRECISION]
+    columns = [col for col in columns if data[col].dtype.kind == "f" and data[col].dtype != dtype]
+    if columns:
+        data[columns] = data[columns].astype(dtype)
+    return data
+
+
 def merge_chars(chars):
     """
     Merges list or tuple of binary characters to single string
@@ -287,6 +421,9 @@ def find_peaks(data, cutoff=1.0, minpeak=5.0, min_dist=5):
     """
     Finds positive peaks in signal and returns indices of start and stop.
 
+    All peak candidates are paired with the nearest samples below the cutoff at once, with a binary search on the
+    indices of those samples.
+
     Parameters
     ----------
     data : pd.Series, np.array
@@ -305,20 +442,33 @@ def find_peaks(data, cutoff=1.0, minpeak=5.0, min_dist=5):
 
     """
     peaks = defaultdict(list)
-    tmp = {"start": None, "stop": None}
 
     data = np.asarray(data)  # coercing to an array if necessary
     data_slice = np.nonzero(data > minpeak)[0]  # indices of nonzero values
     data_slice = data_slice[np.diff(data_slice, append=10e100) > min_dist]  # remove duplicate samples from push
-    for prom in np.nditer(data_slice):
-        tmp["stop"] = next((idx for idx, value in enumerate(data[prom:]) if value < cutoff), None)
-        tmp["start"] = next((idx for idx, value in enumerate(reversed(data[:prom])) if value < cutoff), None)
-        if tmp["stop"] and tmp["start"]:  # did we find a start and stop?
-            peaks["stop"].append(tmp["stop"] + prom - 1)
-            peaks["start"].append(prom - tmp["start"])
-    for key, value in peaks.items():
-        peaks[key] = np.unique(value)  # remove possible duplicates
-    peaks["peak"] = [np.argmax(data[start: stop + 1]) + start for start, stop in zip(peaks["start"], peaks["stop"])]
+
+    below = np.nonzero(data < cutoff)[0]  # indices of samples below the cutoff
+    idx = np.searchsorted(below, data_slice)  # first sample below the cutoff at or after each candidate
+    found = (idx > 0) & (idx < below.size)  # is there a sample below the cutoff before and after the candidate?
+    data_slice, idx = data_slice[found], idx[found]
+    stop, start = below[idx], below[idx - 1]
+    valid = (stop != data_slice) & (start != data_slice - 1)  # candidate itself or its predecessor is below cutoff
+    if valid.any():
+        peaks["stop"] = np.unique(stop[valid] - 1)
+        peaks["start"] = np.unique(start[valid] + 1)
+
+    starts, stops = np.asarray(peaks["start"], dtype=np.intp), np.asarray(peaks["stop"], dtype=np.intp)
+    if starts.size:
+        maxima = np.maximum.reduceat(data, np.ravel([starts, stops + 1], order="F"))[::2]  # NaN if NaN in peak
+        edges = np.zeros(data.size + 1, dtype=np.intp)
+        edges[starts], edges[stops + 1] = 1, -1
+        in_peak = np.cumsum(edges[:-1]) > 0
+        segment = np.cumsum(edges[:-1] == 1) - 1  # peak number of every sample
+        candidates = np.nonzero(in_peak & ((data == maxima[segment]) | np.isnan(data)))[0]
+        first = np.unique(segment[candidates], return_index=True)[1]  # first maximum like np.argmax
+        peaks["peak"] = list(candidates[first])
+    else:
+        peaks["peak"] = []
     return peaks
 
 
@@ -359,6 +509,8 @@ def nonlinear_fit_coast_down(time, vel, total_weight):
         c1, c2
 
     """
+    from scipy.optimize import curve_fit
+
     # try to determine c1 and c2 with curve_fit for non-linear approach
     initial_velocity = vel[0]
     vel_func = lambda t, c1, c2: coast_down_velocity(t, initial_velocity, c1, c2, total_weight)  # noqa, lock variables
@@ -486,7 +638,7 @@ def camel_to_snake(name: str):
     return re.sub("([a-z0-9])([A-Z])", r"\1_\2", s1).lower()
 
 
-def find_nearest(array, value, index=False):
+def find_nearest(array, value, index=False, assume_sorted=False):
     """
     Find the nearest value in an array or the index thereof.
 
@@ -498,18 +650,59 @@ def find_nearest(array, value, index=False):
         value that you are looking for
     index : bool
         whether you want the index
+    assume_sorted : bool
+        array is sorted in ascending order (e.g. time), uses a binary search instead of scanning the whole array,
+        default is False
 
     Returns
     -------
     np.array
-        value or index of the nearest value
+        value or index of the nearest value, the first one if two values are equally near
 
     """
     array = np.asarray(array)
-    idx = (np.abs(array - value)).argmin()
+    if assume_sorted:
+        idx = min(np.searchsorted(array, value), len(array) - 1)
+        if idx > 0 and value - array[idx - 1] <= array[idx] - value:
+            idx -= 1
+        idx = np.searchsorted(array, array[idx])  # first of equal values, like argmin
+    else:
+        idx = (np.abs(array - value)).argmin()
     return idx if index else array[idx]
 
 
+def time_slice(time, start=None, end=None):
+    """
+    Find the samples between start and end in a sorted time array.
+
+    Uses a binary search, so a cut takes logarithmic time, and returns a slice, so cutting an array or DataFrame with
+    it gives a view instead of a copy.
+
+    Parameters
+    ----------
+    time : np.array, pd.Series
+        time in ascending order [s]
+    start : float, optional
+        samples after start are included [s], default is the first sample
+    end : float, optional
+        samples before end are included [s], default is the last sample
+
+    Returns
+    -------
+    slice
+        positions of the samples, use with .iloc for a DataFrame
+
+    Examples
+    --------
+    >>> data.iloc[time_slice(data["time"], 10, 70)]  # same rows as data[(data["time"] > 10) & (data["time"] < 70)]
+
+    """
+    time = np.asarray(time)
+    first = 0 if start is None else int(np.searchsorted(time, start, side="right"))
+    last = len(time) if end is None else int(np.searchsorted(time, end, side="left"))
+    return slice(first, max(first, last))
+
+
 def split_dataframe(df, inds):
     """
     Split a dataframe on a list of indices. For example a dataframe that contains multiple sessions of wheelchair
@@ -581,6 +774,13 @@ class Timer:
         custom text, optional
     start : bool
         automatically start the timer when it's initialized, default is True
+    verbose : bool
+        print the time on lap and stop, default is True
+
+    Notes
+    -----
+    Named timers are also recorded as a stage in the profiling report when profiling is enabled, see
+    .profiling.enable_profiling.
 
     Methods
     -------
@@ -595,11 +795,13 @@ class Timer:
 
     timers = dict()
 
-    def __init__(self, name="", text="Elapsed time: {:0.4f} seconds", start=True):
+    def __init__(self, name="", text="Elapsed time: {:0.4f} seconds", start=True, verbose=True):
         self._start_time = None
+        self._cpu_time = None
         self._lap_time = 0.0
         self.name = name
         self.text = text
+        self.verbose = verbose
 
         if name:
             self.timers.setdefault(name, 0)  # Add new named timers to dictionary of timers
@@ -610,6 +812,7 @@ class Timer:
         if self._start_time is not None:
             raise TimerError("Timer is already running. Use .stop() to stop it")
         self._start_time = time.perf_counter()
+        self._cpu_time = time.process_time()
 
     def lap(self, lap_name=""):
         if self._start_time is None:
@@ -622,9 +825,10 @@ class Timer:
             self._lap_time = time.perf_counter() - self._start_time
             current_lap = self._lap_time
 
-        if lap_name:
-            print(lap_name)
-        print(self.text.format(current_lap))
+        if self.verbose:
+            if lap_name:
+                print(lap_name)
+            print(self.text.format(current_lap))
 
     def stop(self):
         if self._start_time is None:
@@ -633,9 +837,12 @@ class Timer:
         elapsed_time = time.perf_counter() - self._start_time
         self._start_time = None
 
-        print(self.text.format(elapsed_time))
+        if self.verbose:
+            print(self.text.format(elapsed_time))
         if self.name:
             self.timers[self.name] += elapsed_time
+            if profiling.profiling_enabled():
+                profiling._record(self.name, elapsed_time, time.process_time() - self._cpu_time)
         return elapsed_time
 
 
@@ -661,57 +868,55 @@ def power_per_min(data_ergo, dur, start_spiro):
 
     """
 
-    n = [*range(math.ceil(dur / 60))]  # define amount of steps
-    mean_power = []  # define mean_power
-    power = []
-
-    for i in n:
-        x = data_ergo["mean"]
-        s = x[(x["time"] > ((i + 1) * 60) - 60) & (x["time"] < ((i + 1) * 60))]  # cut every step
-        s = s[s["time"] > (s["time"].max() - 20)]  # takes last 20s of step
-        mean_p = s["power"].mean()
-        mean_power.append(mean_p)
+    time, power = data_ergo["mean"]["time"].to_numpy(), data_ergo["mean"]["power"]
+    steps = np.arange(math.ceil(dur / 60)) * 60
+    first = np.searchsorted(time, steps, side="right")  # cut every step
+    last = np.maximum(first, np.searchsorted(time, steps + 60, side="left"))
 
-    outcome = pd.DataFrame(mean_power, columns=["mean_power"])
-    for i in n:
-        q = [outcome["mean_power"][i]] * 60
-        power = power + q
+    mean_power = np.full(len(steps), np.NaN)
+    for step, (start, stop) in enumerate(zip(first, last)):
+        if stop > start:
+            start = max(start, np.searchsorted(time, time[stop - 1] - 20, side="right"))  # takes last 20s of step
+            mean_power[step] = power.iloc[start:stop].mean()
 
-    x = [0] * int(start_spiro)
-    power = x + power
-    power = pd.DataFrame(power, columns=["power"])
-
-    return power
+    power = np.concatenate([np.zeros(int(start_spiro)), np.repeat(mean_power, 60)])
+    return pd.DataFrame(power, columns=["power"])
 
 
 def metamax_to_s(dt):
     """
     Calculates time in seconds from h:mm:ss.000 to seconds
 
+    Accepts a single string or a whole Series, the latter is converted in one vectorised operation. Fractional seconds
+    are truncated.
+
     Parameters
     ----------
-    dt : pd.Series
+    dt : pd.Series, str
         series with h:mm:ss.000
 
     Returns
     -------
-    time : pd.Series
+    time : pd.Series, int
         time in seconds
 
     """
-
-    h, m, s = dt[:-4].split(":")
-    time = int(h) * 3600 + int(m) * 60 + int(s)
+    if isinstance(dt, str):
+        h, m, s = dt[:-4].split(":")
+        time = int(h) * 3600 + int(m) * 60 + int(s)
+    else:
+        time = _series_to_s(dt)
     return time
 
 
-def signal_lag(y1, y2, sfreq=100, cutoff=6, order=2, plot=True, verbose=True):
+def signal_lag(y1, y2, sfreq=100, cutoff=6, order=2, max_lag=None, subsample=False, plot=False, verbose=True):
     """
     Data alignment function, based on cross-correlation, that can align two devices.
     Input parameters need to be equal sample frequencies (i.e., a priori interpolation)
 
     Aligns 2 datasets based on given input variables, after low bandpass filtering.
-    It is advised to use speed data for alignment.
+    It is advised to use speed data for alignment. The cross-correlation is calculated with FFTs, so long recordings
+    can be aligned quickly.
 
     Parameters
     ----------
@@ -725,16 +930,20 @@ def signal_lag(y1, y2, sfreq=100, cutoff=6, order=2, plot=True, verbose=True):
         cutoff frequency for the filter, default is 6
     order : int
         order of the filter, default is 2
+    max_lag : int, optional
+        only search for lags between -max_lag and max_lag samples, default is all lags
+    subsample : boolean
+        refine the lag to a fraction of a sample with parabolic interpolation of the correlation peak, default = False
     plot : boolean
-        can be used to plot the correlation line, default = True
+        can be used to plot the correlation line, default = False
     verbose : boolean
         can be used to print out the samples that y2 lags compared to y1, default = True
 
     Returns
     -------
-    delay : int
-        the number of samples that y2 should be shifted to correlate maximally to y1
-    maxcorr : int
+    delay : int, float
+        the number of samples that y2 should be shifted to correlate maximally to y1, float if subsample is True
+    maxcorr : float
         the correlation between y2 and y1, if shifted according to the delay
 
     See Also
@@ -742,21 +951,34 @@ def signal_lag(y1, y2, sfreq=100, cutoff=6, order=2, plot=True, verbose=True):
     lowpass_butter
 
     """
+    from scipy.signal import correlate
 
     y1 = lowpass_butter(y1, sfreq=sfreq, cutoff=cutoff, order=order)
     y2 = lowpass_butter(y2, sfreq=sfreq, cutoff=cutoff, order=order)
-    n = len(y1)
 
-    corr = correlate(y2, y1, mode='same') / np.sqrt(
-        correlate(y1, y1, mode='same')[int(n / 2)] * correlate(y2, y2, mode='same')[int(n / 2)])
-    delay_arr = np.linspace(-0.5 * n, 0.5 * n, n)
-    maxcorr = np.argmax(corr)
-    delay = int(round(delay_arr[maxcorr]))
+    corr = correlate(y2, y1, mode="full", method="fft") / np.sqrt(np.dot(y1, y1) * np.dot(y2, y2))
+    lags = np.arange(-(len(y1) - 1), len(y2))  # scipy.signal.correlation_lags needs scipy 1.6
+    if max_lag is not None:
+        window = np.abs(lags) <= max_lag
+        corr, lags = corr[window], lags[window]
+
+    idx = np.argmax(corr)
+    delay, maxcorr = int(lags[idx]), corr[idx]
+    if subsample and 0 < idx < len(corr) - 1:  # fit a parabola through the peak and its neighbours
+        left, right = corr[idx - 1], corr[idx + 1]
+        curvature = left - 2 * maxcorr + right
+        if curvature < 0:
+            offset = 0.5 * (left - right) / curvature
+            delay, maxcorr = delay + offset, maxcorr - 0.25 * (left - right) * offset
+    elif subsample:
+        delay = float(delay)
 
     if plot:
+        import matplotlib.pyplot as plt
+
         plt.figure()
-        plt.plot(delay_arr, corr)
-        plt.title('Lag: ' + str(delay) + ' s')
+        plt.plot(lags, corr)
+        plt.title('Lag: ' + str(delay) + ' samples')
         plt.xlabel('Lag (samples)')
         plt.ylabel('Correlation coefficient')
         plt.show()